@@ -119,6 +119,10 @@ class Settings(BaseSettings):
     # ✅ Model Configuration
     # -----------------------------
     EMBEDDING_MODEL: str = "all-MiniLM-L6-v2"
+    EMBEDDING_BACKEND: str = "torch"  # torch | onnx | onnx_int8 (ONNX Runtime on CPU, int8 = quantized weights)
+    EMBEDDING_ONNX_DIR: str = "vectorstore_data/onnx"  # ONNX exports, built on first use of an onnx backend
+    EMBEDDING_PARITY_MIN_COSINE: float = 0.98  # reject exports whose embeddings drift further from torch
+    EMBEDDING_THREADS: int = 0  # intra-op threads for the embedding model, 0 = library default
     GROQ_MODEL: str = "llama-3.1-8b-instant"
 
     # -----------------------------
@@ -129,6 +133,62 @@ class Settings(BaseSettings):
     MAX_CONTEXT_LENGTH: int = 4000
     DEFAULT_TOP_K: int = 3
 
+    # -----------------------------
+    # ✅ Vector Index Configuration
+    # -----------------------------
+    VECTOR_INDEX_TYPE: str = "flat"  # flat | ivf_flat | hnsw | sq8 | sq_fp16 | ivf_pq | binary
+    IVF_NLIST: int = 1024
+    IVF_NPROBE: int = 16
+    IVF_MIN_TRAIN_FACTOR: int = 39  # train IVF once NLIST * factor vectors exist
+    HNSW_M: int = 32
+    HNSW_EF_CONSTRUCTION: int = 200
+    HNSW_EF_SEARCH: int = 64
+    SQ_MIN_TRAIN_VECTORS: int = 1000  # sq8 learns per-dimension ranges from this many vectors
+    PQ_M: int = 48  # ivf_pq sub-quantizers, must divide the embedding dimension
+    PQ_NBITS: int = 8
+    RERANK_EXACT: bool = False  # re-score lossy index candidates with full-precision vectors
+    RERANK_CANDIDATES: int = 50
+    BINARY_RERANK_CANDIDATES: int = 200  # binary mode always re-scores its Hamming candidates
+    FILTER_EXACT_MAX_ROWS: int = 20000  # filtered searches over fewer rows skip the ANN index
+
+    # -----------------------------
+    # ✅ Retrieval
+    # -----------------------------
+    RETRIEVAL_MODE: str = "dense"  # dense | lexical | hybrid (BM25 + dense, fused by reciprocal rank)
+    BM25_K1: float = 1.2
+    BM25_B: float = 0.75
+    RRF_K: int = 60
+    HYBRID_CANDIDATES: int = 50  # depth of each ranking fed into the fusion
+    HYBRID_SEARCH_WORKERS: int = 4
+    SEARCH_BATCH_MAX_QUERIES: int = 1000
+    SEARCH_MAX_RESULTS: int = 500  # deepest result a paginated /rag/search can reach
+
+    # -----------------------------
+    # ✅ Vector Store Persistence
+    # -----------------------------
+    VECTOR_STORE_DIR: str = "vectorstore_data"
+    VECTOR_STORAGE_FORMAT: str = "pickle"  # pickle | mmap (shared, lazily decoded snapshots)
+    WAL_COMPACT_RECORDS: int = 50  # compact after this many uploads
+    WAL_COMPACT_MB: int = 256  # ...or once the log grows past this size
+    WAL_FSYNC: bool = True
+    COMPACTION_DELETED_RATIO: float = 0.2  # compact after deletes once this fraction of rows is dead
+    VECTOR_STORE_SHARDS: int = 1  # >1 spreads documents over independently persisted sub-indexes
+
+    # -----------------------------
+    # ✅ Distributed Retrieval
+    # -----------------------------
+    NODE_ROLE: str = "standalone"  # standalone | shard (serves /shard/*) | coordinator (fans out to SHARD_URLS)
+    SHARD_URLS: list = []  # coordinator only: shard server base URLs, in document placement order
+    SHARD_TIMEOUT_SECONDS: float = 2.0  # shards slower than this are left out of search results
+    SHARD_INGEST_TIMEOUT_SECONDS: float = 300.0
+
+    # -----------------------------
+    # ✅ Embedding Cache
+    # -----------------------------
+    EMBEDDING_CACHE_ENABLED: bool = True
+    EMBEDDING_CACHE_DIR: str = "vectorstore_data/embedding_cache"
+    EMBEDDING_CACHE_MAX_MB: int = 512  # least recently used embeddings are evicted past this size
+
     # -----------------------------
     # ✅ Memory Configuration
     # -----------------------------
@@ -159,6 +219,30 @@ class Settings(BaseSettings):
     # -----------------------------
     ENABLE_CACHING: bool = True
     CACHE_TTL_SECONDS: int = 3600
+    QUERY_CACHE_MAX_ENTRIES: int = 2048  # query embeddings kept for repeated / follow-up questions
+    RESULT_CACHE_MAX_ENTRIES: int = 1024  # top-k results, invalidated by the index generation
+    INGEST_WORKERS: int = 2  # threads for PDF extraction, embedding and index writes
+    INGEST_MAX_PENDING: int = 16  # uploads queued beyond this are rejected with 503
+    QUERY_WORKERS: int = 8  # threads for query embedding and index search
+    QUERY_MAX_PENDING: int = 256
+    EMBEDDING_BATCHING_ENABLED: bool = True  # coalesce concurrent query embeddings into one encode call
+    EMBEDDING_BATCH_WINDOW_MS: float = 2.0  # how long the first query waits for others to join its batch
+    EMBEDDING_BATCH_MAX_SIZE: int = 32
+    EMBEDDING_PROCESS_WORKERS: int = 0  # >0 embeds large uploads on this many worker processes
+    EMBEDDING_PROCESS_BATCH: int = 64  # chunks per worker task when EMBEDDING_TOKEN_BUDGET is 0
+    EMBEDDING_PROCESS_MIN_CHUNKS: int = 256  # smaller uploads are embedded in-process
+    EMBEDDING_TOKEN_BUDGET: int = 8192  # padded tokens per chunk batch (size x longest); 0 = fixed batches in order
+    EMBEDDING_MAX_BATCH: int = 256
+    INGEST_STREAM_BATCH: int = 256  # chunks read per step while a PDF is still being extracted
+    INGEST_STREAM_DEPTH: int = 2  # chunk batches extraction may run ahead of embedding
+    PDF_EXTRACT_WORKERS: int = 0  # >0 extracts large PDFs' pages on this many worker processes
+    PDF_PARALLEL_MIN_PAGES: int = 64  # PDFs with fewer pages are extracted in the ingest thread
+    PDF_PAGES_PER_TASK: int = 8  # pages a worker extracts per task
+
+    # -----------------------------
+    # ✅ Startup
+    # -----------------------------
+    PRELOAD_ON_STARTUP: bool = True  # load the model and index in the background at startup; False = on first request
 
     class Config:
         env_file = ".env"
@@ -0,0 +1,116 @@
+"""
+Application startup and readiness.
+
+The embedding model, vector index and LLM client are LazyResource globals,
+so importing the app is cheap. The lifespan handler loads them on a
+background thread and the process answers /ping immediately; /ready and the
+require_ready dependency on the API routers answer 503 until every resource
+is built. With PRELOAD_ON_STARTUP off nothing is loaded at startup and the
+first request that needs the services builds them.
+"""
+import asyncio
+import logging
+import threading
+import time
+from contextlib import asynccontextmanager
+from typing import Dict, Optional
+
+from fastapi import FastAPI, HTTPException, status
+
+from app.core.config import settings
+from app.services.executors import shutdown_pools
+from app.services.pdf_workers import shutdown_extraction_pool
+from app.services.groq_service import groq_service
+from app.services.vectorstore import vector_store
+from app.utils.lazy import LazyResource
+
+logger = logging.getLogger(__name__)
+
+
+class StartupState:
+    """Tracks how long the app took to import and to load its resources"""
+
+    def __init__(self, resources: Dict[str, LazyResource]):
+        self.resources = resources
+        self.import_seconds: Optional[float] = None
+        self.ready_seconds: Optional[float] = None
+        self._started_at: Optional[float] = None
+        self._load_lock = threading.Lock()
+        self._warmup: Optional[threading.Thread] = None
+
+    def record_import(self, seconds: float):
+        self.import_seconds = seconds
+        logger.info(f"Application imported in {seconds:.2f}s")
+
+    def begin(self):
+        self._started_at = time.perf_counter()
+        if settings.PRELOAD_ON_STARTUP:
+            self._warmup = threading.Thread(target=self._warm_up, name="startup-warmup", daemon=True)
+            self._warmup.start()
+
+    def is_ready(self) -> bool:
+        return all(resource.is_loaded for resource in self.resources.values())
+
+    def is_warming_up(self) -> bool:
+        return self._warmup is not None and self._warmup.is_alive()
+
+    def load_all(self):
+        """Build every resource that is not loaded yet, in order"""
+        with self._load_lock:
+            for resource in self.resources.values():
+                resource.load()
+            if self.ready_seconds is None and self._started_at is not None:
+                self.ready_seconds = time.perf_counter() - self._started_at
+                logger.info(f"Ready {self.ready_seconds:.2f}s after startup")
+
+    def _warm_up(self):
+        try:
+            self.load_all()
+        except Exception:
+            logger.error("Startup warm-up failed, the service stays unready")
+
+    def report(self) -> dict:
+        return {
+            "ready": self.is_ready(),
+            "import_seconds": round(self.import_seconds, 3) if self.import_seconds is not None else None,
+            "ready_seconds": round(self.ready_seconds, 3) if self.ready_seconds is not None else None,
+            "preload": settings.PRELOAD_ON_STARTUP,
+            "resources": {name: resource.status() for name, resource in self.resources.items()}
+        }
+
+
+# Global instance
+startup_state = StartupState({"vector_store": vector_store, "groq_service": groq_service})
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    startup_state.begin()
+    yield
+    shutdown_pools()
+    shutdown_extraction_pool()
+    workers = getattr(vector_store, "embedding_workers", None) if vector_store.is_loaded else None
+    if workers is not None:
+        workers.shutdown()
+    cache = getattr(vector_store, "embedding_cache", None) if vector_store.is_loaded else None
+    if cache is not None:
+        cache.close()
+
+
+async def require_ready():
+    """Router dependency: refuse requests until the services are loaded, or load them lazily"""
+    if startup_state.is_ready():
+        return
+    if settings.PRELOAD_ON_STARTUP:
+        detail = "Service is starting up, try again shortly"
+        if not startup_state.is_warming_up():
+            detail = "Service failed to start, see /ready"
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=detail,
+            headers={"Retry-After": "5"}
+        )
+    try:
+        await asyncio.to_thread(startup_state.load_all)
+    except Exception as e:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=str(e))
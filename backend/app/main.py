@@ -1,5 +1,9 @@
-from fastapi import FastAPI
+import time
+_import_started = time.perf_counter()
+
+from fastapi import Depends, FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
 
 # Enable SQLAlchemy logging
 import logging
@@ -13,10 +17,13 @@ logging.getLogger('sqlalchemy.engine').setLevel(logging.INFO)
 
 # Import routers
 from app.routers import (
-     rag_router
+     rag_router, shard_router
 )
+from app.core.config import settings
+from app.core.lifecycle import lifespan, require_ready, startup_state
 
 app = FastAPI(
+    lifespan=lifespan,
     title="HRM System with House Price Prediction",
     version="1.0.0",
     description="An API for managing HRM features with machine learning capabilities",
@@ -64,7 +71,9 @@ def read_root():
     return {"message": "Hello from FastAPI!"}
 
 # Include all routers
-app.include_router(rag_router.router)
+app.include_router(rag_router.router, dependencies=[Depends(require_ready)])
+if settings.NODE_ROLE == "shard":
+    app.include_router(shard_router.router, dependencies=[Depends(require_ready)])
 
 
 @app.get("/")
@@ -79,10 +88,18 @@ def read_root():
 async def health_check():
     return {"status": "healthy"}
 
+@app.get("/ready")
+async def readiness_check():
+    """200 once the embedding model, index and LLM client are loaded, 503 before"""
+    report = startup_state.report()
+    return JSONResponse(status_code=200 if report["ready"] else 503, content=report)
+
 @app.get("/test")
 def test():
     return {"status": "working"}
 
 @app.get("/")
 def root():
-    return {"message": "RAG Application with Groq is running 🚀"}
\ No newline at end of file
+    return {"message": "RAG Application with Groq is running 🚀"}
+
+startup_state.record_import(time.perf_counter() - _import_started)
@@ -1,24 +1,83 @@
-from fastapi import APIRouter, UploadFile, HTTPException, File, status
+from fastapi import APIRouter, BackgroundTasks, UploadFile, HTTPException, File, Query, status
+from pydantic import ValidationError
+import json
+from typing import Optional
 from fastapi.responses import JSONResponse
 import uuid
 import logging
+from io import BytesIO
 from datetime import datetime
 import time
 
-from app.utils.pdf_reader import extract_text_from_pdf
+from app.utils.pdf_reader import iter_pdf_chunks, open_pdf
+from app.utils.hashing import content_hash
 from app.services.vectorstore import vector_store
+from app.services.executors import PoolSaturatedError, get_pool_stats, run_ingest
+from app.services.pdf_workers import get_extraction_stats, iter_upload_pages
 from app.services.groq_service import groq_service
 from app.services.memory_store import conversation_memory
 from app.services.prompt_template import build_contextualized_query
 from app.schemas.rag_schemas import (
     AskRequest, AskResponse, UploadResponse, 
-    HealthResponse, ErrorResponse
+    HealthResponse, ErrorResponse, DocumentInfo,
+    DocumentListResponse, DeleteDocumentResponse,
+    BatchSearchRequest, BatchSearchResponse,
+    SearchRequest, SearchResponse, SearchResult
 )
 from app.core.config import settings
 
 logger = logging.getLogger(__name__)
 router = APIRouter(prefix="/rag", tags=["RAG"])
 
+async def _read_pdf_upload(file: UploadFile):
+    """Validate an uploaded PDF; returns its bytes and size in MB"""
+    # Validate file
+    if not file.filename.endswith('.pdf'):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Only PDF files are supported"
+        )
+    
+    # Check file size (basic check)
+    content = await file.read()
+    file_size_mb = len(content) / (1024 * 1024)
+    
+    if file_size_mb > settings.MAX_FILE_SIZE_MB:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"File too large. Maximum size is {settings.MAX_FILE_SIZE_MB}MB"
+        )
+    
+    return content, file_size_mb
+
+
+async def _open_pdf_chunks(file: UploadFile, content: bytes):
+    """Open an already validated PDF upload; returns its lazy chunk stream and page count.
+    
+    Pages are only extracted as the vector store consumes the stream, so
+    extraction overlaps embedding and chunks keep the pages they came from.
+    Large PDFs are extracted on the PDF worker processes.
+    """
+    logger.info(f"Processing file: {file.filename}")
+    reader = await run_ingest(open_pdf, BytesIO(content))
+    pages = iter_upload_pages(reader, content)
+    chunks = iter_pdf_chunks(pages, settings.CHUNK_SIZE, settings.CHUNK_OVERLAP)
+    return chunks, len(reader.pages)
+
+
+async def _duplicate_upload(filename: str, existing_doc_id: str) -> UploadResponse:
+    """Response for an upload whose content is already indexed as `existing_doc_id`"""
+    existing = await vector_store.get_document_async(existing_doc_id) or {}
+    return UploadResponse(
+        message="File already in knowledge base, skipped processing",
+        filename=filename,
+        pages_processed=existing.get("metadata", {}).get("pages", 0),
+        chunks_created=0,
+        doc_id=existing_doc_id,
+        status="duplicate"
+    )
+
+
 @router.post("/upload", response_model=UploadResponse, status_code=status.HTTP_201_CREATED)
 async def upload_file(file: UploadFile = File(...)):
     """
@@ -29,35 +88,16 @@ async def upload_file(file: UploadFile = File(...)):
     Returns information about the processed document.
     """
     try:
-        # Validate file
-        if not file.filename.endswith('.pdf'):
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="Only PDF files are supported"
-            )
+        content, file_size_mb = await _read_pdf_upload(file)
         
-        # Check file size (basic check)
-        content = await file.read()
-        file_size_mb = len(content) / (1024 * 1024)
+        # Skip extraction and embedding entirely for a file that is already indexed
+        file_hash = content_hash(content)
+        existing_doc_id = await vector_store.find_document_async(file_hash)
+        if existing_doc_id:
+            logger.info(f"{file.filename} is already indexed as document {existing_doc_id}")
+            return await _duplicate_upload(file.filename, existing_doc_id)
         
-        if file_size_mb > settings.MAX_FILE_SIZE_MB:
-            raise HTTPException(
-                status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
-                detail=f"File too large. Maximum size is {settings.MAX_FILE_SIZE_MB}MB"
-            )
-        
-        # Reset file pointer
-        await file.seek(0)
-        
-        # Extract text from PDF
-        logger.info(f"Processing file: {file.filename}")
-        text, pages_processed = extract_text_from_pdf(file.file)
-        
-        if not text.strip():
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="No text could be extracted from the PDF"
-            )
+        chunks, pages_processed = await _open_pdf_chunks(file, content)
         
         # Add to vector store
         metadata = {
@@ -67,7 +107,16 @@ async def upload_file(file: UploadFile = File(...)):
             "size_mb": round(file_size_mb, 2)
         }
         
-        chunks_created = vector_store.add_document(text, metadata)
+        doc_id = uuid.uuid4().hex
+        chunks_created = await vector_store.add_document_stream_async(
+            chunks, metadata, doc_id=doc_id, content_hash=file_hash
+        )
+        if chunks_created == 0:
+            # A concurrent upload of the same file was indexed first
+            existing_doc_id = await vector_store.find_document_async(file_hash)
+            if existing_doc_id and existing_doc_id != doc_id:
+                logger.info(f"{file.filename} was indexed concurrently as document {existing_doc_id}")
+                return await _duplicate_upload(file.filename, existing_doc_id)
         
         logger.info(
             f"Successfully processed {file.filename}: "
@@ -79,6 +128,7 @@ async def upload_file(file: UploadFile = File(...)):
             filename=file.filename,
             pages_processed=pages_processed,
             chunks_created=chunks_created,
+            doc_id=doc_id,
             status="success"
         )
         
@@ -90,6 +140,11 @@ async def upload_file(file: UploadFile = File(...)):
             status_code=status.HTTP_400_BAD_REQUEST,
             detail=str(e)
         )
+    except PoolSaturatedError as e:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=str(e)
+        )
     except Exception as e:
         logger.error(f"File upload failed: {str(e)}", exc_info=True)
         raise HTTPException(
@@ -106,6 +161,8 @@ async def ask_question(payload: AskRequest):
     - **query**: The question to ask
     - **session_id**: Optional session ID for conversation continuity
     - **max_context_items**: Number of context chunks to retrieve (1-10)
+    - **filters**: Optional metadata filter on filename, doc_id or upload_time
+    - **retrieval_mode**: Optional dense, lexical or hybrid retrieval
     
     Returns the answer with session information.
     """
@@ -125,14 +182,16 @@ async def ask_question(payload: AskRequest):
         
         # Retrieve similar contexts
         k = min(payload.max_context_items, settings.DEFAULT_TOP_K)
-        search_results = vector_store.search(contextualized_query, k=k)
+        search_results = await vector_store.search_async(
+            contextualized_query, k=k, filters=payload.filters, mode=payload.retrieval_mode
+        )
         contexts = [doc for doc, _, _ in search_results]
         
         if not contexts:
             logger.warning("No contexts found in vector store")
         
         # Generate answer using LLM
-        result = groq_service.generate_answer(
+        result = await groq_service.generate_answer_async(
             payload.query,
             contexts,
             history
@@ -173,6 +232,17 @@ async def ask_question(payload: AskRequest):
         
     except HTTPException:
         raise
+    except ValueError as e:
+        logger.error(f"Validation error: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+    except PoolSaturatedError as e:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=str(e)
+        )
     except Exception as e:
         logger.error(f"Query processing failed: {str(e)}", exc_info=True)
         raise HTTPException(
@@ -181,6 +251,152 @@ async def ask_question(payload: AskRequest):
         )
 
 
+async def _run_search(payload: SearchRequest) -> SearchResponse:
+    """Retrieve one page of results; fetches one extra hit to know if more pages exist"""
+    depth = payload.page * payload.page_size
+    if depth > settings.SEARCH_MAX_RESULTS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Pagination past {settings.SEARCH_MAX_RESULTS} results is not supported"
+        )
+    
+    start_time = time.time()
+    mode = payload.retrieval_mode or settings.RETRIEVAL_MODE
+    hits = await vector_store.search_async(
+        payload.query, k=depth + 1, threshold=payload.threshold, filters=payload.filters, mode=mode
+    )
+    offset = depth - payload.page_size
+    processing_time = time.time() - start_time
+    # A coordinator's hits name the shard servers that did not answer in time
+    failed_shards = getattr(hits, "failed_shards", [])
+    
+    logger.info(f"Search returned {len(hits)} hits in {processing_time * 1000:.1f}ms ({mode})")
+    
+    return SearchResponse(
+        query=payload.query,
+        results=[
+            SearchResult(rank=offset + i + 1, text=text, score=score, metadata=metadata)
+            for i, (text, score, metadata) in enumerate(hits[offset:depth])
+        ],
+        page=payload.page,
+        page_size=payload.page_size,
+        has_more=len(hits) > depth,
+        retrieval_mode=mode,
+        processing_time=round(processing_time, 4),
+        partial=bool(failed_shards),
+        failed_shards=failed_shards
+    )
+
+
+@router.post("/search", response_model=SearchResponse)
+async def search_documents(payload: SearchRequest):
+    """
+    Retrieve matching chunks without calling the LLM.
+    
+    - **query**: The search query
+    - **page** / **page_size**: Pagination over the ranked results
+    - **filters**: Optional metadata filter on filename, doc_id or upload_time
+    - **retrieval_mode**: Optional dense, lexical or hybrid retrieval
+    - **threshold**: Optional maximum distance (dense mode)
+    
+    Returns chunk text, score and metadata with retrieval timing.
+    """
+    try:
+        return await _run_search(payload)
+        
+    except HTTPException:
+        raise
+    except ValueError as e:
+        logger.error(f"Validation error: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+    except PoolSaturatedError as e:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=str(e)
+        )
+    except Exception as e:
+        logger.error(f"Search failed: {str(e)}", exc_info=True)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Failed to search: {str(e)}"
+        )
+
+
+@router.get("/search", response_model=SearchResponse)
+async def search_documents_get(
+    query: str = Query(..., min_length=1, max_length=2000),
+    page: int = Query(1, ge=1),
+    page_size: int = Query(10, ge=1, le=100),
+    filters: Optional[str] = Query(None, description='JSON metadata filter, e.g. {"filename": "report.pdf"}'),
+    retrieval_mode: Optional[str] = Query(None),
+    threshold: Optional[float] = Query(None, ge=0)
+):
+    """
+    Retrieve matching chunks without calling the LLM (query-string variant of POST /rag/search).
+    """
+    try:
+        payload = SearchRequest(
+            query=query,
+            page=page,
+            page_size=page_size,
+            filters=json.loads(filters) if filters else None,
+            retrieval_mode=retrieval_mode,
+            threshold=threshold
+        )
+    except (ValidationError, json.JSONDecodeError) as e:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail=str(e)
+        )
+    
+    return await search_documents(payload)
+
+
+@router.post("/search/batch", response_model=BatchSearchResponse)
+async def search_batch(payload: BatchSearchRequest):
+    """
+    Retrieve top-k chunks for many queries at once, without calling the LLM.
+    
+    - **queries**: The queries to search
+    - **k**: Results per query (1-100)
+    - **filters**: Optional metadata filter applied to every query
+    - **include_text**: Also return the chunk texts
+    
+    Returns chunk ids and distances per query, nearest first.
+    """
+    start_time = time.time()
+    
+    try:
+        results = await vector_store.search_batch_async(
+            payload.queries, k=payload.k, filters=payload.filters, include_text=payload.include_text
+        )
+        processing_time = time.time() - start_time
+        logger.info(f"Batch search of {len(payload.queries)} queries in {processing_time:.2f}s")
+        
+        return BatchSearchResponse(**results, processing_time=round(processing_time, 4))
+        
+    except ValueError as e:
+        logger.error(f"Validation error: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+    except PoolSaturatedError as e:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=str(e)
+        )
+    except Exception as e:
+        logger.error(f"Batch search failed: {str(e)}", exc_info=True)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Failed to search: {str(e)}"
+        )
+
+
 @router.get("/health", response_model=HealthResponse)
 async def health_check():
     """
@@ -192,7 +408,7 @@ async def health_check():
         return HealthResponse(
             status="healthy",
             timestamp=datetime.utcnow(),
-            vector_store_size=vector_store.get_size(),
+            vector_store_size=await vector_store.get_size_async(),
             active_sessions=conversation_memory.get_active_session_count()
         )
     except Exception as e:
@@ -203,6 +419,30 @@ async def health_check():
         )
 
 
+@router.get("/stats")
+async def get_stats():
+    """
+    Vector store, index and cache statistics, including embedding cache hit/miss counts.
+    """
+    try:
+        stats = await vector_store.get_stats_async()
+        stats["executors"] = get_pool_stats()
+        stats["pdf_extraction"] = get_extraction_stats()
+        return stats
+        
+    except PoolSaturatedError as e:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=str(e)
+        )
+    except Exception as e:
+        logger.error(f"Failed to get stats: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=str(e)
+        )
+
+
 @router.get("/session/{session_id}")
 async def get_session_info(session_id: str):
     """
@@ -260,12 +500,137 @@ async def clear_vector_store():
     **Warning**: This action cannot be undone.
     """
     try:
-        vector_store.clear()
+        await vector_store.clear_async()
         return {"message": "Vector store cleared successfully"}
         
+    except PoolSaturatedError as e:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=str(e)
+        )
     except Exception as e:
         logger.error(f"Failed to clear vector store: {str(e)}")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=str(e)
-        )
\ No newline at end of file
+        )
+
+
+@router.get("/documents", response_model=DocumentListResponse)
+async def list_documents():
+    """
+    List the documents in the vector store with their chunk counts.
+    """
+    try:
+        documents = [DocumentInfo(**doc) for doc in await vector_store.list_documents_async()]
+        return DocumentListResponse(documents=documents, total=len(documents))
+        
+    except PoolSaturatedError as e:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=str(e)
+        )
+    except Exception as e:
+        logger.error(f"Failed to list documents: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=str(e)
+        )
+
+
+@router.delete("/documents/{doc_id}", response_model=DeleteDocumentResponse)
+async def delete_document(doc_id: str, background_tasks: BackgroundTasks):
+    """
+    Delete a single document from the vector store.
+    
+    - **doc_id**: The identifier returned by the upload
+    
+    Chunks are excluded from search immediately; their space is reclaimed
+    by a background compaction once enough rows have been deleted.
+    """
+    try:
+        chunks_deleted = await vector_store.delete_document_async(doc_id)
+        background_tasks.add_task(vector_store.compact_if_fragmented_async)
+        return DeleteDocumentResponse(
+            message=f"Document {doc_id} deleted successfully",
+            doc_id=doc_id,
+            chunks_deleted=chunks_deleted
+        )
+        
+    except KeyError:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Document {doc_id} not found"
+        )
+    except PoolSaturatedError as e:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=str(e)
+        )
+    except Exception as e:
+        logger.error(f"Failed to delete document: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=str(e)
+        )
+
+
+@router.put("/documents/{doc_id}", response_model=UploadResponse)
+async def replace_document(doc_id: str, background_tasks: BackgroundTasks, file: UploadFile = File(...)):
+    """
+    Replace an existing document with a new PDF, keeping its identifier.
+    
+    - **doc_id**: The identifier returned by the upload
+    - **file**: PDF file with the new revision (max 10MB)
+    """
+    try:
+        content, file_size_mb = await _read_pdf_upload(file)
+        chunks, pages_processed = await _open_pdf_chunks(file, content)
+        
+        metadata = {
+            "filename": file.filename,
+            "upload_time": datetime.utcnow().isoformat(),
+            "pages": pages_processed,
+            "size_mb": round(file_size_mb, 2)
+        }
+        
+        chunks_created = await vector_store.replace_document_stream_async(
+            doc_id, chunks, metadata, content_hash=content_hash(content)
+        )
+        background_tasks.add_task(vector_store.compact_if_fragmented_async)
+        
+        logger.info(f"Replaced document {doc_id} with {file.filename}: {chunks_created} chunks")
+        
+        return UploadResponse(
+            message="Document successfully replaced",
+            filename=file.filename,
+            pages_processed=pages_processed,
+            chunks_created=chunks_created,
+            doc_id=doc_id,
+            status="success"
+        )
+        
+    except HTTPException:
+        raise
+    except KeyError:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Document {doc_id} not found"
+        )
+    except ValueError as e:
+        logger.error(f"Validation error: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+    except PoolSaturatedError as e:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=str(e)
+        )
+    except Exception as e:
+        logger.error(f"Document replace failed: {str(e)}", exc_info=True)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Failed to replace document: {str(e)}"
+        )
@@ -0,0 +1,152 @@
+from fastapi import APIRouter, BackgroundTasks, HTTPException, status
+import logging
+
+from app.services.vectorstore import vector_store
+from app.services.executors import PoolSaturatedError
+from app.schemas.rag_schemas import (
+    BatchSearchRequest, BatchSearchResponse,
+    ShardDocumentRequest, ShardDocumentResponse,
+    ShardHit, ShardSearchRequest, ShardSearchResponse
+)
+
+logger = logging.getLogger(__name__)
+router = APIRouter(prefix="/shard", tags=["Shard"])
+
+# Internal endpoints a coordinator calls on servers started with NODE_ROLE=shard.
+# They expose this process's vector store directly, without PDF handling or the LLM.
+
+
+@router.post("/search", response_model=ShardSearchResponse)
+async def shard_search(payload: ShardSearchRequest):
+    try:
+        hits = await vector_store.search_async(
+            payload.query, k=payload.k, threshold=payload.threshold, filters=payload.filters, mode=payload.mode
+        )
+        return ShardSearchResponse(
+            results=[ShardHit(text=text, score=score, metadata=metadata) for text, score, metadata in hits]
+        )
+
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    except PoolSaturatedError as e:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=str(e))
+    except Exception as e:
+        logger.error(f"Shard search failed: {str(e)}", exc_info=True)
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
+
+
+@router.post("/search/batch", response_model=BatchSearchResponse)
+async def shard_search_batch(payload: BatchSearchRequest):
+    try:
+        return BatchSearchResponse(**await vector_store.search_batch_async(
+            payload.queries, k=payload.k, filters=payload.filters, include_text=payload.include_text
+        ))
+
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    except PoolSaturatedError as e:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=str(e))
+    except Exception as e:
+        logger.error(f"Shard batch search failed: {str(e)}", exc_info=True)
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
+
+
+@router.post("/documents", response_model=ShardDocumentResponse)
+async def shard_add_document(payload: ShardDocumentRequest):
+    try:
+        if payload.chunks is not None:
+            chunks = await vector_store.add_document_stream_async(
+                [(chunk.text, chunk.metadata) for chunk in payload.chunks], payload.metadata,
+                doc_id=payload.doc_id, content_hash=payload.content_hash
+            )
+        else:
+            chunks = await vector_store.add_document_async(
+                payload.text, payload.metadata, doc_id=payload.doc_id, content_hash=payload.content_hash
+            )
+        return ShardDocumentResponse(doc_id=payload.doc_id, chunks=chunks)
+
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    except PoolSaturatedError as e:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=str(e))
+    except Exception as e:
+        logger.error(f"Shard ingest failed: {str(e)}", exc_info=True)
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
+
+
+@router.get("/documents")
+async def shard_list_documents():
+    return {"documents": await vector_store.list_documents_async()}
+
+
+@router.get("/documents/by-hash/{content_hash}")
+async def shard_find_document(content_hash: str):
+    return {"doc_id": await vector_store.find_document_async(content_hash)}
+
+
+@router.get("/documents/{doc_id}")
+async def shard_get_document(doc_id: str):
+    entry = await vector_store.get_document_async(doc_id)
+    if entry is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Document {doc_id} not found")
+    return entry
+
+
+@router.put("/documents/{doc_id}", response_model=ShardDocumentResponse)
+async def shard_replace_document(doc_id: str, payload: ShardDocumentRequest, background_tasks: BackgroundTasks):
+    try:
+        if payload.chunks is not None:
+            chunks = await vector_store.replace_document_stream_async(
+                doc_id, [(chunk.text, chunk.metadata) for chunk in payload.chunks], payload.metadata,
+                content_hash=payload.content_hash
+            )
+        else:
+            chunks = await vector_store.replace_document_async(doc_id, payload.text, payload.metadata,
+                                                               content_hash=payload.content_hash)
+        background_tasks.add_task(vector_store.compact_if_fragmented_async)
+        return ShardDocumentResponse(doc_id=doc_id, chunks=chunks)
+
+    except KeyError:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Document {doc_id} not found")
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    except PoolSaturatedError as e:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=str(e))
+    except Exception as e:
+        logger.error(f"Shard replace failed: {str(e)}", exc_info=True)
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
+
+
+@router.delete("/documents/{doc_id}", response_model=ShardDocumentResponse)
+async def shard_delete_document(doc_id: str, background_tasks: BackgroundTasks):
+    try:
+        chunks = await vector_store.delete_document_async(doc_id)
+        background_tasks.add_task(vector_store.compact_if_fragmented_async)
+        return ShardDocumentResponse(doc_id=doc_id, chunks=chunks)
+
+    except KeyError:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Document {doc_id} not found")
+    except PoolSaturatedError as e:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=str(e))
+    except Exception as e:
+        logger.error(f"Shard delete failed: {str(e)}", exc_info=True)
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
+
+
+@router.get("/stats")
+async def shard_stats():
+    return await vector_store.get_stats_async()
+
+
+@router.post("/compact")
+async def shard_compact(if_fragmented: bool = False):
+    if if_fragmented:
+        return {"compacted": await vector_store.compact_if_fragmented_async()}
+    await vector_store.compact_async()
+    return {"compacted": True}
+
+
+@router.post("/clear")
+async def shard_clear():
+    await vector_store.clear_async()
+    return {"message": "Shard cleared"}
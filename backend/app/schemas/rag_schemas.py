@@ -1,17 +1,100 @@
 from pydantic import BaseModel, Field, validator
-from typing import Optional, Dict
+from typing import Any, Optional, Dict, List
 from datetime import datetime
 
+
+# Validators shared by the request models
+
+def _strip_query(v: str) -> str:
+    if not v.strip():
+        raise ValueError('Query cannot be empty or whitespace')
+    return v.strip()
+
+
+def _supported_filters(v: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    from app.services.metadata_index import validate_filters
+    return validate_filters(v)
+
+
+def _supported_retrieval_mode(v: Optional[str]) -> Optional[str]:
+    from app.services.vectorstore import validate_retrieval_mode
+    return validate_retrieval_mode(v) if v is not None else v
+
+
 class AskRequest(BaseModel):
     query: str = Field(..., min_length=1, max_length=2000, description="User query")
     session_id: Optional[str] = Field(None, description="Session identifier for conversation continuity")
     max_context_items: Optional[int] = Field(3, ge=1, le=10, description="Number of context chunks to retrieve")
+    filters: Optional[Dict[str, Any]] = Field(
+        None,
+        description='Metadata filter, e.g. {"filename": "report.pdf"} or {"upload_time": {"gte": "2024-01-01"}}'
+    )
+    retrieval_mode: Optional[str] = Field(
+        None, description="dense, lexical (BM25) or hybrid; defaults to the server's RETRIEVAL_MODE"
+    )
+
+    _query_not_empty = validator('query', allow_reuse=True)(_strip_query)
+    _filters_supported = validator('filters', allow_reuse=True)(_supported_filters)
+    _retrieval_mode_supported = validator('retrieval_mode', allow_reuse=True)(_supported_retrieval_mode)
+
+
+class SearchRequest(BaseModel):
+    query: str = Field(..., min_length=1, max_length=2000, description="Search query")
+    page: int = Field(1, ge=1, description="1-based page number")
+    page_size: int = Field(10, ge=1, le=100, description="Results per page")
+    filters: Optional[Dict[str, Any]] = Field(None, description="Metadata filter on filename, doc_id or upload_time")
+    retrieval_mode: Optional[str] = Field(None, description="dense, lexical or hybrid")
+    threshold: Optional[float] = Field(None, ge=0, description="Maximum L2 distance (dense mode only)")
+
+    _query_not_empty = validator('query', allow_reuse=True)(_strip_query)
+    _filters_supported = validator('filters', allow_reuse=True)(_supported_filters)
+    _retrieval_mode_supported = validator('retrieval_mode', allow_reuse=True)(_supported_retrieval_mode)
+
+
+class SearchResult(BaseModel):
+    rank: int
+    text: str
+    score: float = Field(description="L2 distance (dense), BM25 score (lexical) or fused RRF score (hybrid)")
+    metadata: Dict = Field(default_factory=dict)
+
+
+class SearchResponse(BaseModel):
+    query: str
+    results: List[SearchResult]
+    page: int
+    page_size: int
+    has_more: bool
+    retrieval_mode: str
+    processing_time: float = Field(description="Time taken to retrieve in seconds")
+    partial: bool = Field(False, description="Some shard servers did not answer; results come from the rest")
+    failed_shards: List[str] = Field(default_factory=list, description="Shard servers missing from a partial result")
+
+
+class BatchSearchRequest(BaseModel):
+    queries: List[str] = Field(..., description="Queries to search in one batch")
+    k: int = Field(3, ge=1, le=100, description="Results per query")
+    filters: Optional[Dict[str, Any]] = Field(None, description="Metadata filter applied to every query")
+    include_text: bool = Field(False, description="Return chunk text alongside ids and scores")
+
+    @validator('queries')
+    def queries_within_limit(cls, v: List[str]) -> List[str]:
+        from app.core.config import settings
+        if not v:
+            raise ValueError('At least one query is required')
+        if len(v) > settings.SEARCH_BATCH_MAX_QUERIES:
+            raise ValueError(f'At most {settings.SEARCH_BATCH_MAX_QUERIES} queries per batch')
+        return v
+
+    _filters_supported = validator('filters', allow_reuse=True)(_supported_filters)
+
 
-    @validator('query')
-    def query_not_empty(cls, v: str) -> str:
-        if not v.strip():
-            raise ValueError('Query cannot be empty or whitespace')
-        return v.strip()
+class BatchSearchResponse(BaseModel):
+    ids: List[List[int]] = Field(description="Chunk ids per query, nearest first")
+    scores: List[List[float]] = Field(description="Squared L2 distances aligned with ids")
+    texts: Optional[List[List[str]]] = None
+    processing_time: Optional[float] = Field(None, description="Time taken to process in seconds")
+    partial: bool = Field(False, description="Some shard servers did not answer; results come from the rest")
+    failed_shards: List[str] = Field(default_factory=list, description="Shard servers missing from a partial result")
 
 
 class AskResponse(BaseModel):
@@ -27,9 +110,28 @@ class UploadResponse(BaseModel):
     filename: str
     pages_processed: int
     chunks_created: int
+    doc_id: Optional[str] = Field(None, description="Stable identifier for deleting or replacing the document")
     status: str = "success"
 
 
+class DocumentInfo(BaseModel):
+    doc_id: str
+    chunks: int
+    filename: Optional[str] = None
+    upload_time: Optional[str] = None
+
+
+class DocumentListResponse(BaseModel):
+    documents: List[DocumentInfo]
+    total: int
+
+
+class DeleteDocumentResponse(BaseModel):
+    message: str
+    doc_id: str
+    chunks_deleted: int
+
+
 class HealthResponse(BaseModel):
     status: str
     timestamp: datetime
@@ -41,3 +143,41 @@ class ErrorResponse(BaseModel):
     error: str
     detail: Optional[str] = None
     timestamp: datetime = Field(default_factory=datetime.utcnow)
+
+
+# Internal API between a coordinator and its shard servers
+
+class ShardSearchRequest(BaseModel):
+    query: str
+    k: int = Field(3, ge=1)
+    threshold: Optional[float] = None
+    filters: Optional[Dict[str, Any]] = None
+    mode: Optional[str] = None
+
+
+class ShardHit(BaseModel):
+    text: str
+    score: float
+    metadata: Dict = Field(default_factory=dict)
+
+
+class ShardSearchResponse(BaseModel):
+    results: List[ShardHit]
+
+
+class ShardChunk(BaseModel):
+    text: str
+    metadata: Dict[str, Any] = Field(default_factory=dict)
+
+
+class ShardDocumentRequest(BaseModel):
+    text: str = ""
+    chunks: Optional[List[ShardChunk]] = None  # already chunked upload, used instead of text
+    metadata: Optional[Dict[str, Any]] = None
+    doc_id: Optional[str] = None
+    content_hash: Optional[str] = None
+
+
+class ShardDocumentResponse(BaseModel):
+    doc_id: Optional[str] = None
+    chunks: int
@@ -1,19 +1,27 @@
 """Business logic services"""
 
-from app.services.groq_service import groq_service, generate_answer_with_history
-from app.services.memory_store import conversation_memory, get_history, add_to_history
-from app.services.vectorstore import vector_store, add_document_to_index, search_similar_documents
-from app.services.prompt_template import build_prompt, build_system_prompt
+import importlib
 
-__all__ = [
-    "groq_service",
-    "generate_answer_with_history",
-    "conversation_memory",
-    "get_history",
-    "add_to_history",
-    "vector_store",
-    "add_document_to_index",
-    "search_similar_documents",
-    "build_prompt",
-    "build_system_prompt"
-]
\ No newline at end of file
+# Exported name -> defining module. Resolved on first access so importing one
+# service (or app.services itself) does not import all of them.
+_EXPORTS = {
+    "groq_service": "app.services.groq_service",
+    "generate_answer_with_history": "app.services.groq_service",
+    "conversation_memory": "app.services.memory_store",
+    "get_history": "app.services.memory_store",
+    "add_to_history": "app.services.memory_store",
+    "vector_store": "app.services.vectorstore",
+    "add_document_to_index": "app.services.vectorstore",
+    "search_similar_documents": "app.services.vectorstore",
+    "build_prompt": "app.services.prompt_template",
+    "build_system_prompt": "app.services.prompt_template",
+}
+
+
+def __getattr__(name):
+    if name not in _EXPORTS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    return getattr(importlib.import_module(_EXPORTS[name]), name)
+
+
+__all__ = list(_EXPORTS)
@@ -0,0 +1,351 @@
+"""
+Pluggable embedding backends.
+
+The vector store only needs `encode()` and `get_sentence_embedding_dimension()`
+from its model, so any backend exposing those two can replace the PyTorch
+SentenceTransformer:
+
+    torch      SentenceTransformer as before
+    onnx       the same transformer exported to ONNX and run by ONNX Runtime
+    onnx_int8  the ONNX export with dynamically int8-quantized weights
+
+ONNX exports are built once per model under EMBEDDING_ONNX_DIR (this step
+needs torch and sentence_transformers, later loads only onnxruntime and the
+tokenizer). Every export is checked against the PyTorch model on a fixed
+set of sentences and rejected when the mean cosine similarity falls below
+EMBEDDING_PARITY_MIN_COSINE.
+"""
+import inspect
+import json
+import logging
+import os
+import re
+from typing import List, Optional
+
+import numpy as np
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+BACKEND_TORCH = "torch"
+BACKEND_ONNX = "onnx"
+BACKEND_ONNX_INT8 = "onnx_int8"
+BACKENDS = (BACKEND_TORCH, BACKEND_ONNX, BACKEND_ONNX_INT8)
+
+ONNX_MODEL_FILENAME = "model.onnx"
+ONNX_INT8_MODEL_FILENAME = "model-int8.onnx"
+EXPORT_META_FILENAME = "backend.json"
+ONNX_OPSET = 14
+POOLING_MODES = ("mean", "cls", "max")
+
+# Probe sentences for export parity checks: varied length, vocabulary and punctuation
+PARITY_SENTENCES = [
+    "How long does it take to process a refund?",
+    "Invoices are issued on the first business day of every month.",
+    "Passwords must be rotated every ninety days and cannot repeat.",
+    "The quarterly report shows revenue growth of 12% across all regions.",
+    "Employees receive twenty days of annual leave, plus public holidays.",
+    "Laptops are replaced every three years; broken screens go to the help desk.",
+    "What is the approval process for travel above six hours?",
+    "Section 4.2: Data retention. Customer records are kept for seven years after the contract ends.",
+    "ok",
+    "Two-factor authentication is mandatory for administrator accounts.",
+    "The system uses a vector index to retrieve the most relevant passages before generating an answer.",
+    "Onboarding starts with account setup on day one and orientation every Monday morning.",
+    "Returns without a receipt are refunded as store credit.",
+    "Error 503 means the service is temporarily unavailable, retry after a short delay.",
+    "Machine learning models approximate functions from examples rather than explicit rules.",
+    "Please contact support@example.com for questions about your subscription.",
+]
+
+
+def validate_embedding_backend(backend: str) -> str:
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown embedding backend: {backend}. Supported: {', '.join(BACKENDS)}")
+    return backend
+
+
+class EmbeddingBackend:
+    """What the vector store calls on its embedding model"""
+
+    name = ""
+
+    def __init__(self, model_name: str):
+        self.model_name = model_name
+
+    @property
+    def cache_name(self) -> str:
+        # Backends differ slightly in their output, so each gets its own embedding cache
+        return f"{self.model_name}@{self.name}"
+
+    def get_sentence_embedding_dimension(self) -> int:
+        raise NotImplementedError
+
+    def encode(self, sentences: List[str], batch_size: int = 32, show_progress_bar: bool = False,
+               **kwargs) -> np.ndarray:
+        raise NotImplementedError
+
+    def token_lengths(self, sentences: List[str]) -> np.ndarray:
+        """Tokens per sentence after truncation, special tokens included"""
+        raise NotImplementedError
+
+
+class TorchBackend(EmbeddingBackend):
+    """The PyTorch SentenceTransformer"""
+
+    name = BACKEND_TORCH
+
+    def __init__(self, model_name: str, threads: int = 0, model=None):
+        super().__init__(model_name)
+        if threads:
+            import torch
+            torch.set_num_threads(threads)
+        if model is None:
+            from sentence_transformers import SentenceTransformer
+            model = SentenceTransformer(model_name)
+        self.model = model
+
+    @property
+    def cache_name(self) -> str:
+        # Same name the cache used before backends existed, so existing caches stay valid
+        return self.model_name
+
+    def get_sentence_embedding_dimension(self) -> int:
+        return self.model.get_sentence_embedding_dimension()
+
+    def encode(self, sentences: List[str], batch_size: int = 32, show_progress_bar: bool = False,
+               **kwargs) -> np.ndarray:
+        return np.asarray(
+            self.model.encode(sentences, batch_size=batch_size, show_progress_bar=show_progress_bar, **kwargs),
+            dtype=np.float32
+        )
+
+    def token_lengths(self, sentences: List[str]) -> np.ndarray:
+        return _token_lengths(self.model.tokenizer, sentences, self.model.max_seq_length)
+
+
+class OnnxBackend(EmbeddingBackend):
+    """Exported transformer on ONNX Runtime, with the model's pooling and normalization in numpy"""
+
+    name = BACKEND_ONNX
+    model_filename = ONNX_MODEL_FILENAME
+
+    def __init__(self, model_name: str, directory: Optional[str] = None, threads: int = 0,
+                 meta: Optional[dict] = None):
+        super().__init__(model_name)
+        try:
+            import onnxruntime as ort
+        except ImportError as e:
+            raise ImportError(f"EMBEDDING_BACKEND={self.name} needs the onnxruntime package") from e
+        from transformers import AutoTokenizer
+
+        self.directory = directory or export_directory(model_name)
+        # export_onnx passes the metadata of an export it has not parity-checked yet
+        meta = meta or ensure_onnx_export(model_name, self.directory)
+        self.dimension = meta["dimension"]
+        self.pooling = meta["pooling"]
+        self.normalize = meta["normalize"]
+        self.max_seq_length = meta["max_seq_length"]
+        self.input_names = meta["inputs"]
+        self.parity = meta["parity"].get(self.name)
+        if self.parity is not None and self.parity["mean_cosine"] < settings.EMBEDDING_PARITY_MIN_COSINE:
+            raise ValueError(
+                f"{self.name} export of {model_name} disagrees with the PyTorch model: mean cosine "
+                f"{self.parity['mean_cosine']} < EMBEDDING_PARITY_MIN_COSINE {settings.EMBEDDING_PARITY_MIN_COSINE}"
+            )
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if threads:
+            options.intra_op_num_threads = threads
+            options.inter_op_num_threads = 1
+        self.session = ort.InferenceSession(
+            os.path.join(self.directory, self.model_filename), options, providers=["CPUExecutionProvider"]
+        )
+        self.tokenizer = AutoTokenizer.from_pretrained(self.directory)
+        logger.info(f"Loaded {self.name} embedding backend for {model_name} (parity {self.parity})")
+
+    def get_sentence_embedding_dimension(self) -> int:
+        return self.dimension
+
+    def encode(self, sentences: List[str], batch_size: int = 32, show_progress_bar: bool = False,
+               **kwargs) -> np.ndarray:
+        output = np.empty((len(sentences), self.dimension), dtype=np.float32)
+        for start in range(0, len(sentences), batch_size):
+            batch = sentences[start:start + batch_size]
+            encoded = self.tokenizer(batch, padding=True, truncation=True, max_length=self.max_seq_length,
+                                     return_tensors="np")
+            feeds = {name: encoded[name].astype(np.int64) for name in self.input_names}
+            token_embeddings = self.session.run(None, feeds)[0]
+            output[start:start + len(batch)] = pool_embeddings(
+                token_embeddings, feeds["attention_mask"], self.pooling, self.normalize
+            )
+        return output
+
+    def token_lengths(self, sentences: List[str]) -> np.ndarray:
+        return _token_lengths(self.tokenizer, sentences, self.max_seq_length)
+
+
+class QuantizedOnnxBackend(OnnxBackend):
+    """ONNX export with int8 weights: smaller and faster on CPU, slightly less exact"""
+
+    name = BACKEND_ONNX_INT8
+    model_filename = ONNX_INT8_MODEL_FILENAME
+
+
+def _token_lengths(tokenizer, sentences: List[str], max_length: int) -> np.ndarray:
+    encoded = tokenizer(sentences, truncation=True, max_length=max_length)
+    return np.array([len(ids) for ids in encoded["input_ids"]], dtype=np.int64)
+
+
+def pool_embeddings(token_embeddings: np.ndarray, attention_mask: np.ndarray, pooling: str,
+                    normalize: bool) -> np.ndarray:
+    """Sentence vectors from (batch, tokens, d) transformer output, as SentenceTransformer pools them"""
+    mask = attention_mask[:, :, None].astype(np.float32)
+    if pooling == "cls":
+        pooled = token_embeddings[:, 0]
+    elif pooling == "max":
+        pooled = np.where(mask > 0, token_embeddings, -1e9).max(axis=1)
+    else:
+        pooled = (token_embeddings * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+    if normalize:
+        pooled = pooled / np.clip(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None)
+    return pooled.astype(np.float32, copy=False)
+
+
+def check_parity(candidate, reference, sentences: Optional[List[str]] = None) -> dict:
+    """Cosine agreement between two models' embeddings of the same sentences"""
+    sentences = sentences or PARITY_SENTENCES
+    a = np.asarray(candidate.encode(sentences, show_progress_bar=False), dtype=np.float32)
+    b = np.asarray(reference.encode(sentences, show_progress_bar=False), dtype=np.float32)
+    a = a / np.clip(np.linalg.norm(a, axis=1, keepdims=True), 1e-12, None)
+    b = b / np.clip(np.linalg.norm(b, axis=1, keepdims=True), 1e-12, None)
+    cosines = (a * b).sum(axis=1)
+    return {
+        "sentences": len(sentences),
+        "mean_cosine": round(float(cosines.mean()), 6),
+        "min_cosine": round(float(cosines.min()), 6)
+    }
+
+
+def export_directory(model_name: str) -> str:
+    return os.path.join(settings.EMBEDDING_ONNX_DIR, re.sub(r"[^A-Za-z0-9_.-]+", "_", model_name).strip("_"))
+
+
+def ensure_onnx_export(model_name: str, directory: str) -> dict:
+    """Export metadata for `model_name`, exporting and parity-checking it first if needed"""
+    meta_path = os.path.join(directory, EXPORT_META_FILENAME)
+    if os.path.exists(meta_path):
+        with open(meta_path) as f:
+            meta = json.load(f)
+        checked = all(name in meta.get("parity", {}) for name in (BACKEND_ONNX, BACKEND_ONNX_INT8))
+        if meta.get("model") == model_name and meta.get("opset") == ONNX_OPSET and checked:
+            return meta
+    return export_onnx(model_name, directory)
+
+
+def export_onnx(model_name: str, directory: str) -> dict:
+    """Export the transformer of a SentenceTransformer to ONNX plus an int8 copy, then verify both.
+
+    The metadata file is written once, after both parity checks, with a
+    report per backend; a backend whose report falls short of
+    EMBEDDING_PARITY_MIN_COSINE refuses to load without affecting the other.
+    """
+    import torch
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+    from sentence_transformers import SentenceTransformer
+
+    logger.info(f"Exporting {model_name} to ONNX in {directory}")
+    os.makedirs(directory, exist_ok=True)
+    model = SentenceTransformer(model_name, device="cpu")
+    modules = list(model)
+    transformer = next(module for module in modules if hasattr(module, "auto_model"))
+    pooling_modules = [module for module in modules if type(module).__name__ == "Pooling"]
+    pooling = _pooling_mode(pooling_modules[0]) if pooling_modules else "mean"
+    normalize = any(type(module).__name__ == "Normalize" for module in modules)
+
+    encoded = model.tokenizer(PARITY_SENTENCES[:2], padding=True, return_tensors="pt")
+    input_names = [name for name in ("input_ids", "attention_mask", "token_type_ids") if name in encoded]
+
+    class TokenEmbeddings(torch.nn.Module):
+        # Passes inputs by name: positional order of forward() differs between transformers versions
+        def __init__(self, auto_model):
+            super().__init__()
+            self.auto_model = auto_model
+
+        def forward(self, *inputs):
+            return self.auto_model(**dict(zip(input_names, inputs)), return_dict=False)[0]
+
+    wrapped = TokenEmbeddings(transformer.auto_model).eval()
+    dynamic_axes = {name: {0: "batch", 1: "tokens"} for name in input_names}
+    dynamic_axes["token_embeddings"] = {0: "batch", 1: "tokens"}
+    export_kwargs = {}
+    if "dynamo" in inspect.signature(torch.onnx.export).parameters:
+        # Newer torch defaults to the dynamo exporter; the TorchScript one handles these models as-is
+        export_kwargs["dynamo"] = False
+    with torch.no_grad():
+        torch.onnx.export(
+            wrapped, tuple(encoded[name] for name in input_names), os.path.join(directory, ONNX_MODEL_FILENAME),
+            input_names=input_names, output_names=["token_embeddings"], dynamic_axes=dynamic_axes,
+            opset_version=ONNX_OPSET, do_constant_folding=True, **export_kwargs
+        )
+    quantize_dynamic(
+        os.path.join(directory, ONNX_MODEL_FILENAME), os.path.join(directory, ONNX_INT8_MODEL_FILENAME),
+        weight_type=QuantType.QInt8
+    )
+    model.tokenizer.save_pretrained(directory)
+
+    meta = {
+        "model": model_name,
+        "opset": ONNX_OPSET,
+        "dimension": model.get_sentence_embedding_dimension(),
+        "pooling": pooling,
+        "normalize": normalize,
+        "max_seq_length": model.max_seq_length,
+        "inputs": input_names,
+        "parity": {}
+    }
+
+    reference = TorchBackend(model_name, model=model)
+    parity = {
+        backend_class.name: check_parity(backend_class(model_name, directory, meta=meta), reference)
+        for backend_class in (OnnxBackend, QuantizedOnnxBackend)
+    }
+    meta["parity"] = parity
+    _write_meta(os.path.join(directory, EXPORT_META_FILENAME), meta)
+
+    for name, report in parity.items():
+        if report["mean_cosine"] < settings.EMBEDDING_PARITY_MIN_COSINE:
+            logger.warning(f"{name} export of {model_name} failed its parity check, it will not be loaded")
+    logger.info(f"Exported {model_name} to ONNX, parity {parity}")
+    return meta
+
+
+def _pooling_mode(pooling_module) -> str:
+    config = pooling_module.get_config_dict()
+    if isinstance(config.get("pooling_mode"), str):
+        mode = config["pooling_mode"]
+    else:
+        # Older sentence_transformers stores one flag per mode
+        mode = next((name for name in POOLING_MODES if config.get(f"pooling_mode_{name}_token")
+                     or config.get(f"pooling_mode_{name}_tokens")), None)
+    if mode not in POOLING_MODES:
+        raise ValueError(f"Pooling mode {mode} is not supported by the ONNX backends")
+    return mode
+
+
+def _write_meta(path: str, meta: dict):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(meta, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def create_embedding_backend(model_name: str, backend: Optional[str] = None) -> EmbeddingBackend:
+    backend = validate_embedding_backend(backend or settings.EMBEDDING_BACKEND)
+    if backend == BACKEND_TORCH:
+        return TorchBackend(model_name, settings.EMBEDDING_THREADS)
+    if backend == BACKEND_ONNX:
+        return OnnxBackend(model_name, threads=settings.EMBEDDING_THREADS)
+    return QuantizedOnnxBackend(model_name, threads=settings.EMBEDDING_THREADS)
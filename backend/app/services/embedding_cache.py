@@ -0,0 +1,210 @@
+"""
+Disk-backed LRU cache of chunk embeddings.
+
+Each embedding model gets its own pair of slab files: a float32 vector
+slab and a parallel uint64 key slab, both memory-mapped and written in
+place. An index file records which slot holds which key in LRU order as
+of the last checkpoint, and every put or hit since is appended to a
+journal of (key, slot) pairs, so a call costs one small write instead of
+rewriting the index. The journal is folded into a new index once it
+outgrows it, on load and on close. Because every slot also stores its own
+key, a stale index or journal left by a crashed process can never return
+the vector of a different chunk: mismatching slots are treated as misses.
+"""
+import hashlib
+import logging
+import os
+import re
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+_WHITESPACE_RE = re.compile(r"\s+")
+_GROW_SLOTS = 4096
+_JOURNAL_MIN_ENTRIES = 4096  # journal entries allowed before a checkpoint, at least the LRU size
+
+
+def normalize_text(text: str) -> str:
+    return _WHITESPACE_RE.sub(" ", text).strip()
+
+
+def cache_key(text: str) -> int:
+    digest = hashlib.blake2b(normalize_text(text).encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "little")
+
+
+class EmbeddingCache:
+    """LRU cache of (model name, normalized chunk hash) -> embedding, capped at `max_mb`"""
+
+    def __init__(self, directory: str, model_name: str, dimension: int, max_mb: int):
+        self.dimension = dimension
+        self.capacity = max(1, (max_mb * 1024 * 1024) // (dimension * 4 + 8))
+        slug = re.sub(r"[^A-Za-z0-9_.-]+", "_", model_name)
+        self.vectors_path = os.path.join(directory, f"{slug}-{dimension}.f32")
+        self.keys_path = os.path.join(directory, f"{slug}-{dimension}.keys")
+        self.index_path = os.path.join(directory, f"{slug}-{dimension}.lru.npy")
+        self.journal_path = os.path.join(directory, f"{slug}-{dimension}.lru.log")
+        os.makedirs(directory, exist_ok=True)
+
+        self.lru: "OrderedDict[int, int]" = OrderedDict()  # key -> slot, least recent first
+        self.free_slots: List[int] = []
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._vectors: Optional[np.memmap] = None
+        self._keys: Optional[np.memmap] = None
+        self._slots = 0
+        self._journal = None
+        self._journal_entries = 0
+        self._load()
+
+    def get_many(self, texts: List[str]) -> Tuple[Dict[int, np.ndarray], List[int]]:
+        """Cached vectors by position in `texts`, plus the positions that missed"""
+        found: Dict[int, np.ndarray] = {}
+        missing: List[int] = []
+        touched = []
+        with self._lock:
+            for i, text in enumerate(texts):
+                key = cache_key(text)
+                slot = self.lru.get(key)
+                if slot is not None and int(self._keys[slot]) == key:
+                    self.lru.move_to_end(key)
+                    found[i] = np.array(self._vectors[slot])
+                    touched.append((key, slot))
+                else:
+                    if slot is not None:
+                        del self.lru[key]
+                        self.free_slots.append(slot)
+                    missing.append(i)
+            self.hits += len(found)
+            self.misses += len(missing)
+            self._append_journal(touched)
+        return found, missing
+
+    def put_many(self, texts: List[str], vectors: np.ndarray):
+        written = []
+        with self._lock:
+            for text, vector in zip(texts, vectors):
+                key = cache_key(text)
+                slot = self.lru.get(key)
+                if slot is None:
+                    slot = self._allocate_slot()
+                self._vectors[slot] = vector
+                self._keys[slot] = key
+                self.lru[key] = slot
+                self.lru.move_to_end(key)
+                written.append((key, slot))
+            self._append_journal(written)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+            "entries": len(self.lru),
+            "capacity": self.capacity
+        }
+
+    def clear(self):
+        with self._lock:
+            self.lru.clear()
+            self.free_slots = list(range(self._slots))
+            self._checkpoint()
+
+    def close(self):
+        """Checkpoint the LRU order so the next start reads no journal"""
+        with self._lock:
+            if self._journal is not None:
+                self._checkpoint()
+                self._journal.close()
+                self._journal = None
+
+    def _allocate_slot(self) -> int:
+        if self.free_slots:
+            return self.free_slots.pop()
+        if self._slots < self.capacity:
+            if self._slots >= len(self._keys):
+                self._grow(min(self.capacity, max(len(self._keys) * 2, _GROW_SLOTS)))
+            self._slots += 1
+            return self._slots - 1
+        _, slot = self.lru.popitem(last=False)
+        self.evictions += 1
+        return slot
+
+    def _grow(self, slots: int):
+        """Extend both slab files to `slots` entries and remap them"""
+        for path, itemsize in ((self.vectors_path, self.dimension * 4), (self.keys_path, 8)):
+            with open(path, "ab") as f:
+                f.truncate(slots * itemsize)
+        self._open(slots)
+
+    def _open(self, slots: int):
+        self._vectors = np.memmap(self.vectors_path, dtype=np.float32, mode="r+", shape=(slots, self.dimension))
+        self._keys = np.memmap(self.keys_path, dtype=np.uint64, mode="r+", shape=(slots,))
+
+    def _append_journal(self, entries: List[Tuple[int, int]]):
+        """Log LRU moves; slab pages are written back by the OS"""
+        if not entries or self._journal is None:
+            return
+        self._journal.write(np.array(entries, dtype=np.uint64).tobytes())
+        self._journal.flush()
+        self._journal_entries += len(entries)
+        if self._journal_entries > max(len(self.lru), _JOURNAL_MIN_ENTRIES):
+            self._checkpoint()
+
+    def _checkpoint(self):
+        """Write the full LRU order as a new index and empty the journal"""
+        entries = np.array(list(self.lru.items()), dtype=np.uint64).reshape(-1, 2)
+        tmp_path = self.index_path + ".tmp.npy"
+        np.save(tmp_path, entries)
+        os.replace(tmp_path, self.index_path)
+        if self._journal is not None:
+            self._journal.truncate(0)
+        self._journal_entries = 0
+
+    def _read_order(self) -> "OrderedDict[int, int]":
+        """key -> slot in LRU order: the index with the journal replayed over it"""
+        order: "OrderedDict[int, int]" = OrderedDict()
+        parts = [np.load(self.index_path)] if os.path.exists(self.index_path) else []
+        if os.path.exists(self.journal_path):
+            journal = np.fromfile(self.journal_path, dtype=np.uint64)
+            parts.append(journal[:len(journal) // 2 * 2].reshape(-1, 2))  # drop a torn last entry
+        for part in parts:
+            for key, slot in part.tolist():
+                order[key] = slot
+                order.move_to_end(key)
+        return order
+
+    def _load(self):
+        slots = 0
+        if os.path.exists(self.keys_path):
+            slots = min(os.path.getsize(self.keys_path) // 8,
+                        os.path.getsize(self.vectors_path) // (self.dimension * 4)
+                        if os.path.exists(self.vectors_path) else 0)
+        if slots:
+            self._open(slots)
+        else:
+            self._grow(min(self.capacity, _GROW_SLOTS))
+
+        used = set()
+        try:
+            for key, slot in self._read_order().items():
+                if slot < slots and slot < self.capacity and slot not in used and int(self._keys[slot]) == key:
+                    self.lru[key] = slot
+                    used.add(slot)
+        except Exception as e:
+            logger.warning(f"Could not read embedding cache index, starting empty: {str(e)}")
+            self.lru.clear()
+            used = set()
+        self._slots = min(slots, self.capacity)
+        self.free_slots = [slot for slot in range(self._slots) if slot not in used]
+        self._journal = open(self.journal_path, "ab")
+        self._checkpoint()
+        logger.info(f"Embedding cache loaded with {len(self.lru)} entries ({self.vectors_path})")
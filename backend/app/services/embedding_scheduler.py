@@ -0,0 +1,126 @@
+"""
+Micro-batching for query embeddings.
+
+Concurrent searches each need one query vector, and encoding them one at a
+time leaves most of the model's matrix throughput unused. Callers hand their
+text to an EmbeddingScheduler and block on a future; a single worker thread
+collects whatever arrives within EMBEDDING_BATCH_WINDOW_MS (or until
+EMBEDDING_BATCH_MAX_SIZE texts are waiting), encodes them in one call and
+resolves every caller's future with its own row.
+"""
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, List, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class EmbeddingScheduler:
+    """Coalesces single-text encode requests from many threads into batched encode calls"""
+
+    def __init__(self, embedding_model: Any, window_ms: float = 2.0, max_batch: int = 32):
+        if max_batch < 1:
+            raise ValueError("Embedding batches need room for at least one text")
+        self.embedding_model = embedding_model
+        self.window = max(window_ms, 0.0) / 1000
+        self.max_batch = max_batch
+        self._queue: queue.Queue = queue.Queue()
+        self._worker: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+        self._closed = False
+        self.batches = 0
+        self.texts = 0
+        self.largest_batch = 0
+        self.total_wait = 0.0
+        self.errors = 0
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        """Embed `texts` as part of the next batch; blocks until their rows are ready"""
+        futures = [self.submit(text) for text in texts]
+        return np.stack([future.result() for future in futures]).astype(np.float32, copy=False)
+
+    def submit(self, text: str) -> Future:
+        """Queue one text; the future resolves to its (d,) float32 embedding"""
+        if self._closed:
+            raise RuntimeError("Embedding scheduler is closed")
+        self._ensure_worker()
+        future: Future = Future()
+        self._queue.put((text, future, time.perf_counter()))
+        return future
+
+    def close(self):
+        self._closed = True
+        if self._worker is not None:
+            self._queue.put(None)
+            self._worker.join()
+
+    def stats(self) -> dict:
+        return {
+            "window_ms": self.window * 1000,
+            "max_batch": self.max_batch,
+            "batches": self.batches,
+            "texts": self.texts,
+            "mean_batch_size": round(self.texts / self.batches, 2) if self.batches else 0.0,
+            "batch_fill": round(self.texts / (self.batches * self.max_batch), 4) if self.batches else 0.0,
+            "largest_batch": self.largest_batch,
+            "mean_wait_ms": round(self.total_wait / self.texts * 1000, 3) if self.texts else 0.0,
+            "errors": self.errors
+        }
+
+    def _ensure_worker(self):
+        if self._worker is not None:
+            return
+        with self._start_lock:
+            if self._worker is None:
+                self._worker = threading.Thread(target=self._run, name="embedding-batcher", daemon=True)
+                self._worker.start()
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            batch = [item]
+            stopping = False
+            deadline = time.perf_counter() + self.window
+            while len(batch) < self.max_batch:
+                try:
+                    remaining = deadline - time.perf_counter()
+                    item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    stopping = True
+                    break
+                batch.append(item)
+            self._encode_batch(batch)
+            if stopping:
+                return
+
+    def _encode_batch(self, batch: list):
+        started = time.perf_counter()
+        # Identical texts in one window are encoded once
+        unique = list(dict.fromkeys(text for text, _, _ in batch))
+        try:
+            vectors = np.asarray(
+                self.embedding_model.encode(unique, show_progress_bar=False), dtype=np.float32
+            )
+        except Exception as e:
+            self.errors += 1
+            logger.error(f"Batched query embedding failed: {str(e)}")
+            for _, future, _ in batch:
+                future.set_exception(e)
+            return
+
+        rows = {text: vectors[i] for i, text in enumerate(unique)}
+        for text, future, enqueued in batch:
+            self.total_wait += started - enqueued
+            future.set_result(rows[text])
+        self.batches += 1
+        self.texts += len(batch)
+        self.largest_batch = max(self.largest_batch, len(batch))
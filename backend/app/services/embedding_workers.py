@@ -0,0 +1,189 @@
+"""
+Multi-process chunk embedding for bulk ingestion.
+
+One process encoding every chunk of a large PDF leaves the other cores idle.
+EmbeddingProcessPool splits the chunks into batches and encodes them on
+EMBEDDING_PROCESS_WORKERS worker processes. Each worker loads the embedding
+backend once, when it starts, and writes its rows straight into a shared
+memory block the parent allocated for the whole call, so vectors are never
+pickled on the way back.
+
+Workers are started with "spawn" (forking a process that already loaded
+torch or onnxruntime is unsafe) and each is limited to cpu_count / workers
+intra-op threads, so the pool together uses the machine without
+oversubscribing it. If a worker dies (out of memory, a crash in the model
+library) the pool is replaced and the call retried once on fresh
+processes. Batches are planned in the parent: length-sorted under
+a token budget when EMBEDDING_TOKEN_BUDGET is set (see token_batching),
+otherwise fixed-size slices in input order.
+"""
+import logging
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import shared_memory
+from typing import Any, List, Optional
+
+import numpy as np
+
+from app.services.token_batching import (
+    estimate_token_lengths, fixed_batches, padding_efficiency, plan_batches, token_lengths
+)
+
+logger = logging.getLogger(__name__)
+
+_THREAD_ENV_VARS = ("OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS", "NUMEXPR_NUM_THREADS")
+
+# Set in each worker process by _init_worker
+_worker_model = None
+
+
+def _init_worker(model_name: str, backend: str, threads: int):
+    global _worker_model
+    # Before the model's libraries are imported, so their thread pools start at this size
+    for var in _THREAD_ENV_VARS:
+        os.environ[var] = str(threads)
+    os.environ["TOKENIZERS_PARALLELISM"] = "false"
+
+    from app.core.config import settings
+    from app.services.embedding_backends import create_embedding_backend
+    settings.EMBEDDING_THREADS = threads
+    _worker_model = create_embedding_backend(model_name, backend)
+
+
+def _encode_into(texts: List[str], rows: np.ndarray, shm_name: str, total: int, dimension: int) -> int:
+    """Encode `texts` as one batch into `rows` of the parent's (total, dimension) float32 block"""
+    vectors = np.asarray(_worker_model.encode(texts, batch_size=len(texts), show_progress_bar=False),
+                         dtype=np.float32)
+    block = shared_memory.SharedMemory(name=shm_name)
+    try:
+        output = np.ndarray((total, dimension), dtype=np.float32, buffer=block.buf)
+        output[rows] = vectors
+        del output
+    finally:
+        block.close()
+    return len(texts)
+
+
+class EmbeddingProcessPool:
+    """Encodes large chunk lists across worker processes, results returned through shared memory"""
+
+    def __init__(self, model_name: str, backend: str, dimension: int, workers: int,
+                 batch_size: int = 64, threads_per_worker: Optional[int] = None,
+                 token_budget: int = 0, max_batch: int = 256, length_model: Any = None):
+        if workers < 1:
+            raise ValueError("Embedding process pool needs at least one worker")
+        self.model_name = model_name
+        self.backend = backend
+        self.dimension = dimension
+        self.workers = workers
+        self.batch_size = batch_size
+        self.token_budget = token_budget
+        self.max_batch = max_batch
+        self.length_model = length_model  # the in-process model, only used to count tokens
+        self.threads_per_worker = threads_per_worker or max(1, (os.cpu_count() or 1) // workers)
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._start_lock = threading.Lock()
+        self.calls = 0
+        self.texts = 0
+        self.encode_seconds = 0.0
+        self.real_tokens = 0
+        self.padded_tokens = 0
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        """(len(texts), dimension) float32 embeddings, in input order"""
+        if not texts:
+            return np.empty((0, self.dimension), dtype=np.float32)
+
+        start_time = time.perf_counter()
+        batches = self._plan_batches(texts)
+        block = shared_memory.SharedMemory(create=True, size=len(texts) * self.dimension * 4)
+        try:
+            executor = self._ensure_executor()
+            try:
+                self._encode_batches(executor, texts, batches, block.name)
+            except BrokenProcessPool as e:
+                # Every row is rewritten by the retry, so the block can be reused
+                logger.warning(f"Embedding worker process died ({str(e)}), retrying on fresh processes")
+                self._discard_executor(executor)
+                self._encode_batches(self._ensure_executor(), texts, batches, block.name)
+            rows = np.ndarray((len(texts), self.dimension), dtype=np.float32, buffer=block.buf)
+            embeddings = rows.copy()
+            del rows
+        finally:
+            block.close()
+            block.unlink()
+
+        elapsed = time.perf_counter() - start_time
+        self.calls += 1
+        self.texts += len(texts)
+        self.encode_seconds += elapsed
+        logger.info(f"Embedded {len(texts)} chunks on {self.workers} worker processes in {elapsed:.2f}s")
+        return embeddings
+
+    def _encode_batches(self, executor: ProcessPoolExecutor, texts: List[str], batches: List[np.ndarray],
+                        shm_name: str):
+        futures = [
+            executor.submit(_encode_into, [texts[i] for i in batch], batch, shm_name, len(texts), self.dimension)
+            for batch in batches
+        ]
+        wait(futures)
+        for future in futures:
+            future.result()  # re-raise a worker's error
+
+    def _plan_batches(self, texts: List[str]) -> List[np.ndarray]:
+        if self.token_budget <= 0:
+            return fixed_batches(len(texts), self.batch_size)
+        if self.length_model is not None:
+            lengths = token_lengths(self.length_model, texts)
+        else:
+            lengths = estimate_token_lengths(texts)
+        batches = plan_batches(lengths, self.token_budget, self.max_batch)
+        real, padded = padding_efficiency(lengths, batches)
+        self.real_tokens += real
+        self.padded_tokens += padded
+        return batches
+
+    def stats(self) -> dict:
+        return {
+            "workers": self.workers,
+            "threads_per_worker": self.threads_per_worker,
+            "batch_size": self.batch_size,
+            "token_budget": self.token_budget,
+            "padding_efficiency": round(self.real_tokens / self.padded_tokens, 4) if self.padded_tokens else None,
+            "started": self._executor is not None,
+            "calls": self.calls,
+            "texts": self.texts,
+            "texts_per_second": round(self.texts / self.encode_seconds, 1) if self.encode_seconds else 0.0
+        }
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+            logger.info("Embedding worker processes stopped")
+
+    def _discard_executor(self, executor: ProcessPoolExecutor):
+        """Drop a pool whose processes broke; the next call starts fresh ones"""
+        with self._start_lock:
+            if self._executor is executor:
+                self._executor = None
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    def _ensure_executor(self) -> ProcessPoolExecutor:
+        with self._start_lock:
+            if self._executor is None:
+                logger.info(
+                    f"Starting {self.workers} embedding worker processes "
+                    f"({self.threads_per_worker} threads each, {self.backend} backend)"
+                )
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=_init_worker,
+                    initargs=(self.model_name, self.backend, self.threads_per_worker)
+                )
+            return self._executor
@@ -0,0 +1,97 @@
+"""
+Bounded thread pools for blocking work called from async request handlers.
+
+Ingest work (PDF extraction, chunk embedding, index writes) and query work
+(query embedding, FAISS search) run on separate pools, off the event loop,
+so a burst of uploads can occupy every ingest thread without delaying
+questions. Each pool also caps how many jobs may wait for a thread; past
+that callers get PoolSaturatedError (served as 503) instead of an
+unbounded backlog.
+"""
+import asyncio
+import functools
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class PoolSaturatedError(RuntimeError):
+    """Raised when a pool already has its maximum number of jobs queued or running"""
+
+
+class WorkPool:
+    """Fixed-size thread pool with a cap on admitted jobs, awaitable from the event loop"""
+
+    def __init__(self, name: str, workers: int, max_pending: int):
+        self.name = name
+        self.workers = workers
+        self.max_pending = max_pending
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix=f"{name}-pool")
+        self._lock = threading.Lock()
+        self._admitted = 0
+        self.completed = 0
+        self.rejected = 0
+
+    async def run(self, fn: Callable, *args, **kwargs) -> Any:
+        """Run `fn(*args, **kwargs)` on the pool and await its result"""
+        with self._lock:
+            if self._admitted >= self.workers + self.max_pending:
+                self.rejected += 1
+                raise PoolSaturatedError(f"The {self.name} queue is full, try again shortly")
+            self._admitted += 1
+        try:
+            future = self._executor.submit(functools.partial(fn, *args, **kwargs))
+        except BaseException:
+            with self._lock:
+                self._admitted -= 1
+            raise
+        # The slot is held until the job itself finishes: a cancelled caller
+        # stops waiting, but a job already running keeps its thread busy
+        future.add_done_callback(self._release)
+        return await asyncio.wrap_future(future)
+
+    def _release(self, future):
+        with self._lock:
+            self._admitted -= 1
+            self.completed += 1
+
+    def stats(self) -> dict:
+        return {
+            "workers": self.workers,
+            "max_pending": self.max_pending,
+            "in_flight": self._admitted,
+            "completed": self.completed,
+            "rejected": self.rejected
+        }
+
+    def shutdown(self):
+        self._executor.shutdown(wait=True)
+        logger.info(f"{self.name} pool shut down")
+
+
+# Global instances
+ingest_pool = WorkPool("ingest", settings.INGEST_WORKERS, settings.INGEST_MAX_PENDING)
+query_pool = WorkPool("query", settings.QUERY_WORKERS, settings.QUERY_MAX_PENDING)
+
+
+# Convenience functions
+async def run_ingest(fn: Callable, *args, **kwargs) -> Any:
+    return await ingest_pool.run(fn, *args, **kwargs)
+
+
+async def run_query(fn: Callable, *args, **kwargs) -> Any:
+    return await query_pool.run(fn, *args, **kwargs)
+
+
+def get_pool_stats() -> dict:
+    return {"ingest": ingest_pool.stats(), "query": query_pool.stats()}
+
+
+def shutdown_pools():
+    ingest_pool.shutdown()
+    query_pool.shutdown()
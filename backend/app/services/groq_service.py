@@ -3,14 +3,15 @@
 FILE 4: app/services/groq_service.py
 =============================================================================
 """
-from groq import Groq
 from typing import List, Dict, Optional
+import asyncio
 import logging
 from functools import lru_cache
 import time
 
 from app.core.config import settings
 from app.services.prompt_template import build_prompt, build_system_prompt
+from app.utils.lazy import LazyResource
 
 logger = logging.getLogger(__name__)
 
@@ -20,7 +21,9 @@ class GroqService:
     def __init__(self):
         if not settings.GROQ_API_KEY:
             raise ValueError("GROQ_API_KEY not found in environment variables")
+        from groq import AsyncGroq, Groq
         self.client = Groq(api_key=settings.GROQ_API_KEY)
+        self.async_client = AsyncGroq(api_key=settings.GROQ_API_KEY)
         self.model = settings.GROQ_MODEL
         self.max_retries = 3
         self.retry_delay = 1
@@ -37,31 +40,83 @@ class GroqService:
         start_time = time.time()
         
         try:
-            combined_context = "\n\n".join(contexts) if contexts else ""
-            prompt = build_prompt(combined_context, query, chat_history)
+            prompt = self._build_prompt(query, contexts, chat_history)
             response = self._generate_with_retry(prompt, temperature, max_tokens)
+            return self._build_result(response, contexts, start_time)
             
-            processing_time = time.time() - start_time
-            
-            result = {
-                "answer": response["content"],
-                "model": response["model"],
-                "tokens_used": response["usage"],
-                "processing_time": processing_time,
-                "contexts_used": len(contexts)
-            }
-            
-            logger.info(
-                f"Generated answer in {processing_time:.2f}s, "
-                f"tokens: {response['usage']['total_tokens']}"
-            )
-            
-            return result
+        except Exception as e:
+            logger.error(f"Answer generation failed: {str(e)}")
+            raise
+    
+    async def generate_answer_async(
+        self,
+        query: str,
+        contexts: List[str],
+        chat_history: List[Dict],
+        temperature: float = 0.7,
+        max_tokens: int = 1024
+    ) -> Dict[str, any]:
+        """Generate an answer without blocking the event loop or holding a worker thread"""
+        start_time = time.time()
+        
+        try:
+            prompt = self._build_prompt(query, contexts, chat_history)
+            response = await self._generate_with_retry_async(prompt, temperature, max_tokens)
+            return self._build_result(response, contexts, start_time)
             
         except Exception as e:
             logger.error(f"Answer generation failed: {str(e)}")
             raise
     
+    @staticmethod
+    def _build_prompt(query: str, contexts: List[str], chat_history: List[Dict]) -> str:
+        combined_context = "\n\n".join(contexts) if contexts else ""
+        return build_prompt(combined_context, query, chat_history)
+    
+    @staticmethod
+    def _build_result(response: Dict, contexts: List[str], start_time: float) -> Dict[str, any]:
+        processing_time = time.time() - start_time
+        
+        result = {
+            "answer": response["content"],
+            "model": response["model"],
+            "tokens_used": response["usage"],
+            "processing_time": processing_time,
+            "contexts_used": len(contexts)
+        }
+        
+        logger.info(
+            f"Generated answer in {processing_time:.2f}s, "
+            f"tokens: {response['usage']['total_tokens']}"
+        )
+        
+        return result
+    
+    def _completion_request(self, prompt: str, temperature: float, max_tokens: int) -> Dict:
+        return {
+            "model": self.model,
+            "messages": [
+                {"role": "system", "content": build_system_prompt()},
+                {"role": "user", "content": prompt}
+            ],
+            "temperature": temperature,
+            "max_tokens": max_tokens,
+            "top_p": 1,
+            "stream": False
+        }
+    
+    @staticmethod
+    def _parse_response(response) -> Dict:
+        return {
+            "content": response.choices[0].message.content,
+            "model": response.model,
+            "usage": {
+                "prompt_tokens": response.usage.prompt_tokens,
+                "completion_tokens": response.usage.completion_tokens,
+                "total_tokens": response.usage.total_tokens
+            }
+        }
+    
     def _generate_with_retry(self, prompt: str, temperature: float, max_tokens: int) -> Dict:
         """Generate response with retry logic"""
         last_error = None
@@ -69,26 +124,9 @@ class GroqService:
         for attempt in range(self.max_retries):
             try:
                 response = self.client.chat.completions.create(
-                    model=self.model,
-                    messages=[
-                        {"role": "system", "content": build_system_prompt()},
-                        {"role": "user", "content": prompt}
-                    ],
-                    temperature=temperature,
-                    max_tokens=max_tokens,
-                    top_p=1,
-                    stream=False
+                    **self._completion_request(prompt, temperature, max_tokens)
                 )
-                
-                return {
-                    "content": response.choices[0].message.content,
-                    "model": response.model,
-                    "usage": {
-                        "prompt_tokens": response.usage.prompt_tokens,
-                        "completion_tokens": response.usage.completion_tokens,
-                        "total_tokens": response.usage.total_tokens
-                    }
-                }
+                return self._parse_response(response)
                 
             except Exception as e:
                 last_error = e
@@ -99,9 +137,30 @@ class GroqService:
                     continue
                 else:
                     raise last_error
+    
+    async def _generate_with_retry_async(self, prompt: str, temperature: float, max_tokens: int) -> Dict:
+        """Async variant of _generate_with_retry; waits between attempts with asyncio.sleep"""
+        last_error = None
+        
+        for attempt in range(self.max_retries):
+            try:
+                response = await self.async_client.chat.completions.create(
+                    **self._completion_request(prompt, temperature, max_tokens)
+                )
+                return self._parse_response(response)
+                
+            except Exception as e:
+                last_error = e
+                logger.warning(f"Attempt {attempt + 1} failed: {str(e)}")
+                
+                if attempt < self.max_retries - 1:
+                    await asyncio.sleep(self.retry_delay * (attempt + 1))
+                    continue
+                else:
+                    raise last_error
 
-# Global instance
-groq_service = GroqService()
+# Global instance, the groq SDK is imported when it is first used
+groq_service = LazyResource("groq_service", GroqService)
 
 # Convenience function
 def generate_answer_with_history(query: str, contexts: List[str], chat_history: List[Dict]) -> str:
@@ -0,0 +1,344 @@
+"""
+FAISS index construction, training and evaluation helpers used by the vector store.
+"""
+import logging
+import time
+from typing import Dict, Optional
+
+import faiss
+import numpy as np
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+INDEX_FLAT = "flat"
+INDEX_IVF_FLAT = "ivf_flat"
+INDEX_HNSW = "hnsw"
+INDEX_SQ8 = "sq8"
+INDEX_SQ_FP16 = "sq_fp16"
+INDEX_IVF_PQ = "ivf_pq"
+INDEX_BINARY = "binary"
+
+INDEX_TYPES = (INDEX_FLAT, INDEX_IVF_FLAT, INDEX_HNSW, INDEX_SQ8, INDEX_SQ_FP16, INDEX_IVF_PQ, INDEX_BINARY)
+
+# Index types that store compressed codes; their distances are approximate
+LOSSY_INDEX_TYPES = (INDEX_SQ8, INDEX_SQ_FP16, INDEX_IVF_PQ, INDEX_BINARY)
+
+
+def binarize(vectors: np.ndarray) -> np.ndarray:
+    """Sign-binarize float vectors into packed uint8 codes (one bit per dimension)"""
+    return np.packbits(np.asarray(vectors) > 0, axis=1)
+
+
+class BinaryQuantizedIndex:
+    """Float-vector facade over a FAISS binary index searched by Hamming distance.
+
+    Distances are bit differences, so results must be re-scored against the
+    full-precision vectors before they are returned to callers.
+    """
+
+    def __init__(self, dimension: int, index: Optional[faiss.IndexBinary] = None):
+        if dimension % 8 != 0:
+            raise ValueError(f"Binary index needs a dimension divisible by 8, got {dimension}")
+        self.d = dimension
+        self.index = index if index is not None else faiss.IndexBinaryFlat(dimension)
+        self.is_trained = True
+
+    @property
+    def ntotal(self) -> int:
+        return self.index.ntotal
+
+    def add(self, x: np.ndarray):
+        self.index.add(binarize(x))
+
+    def search(self, x: np.ndarray, k: int, allowed: Optional[np.ndarray] = None):
+        if allowed is None:
+            distances, indices = self.index.search(binarize(x), k)
+            return distances.astype(np.float32), indices
+
+        # FAISS binary indexes reject SearchParameters, so an IDSelector cannot be
+        # pushed down; only the codes of allowed rows are scanned instead
+        rows = np.flatnonzero(allowed)
+        out_distances = np.full((len(x), k), np.inf, dtype=np.float32)
+        out_indices = np.full((len(x), k), -1, dtype=np.int64)
+        fetch_k = min(k, len(rows))
+        if fetch_k:
+            subset = faiss.IndexBinaryFlat(self.d)
+            subset.add(self._codes()[rows])
+            distances, positions = subset.search(binarize(x), fetch_k)
+            out_distances[:, :fetch_k] = distances
+            out_indices[:, :fetch_k] = rows[positions]
+        return out_distances, out_indices
+
+    def _codes(self) -> np.ndarray:
+        """Packed codes of every stored vector, a view when the index is flat"""
+        if isinstance(self.index, faiss.IndexBinaryFlat):
+            return faiss.rev_swig_ptr(self.index.xb.data(), self.index.xb.size()).reshape(-1, self.d // 8)
+        return self.index.reconstruct_n(0, self.ntotal)
+
+
+def validate_index_type(index_type: str) -> str:
+    """Normalize an index type name and make sure it is supported"""
+    index_type = (index_type or INDEX_FLAT).lower()
+    if index_type not in INDEX_TYPES:
+        raise ValueError(
+            f"Unsupported index type '{index_type}'. Expected one of: {', '.join(INDEX_TYPES)}"
+        )
+    return index_type
+
+
+def build_index(index_type: str, dimension: int) -> faiss.Index:
+    """Create an empty index of the requested type"""
+    index_type = validate_index_type(index_type)
+
+    if index_type == INDEX_IVF_FLAT:
+        quantizer = faiss.IndexFlatL2(dimension)
+        index = faiss.IndexIVFFlat(quantizer, dimension, settings.IVF_NLIST, faiss.METRIC_L2)
+    elif index_type == INDEX_HNSW:
+        index = faiss.IndexHNSWFlat(dimension, settings.HNSW_M)
+        index.hnsw.efConstruction = settings.HNSW_EF_CONSTRUCTION
+    elif index_type == INDEX_SQ8:
+        index = faiss.IndexScalarQuantizer(dimension, faiss.ScalarQuantizer.QT_8bit, faiss.METRIC_L2)
+    elif index_type == INDEX_SQ_FP16:
+        index = faiss.IndexScalarQuantizer(dimension, faiss.ScalarQuantizer.QT_fp16, faiss.METRIC_L2)
+    elif index_type == INDEX_BINARY:
+        return BinaryQuantizedIndex(dimension)
+    elif index_type == INDEX_IVF_PQ:
+        if dimension % settings.PQ_M != 0:
+            raise ValueError(f"PQ_M={settings.PQ_M} must divide the embedding dimension {dimension}")
+        quantizer = faiss.IndexFlatL2(dimension)
+        index = faiss.IndexIVFPQ(quantizer, dimension, settings.IVF_NLIST, settings.PQ_M, settings.PQ_NBITS)
+    else:
+        index = faiss.IndexFlatL2(dimension)
+
+    configure_search(index)
+    return index
+
+
+def configure_search(index: faiss.Index) -> None:
+    """Apply the configured query-time knobs (nprobe / efSearch) to an index"""
+    ivf = _as_ivf(index)
+    if ivf is not None:
+        ivf.nprobe = settings.IVF_NPROBE
+    if isinstance(index, faiss.IndexHNSW):
+        index.hnsw.efSearch = settings.HNSW_EF_SEARCH
+
+
+def training_threshold(index_type: str) -> int:
+    """Number of vectors required before an index of this type can be trained"""
+    index_type = validate_index_type(index_type)
+    if index_type in (INDEX_IVF_FLAT, INDEX_IVF_PQ):
+        return settings.IVF_NLIST * settings.IVF_MIN_TRAIN_FACTOR
+    if index_type == INDEX_SQ8:
+        return settings.SQ_MIN_TRAIN_VECTORS
+    return 0
+
+
+def requires_training(index_type: str) -> bool:
+    return training_threshold(index_type) > 0
+
+
+def is_lossy(index_type: str) -> bool:
+    """Whether the index returns approximate distances that benefit from exact re-scoring"""
+    return index_type in LOSSY_INDEX_TYPES
+
+
+def rerank_candidates(index_type: str) -> int:
+    """How many candidates to re-score exactly for this index type (0 = no re-scoring)"""
+    if index_type == INDEX_BINARY:
+        return settings.BINARY_RERANK_CANDIDATES
+    if settings.RERANK_EXACT and is_lossy(index_type):
+        return settings.RERANK_CANDIDATES
+    return 0
+
+
+def write_index(index, path: str):
+    """Persist a float or binary-quantized index"""
+    if isinstance(index, BinaryQuantizedIndex):
+        faiss.write_index_binary(index.index, path)
+    else:
+        faiss.write_index(index, path)
+
+
+def read_index(path: str, index_type: str, io_flags: int = 0):
+    """Load an index written by `write_index`; `index_type` selects the binary reader"""
+    if index_type == INDEX_BINARY:
+        binary = faiss.read_index_binary(path, io_flags)
+        return BinaryQuantizedIndex(binary.d, binary)
+    index = faiss.read_index(path, io_flags)
+    configure_search(index)
+    return index
+
+
+def train_index(index_type: str, dimension: int, vectors: np.ndarray) -> faiss.Index:
+    """Build, train and fill an index of the requested type from raw vectors"""
+    index = build_index(index_type, dimension)
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+
+    if not index.is_trained:
+        start = time.time()
+        index.train(vectors)
+        logger.info(f"Trained {index_type} index on {len(vectors)} vectors in {time.time() - start:.2f}s")
+
+    if len(vectors):
+        index.add(vectors)
+    return index
+
+
+def refill_index(index, index_type: str, dimension: int, vectors: np.ndarray):
+    """Empty copy of a trained index refilled with `vectors`.
+
+    Keeps learned state such as IVF centroids or scalar-quantizer ranges, so
+    dropping deleted rows does not require retraining.
+    """
+    if isinstance(index, faiss.Index) and index.is_trained:
+        fresh = faiss.clone_index(index)
+        fresh.reset()
+        configure_search(fresh)
+    else:
+        fresh = build_index(index_type, dimension)
+    if len(vectors):
+        fresh.add(np.ascontiguousarray(vectors, dtype=np.float32))
+    return fresh
+
+
+def clone_index(index):
+    """Independent copy of a float or binary-quantized index"""
+    if isinstance(index, BinaryQuantizedIndex):
+        return BinaryQuantizedIndex(index.d, faiss.deserialize_index_binary(faiss.serialize_index_binary(index.index)))
+    return faiss.clone_index(index)
+
+
+def search_index(index, x: np.ndarray, k: int, allowed: Optional[np.ndarray] = None):
+    """Search an index, restricted to rows where the boolean `allowed` mask is True.
+
+    Native FAISS indexes get the mask pushed down as an IDSelector, so they
+    only score matching vectors; wrapper indexes handle the mask themselves.
+    """
+    if allowed is None:
+        return index.search(x, k)
+    if not isinstance(index, faiss.Index):
+        return index.search(x, k, allowed=allowed)
+
+    selector = faiss.IDSelectorBitmap(np.packbits(allowed, bitorder="little"))
+    return index.search(x, k, params=search_parameters(index, selector))
+
+
+def search_parameters(index: faiss.Index, selector: faiss.IDSelector) -> faiss.SearchParameters:
+    """Search parameters carrying a selector plus the index's own nprobe / efSearch"""
+    ivf = _as_ivf(index)
+    if ivf is not None:
+        return faiss.SearchParametersIVF(sel=selector, nprobe=ivf.nprobe)
+    if isinstance(index, faiss.IndexHNSW):
+        return faiss.SearchParametersHNSW(sel=selector, efSearch=index.hnsw.efSearch)
+    return faiss.SearchParameters(sel=selector)
+
+
+def exact_search(queries: np.ndarray, vectors: np.ndarray, k: int):
+    """Brute-force squared-L2 top-k of every query against a block of vectors"""
+    k = min(k, len(vectors))
+    if not k:
+        return (np.full((len(queries), 0), np.inf, dtype=np.float32),
+                np.full((len(queries), 0), -1, dtype=np.int64))
+    return faiss.knn(np.ascontiguousarray(queries, dtype=np.float32),
+                     np.ascontiguousarray(vectors, dtype=np.float32), k)
+
+
+def reconstruct_vectors(index: faiss.Index) -> np.ndarray:
+    """Return every stored vector of an index as a float32 matrix"""
+    if index.ntotal == 0:
+        return np.zeros((0, index.d), dtype=np.float32)
+
+    ivf = _as_ivf(index)
+    if ivf is not None:
+        ivf.make_direct_map()
+    return index.reconstruct_n(0, index.ntotal)
+
+
+def rerank_exact(query: np.ndarray, ids: np.ndarray, vectors: np.ndarray, k: int):
+    """Re-score one query's candidates against their full-precision vectors.
+
+    `vectors` holds the rows for `ids` in the same order. Returns the k best
+    (distances, ids) by exact squared L2 distance.
+    """
+    valid = ids >= 0
+    ids, vectors = ids[valid], vectors[valid]
+    distances = ((vectors - query) ** 2).sum(axis=1)
+    order = np.argsort(distances, kind="stable")[:k]
+    return distances[order].astype(np.float32), ids[order]
+
+
+def evaluate_recall(
+    index: faiss.Index,
+    vectors: np.ndarray,
+    queries: np.ndarray,
+    k: int = 10,
+    rerank_candidates: int = 0
+) -> Dict[str, float]:
+    """Compare an index against exact (flat) search over the same vectors.
+
+    Returns recall@k together with average per-query latency of both searches.
+    With `rerank_candidates`, that many candidates are fetched and re-scored
+    exactly against `vectors` before taking the top k.
+    """
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    queries = np.ascontiguousarray(queries, dtype=np.float32)
+    k = min(k, len(vectors))
+    if k == 0 or len(queries) == 0:
+        return {"recall": 1.0, "k": k, "queries": 0, "latency_ms": 0.0, "flat_latency_ms": 0.0}
+
+    exact = faiss.IndexFlatL2(vectors.shape[1])
+    exact.add(vectors)
+
+    start = time.perf_counter()
+    _, truth = exact.search(queries, k)
+    flat_latency = (time.perf_counter() - start) / len(queries)
+
+    start = time.perf_counter()
+    if rerank_candidates > k:
+        _, candidates = index.search(queries, min(rerank_candidates, len(vectors)))
+        found = [
+            rerank_exact(query, ids, vectors[np.maximum(ids, 0)], k)[1]
+            for query, ids in zip(queries, candidates)
+        ]
+        found = np.array([np.pad(f, (0, k - len(f)), constant_values=-1) for f in found])
+    else:
+        _, found = index.search(queries, k)
+    latency = (time.perf_counter() - start) / len(queries)
+
+    hits = sum(len(set(t) & set(f)) for t, f in zip(truth.tolist(), found.tolist()))
+    return {
+        "recall": hits / float(len(queries) * k),
+        "k": k,
+        "queries": len(queries),
+        "latency_ms": latency * 1000,
+        "flat_latency_ms": flat_latency * 1000,
+    }
+
+
+def index_bytes_per_vector(index: faiss.Index) -> float:
+    """Serialized size of an index divided by its vector count"""
+    if index.ntotal == 0:
+        return 0.0
+    if isinstance(index, BinaryQuantizedIndex):
+        return len(faiss.serialize_index_binary(index.index)) / float(index.ntotal)
+    return len(faiss.serialize_index(index)) / float(index.ntotal)
+
+
+def describe_index(index: faiss.Index) -> Dict[str, Optional[int]]:
+    """Query-time parameters of an index, for logging and stats"""
+    info = {"class": type(index).__name__, "ntotal": index.ntotal, "nprobe": None, "ef_search": None}
+    ivf = _as_ivf(index)
+    if ivf is not None:
+        info["nprobe"] = ivf.nprobe
+    if isinstance(index, faiss.IndexHNSW):
+        info["ef_search"] = index.hnsw.efSearch
+    return info
+
+
+def _as_ivf(index: faiss.Index) -> Optional[faiss.IndexIVF]:
+    try:
+        return faiss.extract_index_ivf(index)
+    except (RuntimeError, TypeError):
+        return None
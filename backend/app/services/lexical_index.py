@@ -0,0 +1,221 @@
+"""
+BM25 lexical index kept alongside the dense vector index.
+
+Rows are the same positions used by the FAISS index, so the deletion and
+metadata-filter masks apply to both retrievers unchanged. Postings are
+held as compact CSR arrays (term offsets into flat row / term-frequency
+arrays) for everything loaded from a snapshot, plus one small immutable
+segment of postings per batch of chunks added since. `extended` and
+`take_rows` return new indexes that share the unchanged parts, so the
+vector store builds them while searches still run on the current one.
+"""
+import copy
+import json
+import logging
+import math
+import os
+import re
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+TERMS_FILENAME = "lexical_terms.json"
+OFFSETS_FILENAME = "lexical_offsets.npy"
+ROWS_FILENAME = "lexical_rows.npy"
+TFS_FILENAME = "lexical_tfs.npy"
+LENGTHS_FILENAME = "lexical_lengths.npy"
+
+# Identifiers such as "XJ-9000" or "v2.1.3" stay whole and are also split into parts
+_TOKEN_RE = re.compile(r"[a-z0-9]+(?:[-_./][a-z0-9]+)*")
+_SPLIT_RE = re.compile(r"[-_./]")
+_MAX_TF = 65535
+
+
+def tokenize(text: str) -> List[str]:
+    tokens = []
+    for token in _TOKEN_RE.findall(text.lower()):
+        tokens.append(token)
+        if not token.isalnum():
+            tokens.extend(part for part in _SPLIT_RE.split(token) if part)
+    return tokens
+
+
+def reciprocal_rank_fusion(rankings: Sequence[Sequence[int]], k: int = 60) -> List[Tuple[int, float]]:
+    """Fuse ranked row lists: score(row) = sum over lists of 1 / (k + rank)"""
+    scores: Dict[int, float] = {}
+    for ranking in rankings:
+        for rank, row in enumerate(ranking, start=1):
+            scores[row] = scores.get(row, 0.0) + 1.0 / (k + rank)
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
+
+
+class LexicalIndex:
+    """Okapi BM25 over chunk rows"""
+
+    def __init__(self):
+        self.vocab: Dict[str, int] = {}
+        self.offsets = np.zeros(1, dtype=np.int64)
+        self.rows = np.zeros(0, dtype=np.int32)
+        self.tfs = np.zeros(0, dtype=np.uint16)
+        self.segments: List[Dict[str, Tuple[np.ndarray, np.ndarray]]] = []
+        self.lengths = np.zeros(0, dtype=np.uint32)
+        self.total_length = 0
+
+    def __len__(self) -> int:
+        return len(self.lengths)
+
+    def add(self, texts: Iterable[str]):
+        postings: Dict[str, Tuple[List[int], List[int]]] = {}
+        lengths = []
+        for row, text in enumerate(texts, start=len(self.lengths)):
+            counts = Counter(tokenize(text))
+            lengths.append(sum(counts.values()))
+            for term, tf in counts.items():
+                rows, tfs = postings.setdefault(term, ([], []))
+                rows.append(row)
+                tfs.append(min(tf, _MAX_TF))
+        if not lengths:
+            return
+
+        self.segments.append({
+            term: (np.array(rows, dtype=np.int32), np.array(tfs, dtype=np.uint16))
+            for term, (rows, tfs) in postings.items()
+        })
+        self.lengths = np.concatenate([self.lengths, np.array(lengths, dtype=np.uint32)])
+        self.total_length += sum(lengths)
+
+    def extended(self, texts: Iterable[str]) -> "LexicalIndex":
+        """Copy with `texts` added as new rows; this index is left unchanged"""
+        index = copy.copy(self)
+        index.segments = list(self.segments)
+        index.add(texts)
+        return index
+
+    def postings(self, term: str) -> Tuple[np.ndarray, np.ndarray]:
+        parts_rows, parts_tfs = [], []
+        slot = self.vocab.get(term)
+        if slot is not None:
+            start, end = int(self.offsets[slot]), int(self.offsets[slot + 1])
+            parts_rows.append(np.asarray(self.rows[start:end]))
+            parts_tfs.append(np.asarray(self.tfs[start:end]))
+        for segment in self.segments:
+            if term in segment:
+                rows, tfs = segment[term]
+                parts_rows.append(rows)
+                parts_tfs.append(tfs)
+        if not parts_rows:
+            return np.zeros(0, dtype=np.int32), np.zeros(0, dtype=np.uint16)
+        if len(parts_rows) == 1:
+            return parts_rows[0], parts_tfs[0]
+        return np.concatenate(parts_rows), np.concatenate(parts_tfs)
+
+    def search(self, query: str, k: int, allowed: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """Top-k rows by BM25 score, restricted to rows where `allowed` is True"""
+        n = len(self.lengths)
+        terms = set(tokenize(query))
+        if not n or not terms or k <= 0:
+            return np.zeros(0, dtype=np.float32), np.zeros(0, dtype=np.int64)
+
+        k1, b = settings.BM25_K1, settings.BM25_B
+        lengths = self.lengths
+        avg_length = max(self.total_length / n, 1.0)
+        scores = np.zeros(n, dtype=np.float32)
+
+        for term in terms:
+            rows, tfs = self.postings(term)
+            if not len(rows):
+                continue
+            idf = math.log(1.0 + (n - len(rows) + 0.5) / (len(rows) + 0.5))
+            tf = tfs.astype(np.float32)
+            norm = k1 * (1.0 - b + b * lengths[rows] / avg_length)
+            scores[rows] += idf * tf * (k1 + 1.0) / (tf + norm)
+
+        if allowed is not None:
+            scores[~allowed[:n]] = 0.0
+        hits = np.flatnonzero(scores > 0)
+        if len(hits) > k:
+            hits = hits[np.argpartition(-scores[hits], k - 1)[:k]]
+        order = hits[np.argsort(-scores[hits], kind="stable")]
+        return scores[order], order.astype(np.int64)
+
+    def take_rows(self, live_rows: np.ndarray) -> "LexicalIndex":
+        """Copy holding only `live_rows`, renumbered 0..len(live_rows)-1 in order"""
+        remap = np.full(len(self.lengths), -1, dtype=np.int64)
+        remap[live_rows] = np.arange(len(live_rows))
+
+        terms, rows_parts, tfs_parts = [], [], []
+        for term in self._terms():
+            rows, tfs = self.postings(term)
+            new_rows = remap[rows]
+            keep = new_rows >= 0
+            if keep.any():
+                terms.append(term)
+                rows_parts.append(new_rows[keep].astype(np.int32))
+                tfs_parts.append(tfs[keep])
+
+        index = LexicalIndex()
+        index._set_base(terms, rows_parts, tfs_parts)
+        index.lengths = self.lengths[live_rows]
+        index.total_length = int(index.lengths.sum())
+        return index
+
+    def write(self, path: str):
+        """Write the merged postings as CSR arrays into a snapshot directory"""
+        terms = list(self._terms())
+        postings = [self.postings(term) for term in terms]
+        offsets = np.zeros(len(terms) + 1, dtype=np.int64)
+        np.cumsum([len(rows) for rows, _ in postings], out=offsets[1:])
+
+        with open(os.path.join(path, TERMS_FILENAME), "w") as f:
+            json.dump(terms, f)
+        np.save(os.path.join(path, OFFSETS_FILENAME), offsets)
+        np.save(os.path.join(path, ROWS_FILENAME), _concat([rows for rows, _ in postings], np.int32))
+        np.save(os.path.join(path, TFS_FILENAME), _concat([tfs for _, tfs in postings], np.uint16))
+        np.save(os.path.join(path, LENGTHS_FILENAME), self.lengths)
+
+    @classmethod
+    def read(cls, path: str) -> Optional["LexicalIndex"]:
+        """Open a snapshot's postings memory-mapped; None if the snapshot predates them"""
+        if not os.path.exists(os.path.join(path, TERMS_FILENAME)):
+            return None
+        index = cls()
+        with open(os.path.join(path, TERMS_FILENAME)) as f:
+            index.vocab = {term: slot for slot, term in enumerate(json.load(f))}
+        index.offsets = np.load(os.path.join(path, OFFSETS_FILENAME), mmap_mode="r")
+        index.rows = np.load(os.path.join(path, ROWS_FILENAME), mmap_mode="r")
+        index.tfs = np.load(os.path.join(path, TFS_FILENAME), mmap_mode="r")
+        index.lengths = np.load(os.path.join(path, LENGTHS_FILENAME))
+        index.total_length = int(index.lengths.sum())
+        return index
+
+    @classmethod
+    def build(cls, texts: Iterable[str]) -> "LexicalIndex":
+        index = cls()
+        index.add(texts)
+        return index
+
+    def _terms(self) -> Iterable[str]:
+        yield from self.vocab
+        seen = set()
+        for segment in self.segments:
+            for term in segment:
+                if term not in self.vocab and term not in seen:
+                    seen.add(term)
+                    yield term
+
+    def _set_base(self, terms: List[str], rows_parts: List[np.ndarray], tfs_parts: List[np.ndarray]):
+        self.vocab = {term: slot for slot, term in enumerate(terms)}
+        self.offsets = np.zeros(len(terms) + 1, dtype=np.int64)
+        np.cumsum([len(rows) for rows in rows_parts], out=self.offsets[1:])
+        self.rows = _concat(rows_parts, np.int32)
+        self.tfs = _concat(tfs_parts, np.uint16)
+        self.segments = []
+
+
+def _concat(parts: List[np.ndarray], dtype) -> np.ndarray:
+    return np.concatenate(parts).astype(dtype, copy=False) if parts else np.zeros(0, dtype=dtype)
@@ -0,0 +1,98 @@
+"""
+Inverted metadata index for filtered vector search.
+
+Postings are kept per document rather than per chunk: every chunk of a
+document shares its filename and upload time, and a document's chunks
+occupy a contiguous run of rows, so a filter resolves to a handful of row
+ranges that are turned into the boolean mask handed to FAISS.
+
+Filter expressions are plain dicts combined with AND:
+
+    {"filename": "report.pdf"}
+    {"filename": ["a.pdf", "b.pdf"]}
+    {"upload_time": {"gte": "2024-01-01", "lt": "2024-02-01"}}
+"""
+import logging
+from typing import Dict, Iterable, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+FILTER_FIELDS = ("doc_id", "filename", "upload_time")
+RANGE_OPERATORS = {
+    "gt": lambda value, bound: value > bound,
+    "gte": lambda value, bound: value >= bound,
+    "lt": lambda value, bound: value < bound,
+    "lte": lambda value, bound: value <= bound,
+}
+
+
+def validate_filters(filters: Optional[dict]) -> Optional[dict]:
+    """Reject unknown fields and operators before any search work is done"""
+    if not filters:
+        return None
+    if not isinstance(filters, dict):
+        raise ValueError("Filters must be an object of field conditions")
+    for field, condition in filters.items():
+        if field not in FILTER_FIELDS:
+            raise ValueError(f"Unsupported filter field: {field}. Supported: {', '.join(FILTER_FIELDS)}")
+        if isinstance(condition, dict):
+            unknown = set(condition) - set(RANGE_OPERATORS)
+            if not condition or unknown:
+                raise ValueError(f"Unsupported range operator for {field}: {', '.join(sorted(unknown)) or 'none'}")
+    return filters
+
+
+class MetadataIndex:
+    """Field value -> document ids, for the fields filters can reference"""
+
+    def __init__(self):
+        self.postings: Dict[str, Dict[str, Set[str]]] = {field: {} for field in FILTER_FIELDS}
+
+    def add(self, doc_id: str, metadata: dict):
+        for field, value in self._values(doc_id, metadata):
+            self.postings[field].setdefault(value, set()).add(doc_id)
+
+    def remove(self, doc_id: str, metadata: dict):
+        for field, value in self._values(doc_id, metadata):
+            docs = self.postings[field].get(value)
+            if docs is not None:
+                docs.discard(doc_id)
+                if not docs:
+                    del self.postings[field][value]
+
+    def rebuild(self, registry: Dict[str, dict]):
+        self.postings = {field: {} for field in FILTER_FIELDS}
+        for doc_id, entry in registry.items():
+            self.add(doc_id, entry.get("metadata", {}))
+
+    def match(self, filters: dict) -> Set[str]:
+        """Document ids satisfying every condition in the filter expression"""
+        matched: Optional[Set[str]] = None
+        for field, condition in validate_filters(filters).items():
+            docs = self._match_condition(self.postings[field], condition)
+            matched = docs if matched is None else matched & docs
+            if not matched:
+                break
+        return matched or set()
+
+    @staticmethod
+    def _match_condition(postings: Dict[str, Set[str]], condition) -> Set[str]:
+        if isinstance(condition, dict):
+            # Range conditions scan the distinct values, which is one per upload at most
+            docs: Set[str] = set()
+            for value, value_docs in postings.items():
+                if all(RANGE_OPERATORS[op](value, str(bound)) for op, bound in condition.items()):
+                    docs |= value_docs
+            return docs
+        values: Iterable = condition if isinstance(condition, (list, tuple, set)) else [condition]
+        docs = set()
+        for value in values:
+            docs |= postings.get(str(value), set())
+        return docs
+
+    @staticmethod
+    def _values(doc_id: str, metadata: dict):
+        yield "doc_id", doc_id
+        for field in FILTER_FIELDS[1:]:
+            if metadata.get(field) is not None:
+                yield field, str(metadata[field])
@@ -0,0 +1,381 @@
+"""
+Memory-mapped snapshot storage for the vector store.
+
+Chunk text and metadata live in flat data files with a uint64 offsets array
+and are decoded lazily, so only the top-k hits of a search are ever turned
+into Python objects. Vectors, chunk ids and chunk hashes stay in the page
+cache and are shared between worker processes that open the same snapshot.
+"""
+import copy
+import json
+import logging
+import mmap
+import os
+from typing import Callable, Dict, Iterable, List, Optional
+
+import faiss
+import numpy as np
+
+from app.services.index_factory import clone_index, exact_search, search_index
+
+logger = logging.getLogger(__name__)
+
+VECTORS_FILENAME = "vectors.f32"
+CHUNK_IDS_FILENAME = "chunk_ids.i64"
+CHUNK_HASHES_FILENAME = "chunk_hashes.u64"
+# Chunk hashes in ascending order, and the row each one belongs to
+SORTED_HASHES_FILENAME = "chunk_hashes.sorted.u64"
+HASH_ROWS_FILENAME = "chunk_hashes.rows.i64"
+
+# Flags for opening a snapshot index without copying it into private memory.
+# IO_FLAG_MMAP_IFC (flat codes) only exists in newer FAISS releases.
+MMAP_READ_FLAGS = faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY | getattr(faiss, "IO_FLAG_MMAP_IFC", 0)
+
+
+def encode_text(value: str) -> bytes:
+    return value.encode("utf-8")
+
+
+def decode_text(raw: bytes) -> str:
+    return raw.decode("utf-8")
+
+
+def encode_json(value: dict) -> bytes:
+    return json.dumps(value, separators=(",", ":")).encode("utf-8")
+
+
+def decode_json(raw: bytes) -> dict:
+    return json.loads(raw)
+
+
+class MappedRecords:
+    """Immutable memory-mapped records plus an in-memory tail for new appends.
+
+    Behaves like a list for `len`, indexing, iteration and `append`/`extend`.
+    """
+
+    def __init__(self, path: Optional[str] = None, decode: Callable[[bytes], object] = decode_text):
+        self.decode = decode
+        self.tail: List = []
+        self._offsets = np.zeros(1, dtype=np.uint64)
+        self._data = None
+        self._file = None
+
+        if path and os.path.exists(path + ".idx"):
+            self._offsets = np.memmap(path + ".idx", dtype=np.uint64, mode="r")
+            if int(self._offsets[-1]) > 0:
+                self._file = open(path + ".dat", "rb")
+                self._data = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    @property
+    def base_count(self) -> int:
+        return len(self._offsets) - 1
+
+    def __len__(self) -> int:
+        return self.base_count + len(self.tail)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        if i < 0:
+            i += len(self)
+        if i < self.base_count:
+            start, end = int(self._offsets[i]), int(self._offsets[i + 1])
+            return self.decode(self._data[start:end] if end > start else b"")
+        return self.tail[i - self.base_count]
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def append(self, value):
+        self.tail.append(value)
+
+    def extend(self, values: Iterable):
+        self.tail.extend(values)
+
+    @staticmethod
+    def write(path: str, values: Iterable, encode: Callable[[object], bytes] = encode_text):
+        """Write records as `<path>.dat` plus a `<path>.idx` offsets array"""
+        offsets = [0]
+        with open(path + ".dat", "wb") as f:
+            for value in values:
+                raw = encode(value)
+                f.write(raw)
+                offsets.append(offsets[-1] + len(raw))
+        np.asarray(offsets, dtype=np.uint64).tofile(path + ".idx")
+
+
+class MappedVectors:
+    """Full-precision vectors: a memory-mapped snapshot file plus in-memory appended blocks"""
+
+    def __init__(self, path: Optional[str], dimension: int):
+        self.d = dimension
+        self.base = open_vectors(path, dimension) if path else np.zeros((0, dimension), dtype=np.float32)
+        self.tail: List[np.ndarray] = []
+        self._tail_count = 0
+
+    @classmethod
+    def from_array(cls, vectors: np.ndarray) -> "MappedVectors":
+        rows = cls(None, vectors.shape[1])
+        rows.append(vectors)
+        return rows
+
+    def __len__(self) -> int:
+        return len(self.base) + self._tail_count
+
+    def append(self, block: np.ndarray):
+        if len(block):
+            self.tail.append(np.ascontiguousarray(block, dtype=np.float32))
+            self._tail_count += len(block)
+
+    def extended(self, block: np.ndarray) -> "MappedVectors":
+        """Copy with `block` appended; this object and its tail are left unchanged"""
+        rows = copy.copy(self)
+        rows.tail = list(self.tail)
+        rows.append(block)
+        return rows
+
+    def take(self, ids: np.ndarray) -> np.ndarray:
+        """Gather rows by position, touching only the pages that hold them"""
+        ids = np.asarray(ids, dtype=np.int64)
+        base_count = len(self.base)
+        rows = np.empty((len(ids), self.d), dtype=np.float32)
+
+        in_base = ids < base_count
+        if in_base.any():
+            rows[in_base] = self.base[ids[in_base]]
+        if not in_base.all():
+            rows[~in_base] = self._tail_array()[ids[~in_base] - base_count]
+        return rows
+
+    def all(self) -> np.ndarray:
+        if not self.tail:
+            return np.asarray(self.base, dtype=np.float32)
+        return np.vstack([np.asarray(self.base, dtype=np.float32), self._tail_array()])
+
+    def _tail_array(self) -> np.ndarray:
+        if len(self.tail) > 1:
+            self.tail = [np.vstack(self.tail)]
+        return self.tail[0] if self.tail else np.zeros((0, self.d), dtype=np.float32)
+
+    def write(self, path: str):
+        with open(path, "wb") as f:
+            np.ascontiguousarray(self.base, dtype=np.float32).tofile(f)
+            for block in self.tail:
+                block.tofile(f)
+
+
+class ChunkTable:
+    """Stable chunk id and content hash of every row.
+
+    Snapshot rows stay memory-mapped: ids ascend with the row, so they are
+    found by binary search, and hashes are found by binary search in a
+    sorted copy stored next to them. Only rows appended since the snapshot
+    are indexed in a dict.
+    """
+
+    def __init__(self, ids: Optional[np.ndarray] = None, hashes: Optional[np.ndarray] = None,
+                 sorted_hashes: Optional[np.ndarray] = None, hash_rows: Optional[np.ndarray] = None):
+        self.ids = ids if ids is not None else np.zeros(0, dtype=np.int64)
+        self.hashes = hashes if hashes is not None else np.zeros(0, dtype=np.uint64)
+        if sorted_hashes is None or hash_rows is None:
+            hash_rows = np.argsort(self.hashes, kind="stable")
+            sorted_hashes = self.hashes[hash_rows]
+        self.sorted_hashes = sorted_hashes
+        self.hash_rows = hash_rows
+        self.tail_ids: List[np.ndarray] = []
+        self.tail_hashes: List[np.ndarray] = []
+        self.tail_rows: Dict[int, List[int]] = {}  # hash -> appended rows
+
+    @property
+    def base_count(self) -> int:
+        return len(self.ids)
+
+    def __len__(self) -> int:
+        return self.base_count + sum(len(block) for block in self.tail_ids)
+
+    def extend(self, ids: List[int], hashes: List[int]):
+        row = len(self)
+        for offset, h in enumerate(hashes):
+            self.tail_rows.setdefault(h, []).append(row + offset)
+        if ids:
+            self.tail_ids.append(np.asarray(ids, dtype=np.int64))
+            self.tail_hashes.append(np.asarray(hashes, dtype=np.uint64))
+
+    def id_at(self, row: int) -> int:
+        if row < self.base_count:
+            return int(self.ids[row])
+        return int(self._tail(self.tail_ids, np.int64)[row - self.base_count])
+
+    def ids_at(self, rows: np.ndarray) -> np.ndarray:
+        rows = np.asarray(rows, dtype=np.int64)
+        ids = np.empty(len(rows), dtype=np.int64)
+        in_base = rows < self.base_count
+        ids[in_base] = self.ids[rows[in_base]]
+        if not in_base.all():
+            ids[~in_base] = self._tail(self.tail_ids, np.int64)[rows[~in_base] - self.base_count]
+        return ids
+
+    def rows_for_ids(self, chunk_ids: List[int]) -> np.ndarray:
+        """Row of each chunk id, in the given order, skipping ids that are not stored"""
+        wanted = np.asarray(chunk_ids, dtype=np.int64)
+        rows = np.full(len(wanted), -1, dtype=np.int64)
+        for offset, ids in ((0, self.ids), (self.base_count, self._tail(self.tail_ids, np.int64))):
+            pos = np.searchsorted(ids, wanted)
+            found = pos < len(ids)
+            found[found] = ids[pos[found]] == wanted[found]
+            rows[found] = pos[found] + offset
+        return rows[rows >= 0]
+
+    def rows_for_hash(self, h: int) -> List[int]:
+        """Every row whose chunk has this hash, live or deleted"""
+        key = np.uint64(h)
+        start = int(np.searchsorted(self.sorted_hashes, key, side="left"))
+        end = int(np.searchsorted(self.sorted_hashes, key, side="right"))
+        return self.hash_rows[start:end].tolist() + self.tail_rows.get(h, [])
+
+    def all_ids(self) -> np.ndarray:
+        return np.concatenate([np.asarray(self.ids), self._tail(self.tail_ids, np.int64)])
+
+    def all_hashes(self) -> np.ndarray:
+        return np.concatenate([np.asarray(self.hashes), self._tail(self.tail_hashes, np.uint64)])
+
+    def take(self, rows: np.ndarray) -> "ChunkTable":
+        """In-memory table of the given rows, renumbered from zero"""
+        return ChunkTable(self.all_ids()[rows], self.all_hashes()[rows])
+
+    def _tail(self, blocks: List[np.ndarray], dtype) -> np.ndarray:
+        if len(blocks) > 1:
+            blocks[:] = [np.concatenate(blocks)]
+        return blocks[0] if blocks else np.zeros(0, dtype=dtype)
+
+    def write(self, path: str):
+        """Write ids, hashes and the sorted hash lookup into a snapshot directory"""
+        hashes = self.all_hashes()
+        hash_rows = np.argsort(hashes, kind="stable")
+        self.all_ids().tofile(os.path.join(path, CHUNK_IDS_FILENAME))
+        hashes.tofile(os.path.join(path, CHUNK_HASHES_FILENAME))
+        hashes[hash_rows].tofile(os.path.join(path, SORTED_HASHES_FILENAME))
+        hash_rows.astype(np.int64).tofile(os.path.join(path, HASH_ROWS_FILENAME))
+
+    @classmethod
+    def read(cls, path: str) -> Optional["ChunkTable"]:
+        """Map a snapshot's chunk table, or None if the snapshot predates chunk hashes"""
+        ids = open_array(os.path.join(path, CHUNK_IDS_FILENAME), np.int64)
+        hashes = open_array(os.path.join(path, CHUNK_HASHES_FILENAME), np.uint64)
+        if ids is None or hashes is None or len(ids) != len(hashes):
+            return None
+        # Snapshots written before the sorted lookup existed get it sorted here
+        sorted_hashes = open_array(os.path.join(path, SORTED_HASHES_FILENAME), np.uint64)
+        hash_rows = open_array(os.path.join(path, HASH_ROWS_FILENAME), np.int64)
+        if sorted_hashes is None or hash_rows is None or len(hash_rows) != len(hashes):
+            sorted_hashes = hash_rows = None
+        return cls(ids, hashes, sorted_hashes, hash_rows)
+
+
+class LayeredIndex:
+    """Read-only base index with a small in-memory delta for new vectors.
+
+    The base is a mapped snapshot index or, for pickled snapshots, the
+    in-memory index as of the last compaction. Flat mapped snapshots have no
+    FAISS base index: they are brute-force searched straight from the
+    memory-mapped vector file.
+    """
+
+    def __init__(self, base, base_vectors: np.ndarray, dimension: int,
+                 load_base: Optional[Callable[[], object]] = None, delta=None):
+        self.base = base
+        self.base_vectors = base_vectors
+        self.load_base = load_base
+        self.d = dimension
+        # The delta must produce distances comparable with the base index
+        self.delta = delta if delta is not None else faiss.IndexFlatL2(dimension)
+        self.is_trained = True
+
+    @property
+    def base_count(self) -> int:
+        return self.base.ntotal if self.base is not None else len(self.base_vectors)
+
+    @property
+    def ntotal(self) -> int:
+        return self.base_count + self.delta.ntotal
+
+    def add(self, x: np.ndarray):
+        self.delta.add(x)
+
+    def extended(self, x: np.ndarray) -> "LayeredIndex":
+        """Copy sharing the base, with `x` added to a copy of the delta"""
+        delta = clone_index(self.delta)
+        delta.add(np.ascontiguousarray(x, dtype=np.float32))
+        return LayeredIndex(self.base, self.base_vectors, self.d, self.load_base, delta)
+
+    def search(self, x: np.ndarray, k: int, allowed: Optional[np.ndarray] = None):
+        x = np.ascontiguousarray(x, dtype=np.float32)
+        base_allowed = allowed[:self.base_count] if allowed is not None else None
+        delta_allowed = allowed[self.base_count:] if allowed is not None else None
+        parts = []
+
+        base_k = min(k, self.base_count)
+        if base_k:
+            if self.base is not None:
+                parts.append(search_index(self.base, x, base_k, base_allowed))
+            elif base_allowed is None:
+                parts.append(faiss.knn(x, self.base_vectors, base_k))
+            else:
+                # Brute-force only the allowed rows rather than over-fetching past the masked ones
+                rows = np.flatnonzero(base_allowed)
+                distances, positions = exact_search(x, self.base_vectors[rows], base_k)
+                parts.append((distances, rows[positions]))
+
+        delta_k = min(k, self.delta.ntotal)
+        if delta_k:
+            distances, indices = search_index(self.delta, x, delta_k, delta_allowed)
+            parts.append((distances, np.where(indices >= 0, indices + self.base_count, -1)))
+
+        return merge_results(parts, len(x), k)
+
+    def materialize(self, delta_vectors: np.ndarray):
+        """Load a writable in-memory copy of the base index with the delta vectors applied"""
+        if self.base is None:
+            index = faiss.IndexFlatL2(self.d)
+            index.add(np.asarray(self.base_vectors, dtype=np.float32))
+        else:
+            index = self.load_base()
+        if len(delta_vectors):
+            index.add(np.ascontiguousarray(delta_vectors, dtype=np.float32))
+        return index
+
+
+def merge_results(parts, rows: int, k: int):
+    """Merge per-source (distances, ids) pairs into a single top-k by ascending distance"""
+    distances = np.full((rows, k), np.inf, dtype=np.float32)
+    indices = np.full((rows, k), -1, dtype=np.int64)
+    if not parts:
+        return distances, indices
+
+    all_distances = np.hstack([d for d, _ in parts])
+    all_indices = np.hstack([i for _, i in parts])
+    all_distances = np.where(all_indices >= 0, all_distances, np.inf)
+    order = np.argsort(all_distances, axis=1, kind="stable")[:, :k]
+
+    width = order.shape[1]
+    distances[:, :width] = np.take_along_axis(all_distances, order, axis=1)
+    indices[:, :width] = np.take_along_axis(all_indices, order, axis=1)
+    return distances, indices
+
+
+def open_vectors(path: str, dimension: int) -> np.ndarray:
+    """Memory-map a raw float32 vector file as an (n, dimension) matrix"""
+    if not os.path.exists(path) or os.path.getsize(path) == 0:
+        return np.zeros((0, dimension), dtype=np.float32)
+    return np.memmap(path, dtype=np.float32, mode="r").reshape(-1, dimension)
+
+
+def open_array(path: str, dtype) -> Optional[np.ndarray]:
+    """Memory-map a raw one-dimensional array file; None if it does not exist"""
+    if not os.path.exists(path):
+        return None
+    if os.path.getsize(path) == 0:
+        return np.zeros(0, dtype=dtype)
+    return np.memmap(path, dtype=dtype, mode="r")
@@ -0,0 +1,184 @@
+"""
+Multi-process PDF page extraction for large uploads.
+
+PyPDF2 text extraction is pure Python, so one upload of a few hundred
+OCR'd pages keeps a single core busy while the others wait.
+PdfExtractionPool splits the page range into PDF_PAGES_PER_TASK slices and
+extracts them on PDF_EXTRACT_WORKERS worker processes. Workers open the
+document themselves: from its path when the file is on disk, otherwise
+from a shared memory copy of the upload the parent writes once per
+document. Each worker parses a document once and keeps the reader for the
+following slices of the same document.
+
+Pages come back in page order and are yielded as each slice completes, with
+at most two slices per worker in flight, so the pool slots into the
+streaming ingest pipeline (iter_chunks) in place of iter_pdf_pages and
+produces the same (page number, text) pairs.
+"""
+import logging
+import multiprocessing
+import threading
+import time
+import uuid
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from io import BytesIO
+from multiprocessing import shared_memory
+from typing import Iterator, List, Optional, Tuple, Union
+
+from PyPDF2 import PdfReader
+from PyPDF2.errors import ParseError, PyPdfError
+
+from app.core.config import settings
+from app.utils.pdf_reader import iter_pdf_pages
+
+logger = logging.getLogger(__name__)
+
+# Set in each worker process by _open_document: (document key, reader)
+_worker_document: Optional[Tuple[str, PdfReader]] = None
+
+
+def _open_document(key: str, path: Optional[str], shm_name: Optional[str], size: int) -> PdfReader:
+    global _worker_document
+    if _worker_document is None or _worker_document[0] != key:
+        if path is not None:
+            reader = PdfReader(path)
+        else:
+            block = shared_memory.SharedMemory(name=shm_name)
+            try:
+                data = bytes(block.buf[:size])
+            finally:
+                block.close()
+            reader = PdfReader(BytesIO(data))
+        _worker_document = (key, reader)
+    return _worker_document[1]
+
+
+def _extract_range(key: str, path: Optional[str], shm_name: Optional[str], size: int,
+                   start: int, stop: int) -> List[Tuple[int, str]]:
+    """(page number, text) of pages [start, stop), the way iter_pdf_pages yields them"""
+    reader = _open_document(key, path, shm_name, size)
+    pages = []
+    for index in range(start, stop):
+        page_text = reader.pages[index].extract_text()
+        if page_text:
+            pages.append((index + 1, page_text + "\n"))
+    return pages
+
+
+class PdfExtractionPool:
+    """Extracts page text of large PDFs across worker processes, in page order"""
+
+    def __init__(self, workers: int, pages_per_task: int = 8, min_pages: int = 64):
+        if workers < 1:
+            raise ValueError("PDF extraction pool needs at least one worker")
+        self.workers = workers
+        self.pages_per_task = max(1, pages_per_task)
+        self.min_pages = min_pages
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._start_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self.documents = 0
+        self.pages = 0
+        self.extract_seconds = 0.0
+
+    def iter_pages(self, source: Union[bytes, str], page_count: int) -> Iterator[Tuple[int, str]]:
+        """(page number, text) of each page with text; `source` is the PDF's bytes or its path"""
+        executor = self._ensure_executor()
+        path = source if isinstance(source, str) else None
+        block = None
+        if path is None:
+            block = shared_memory.SharedMemory(create=True, size=max(1, len(source)))
+            block.buf[:len(source)] = source
+        key = uuid.uuid4().hex
+        args = (key, path, block.name if block else None, 0 if path else len(source))
+
+        start_time = time.perf_counter()
+        ranges = deque((start, min(start + self.pages_per_task, page_count))
+                       for start in range(0, page_count, self.pages_per_task))
+        in_flight = deque()
+        try:
+            while ranges or in_flight:
+                try:
+                    while ranges and len(in_flight) < 2 * self.workers:
+                        in_flight.append(executor.submit(_extract_range, *args, *ranges.popleft()))
+                    pages = in_flight.popleft().result()
+                except BrokenProcessPool:
+                    # A worker died; start fresh processes for the next document
+                    self._discard_executor(executor)
+                    raise
+                except (PyPdfError, ParseError) as e:
+                    # Only a malformed upload is the client's fault; pool failures propagate as they are
+                    raise ValueError(f"PDF processing error: {str(e)}") from e
+                yield from pages
+        finally:
+            for future in in_flight:
+                future.cancel()
+            if block is not None:
+                block.close()
+                block.unlink()
+
+        elapsed = time.perf_counter() - start_time
+        with self._stats_lock:
+            self.documents += 1
+            self.pages += page_count
+            self.extract_seconds += elapsed
+        logger.info(f"Extracted {page_count} pages on {self.workers} worker processes in {elapsed:.2f}s")
+
+    def stats(self) -> dict:
+        return {
+            "workers": self.workers,
+            "pages_per_task": self.pages_per_task,
+            "min_pages": self.min_pages,
+            "started": self._executor is not None,
+            "documents": self.documents,
+            "pages": self.pages,
+            "pages_per_second": round(self.pages / self.extract_seconds, 1) if self.extract_seconds else 0.0
+        }
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+            logger.info("PDF extraction worker processes stopped")
+
+    def _discard_executor(self, executor: ProcessPoolExecutor):
+        with self._start_lock:
+            if self._executor is executor:
+                self._executor = None
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    def _ensure_executor(self) -> ProcessPoolExecutor:
+        with self._start_lock:
+            if self._executor is None:
+                logger.info(f"Starting {self.workers} PDF extraction worker processes")
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context("spawn")
+                )
+            return self._executor
+
+
+# Global instance (worker processes start on the first large upload)
+pdf_extraction_pool = PdfExtractionPool(
+    settings.PDF_EXTRACT_WORKERS, settings.PDF_PAGES_PER_TASK, settings.PDF_PARALLEL_MIN_PAGES
+) if settings.PDF_EXTRACT_WORKERS > 0 else None
+
+
+# Convenience functions
+def iter_upload_pages(reader: PdfReader, source: Union[bytes, str]) -> Iterator[Tuple[int, str]]:
+    """Pages of an opened upload, on the extraction pool when it has PDF_PARALLEL_MIN_PAGES or more"""
+    page_count = len(reader.pages)
+    if pdf_extraction_pool is not None and page_count >= pdf_extraction_pool.min_pages:
+        return pdf_extraction_pool.iter_pages(source, page_count)
+    return iter_pdf_pages(reader)
+
+
+def get_extraction_stats() -> Optional[dict]:
+    return pdf_extraction_pool.stats() if pdf_extraction_pool is not None else None
+
+
+def shutdown_extraction_pool():
+    if pdf_extraction_pool is not None:
+        pdf_extraction_pool.shutdown()
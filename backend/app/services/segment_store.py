@@ -0,0 +1,179 @@
+"""
+Append-only write-ahead log and generation snapshots for the vector store.
+
+New chunks are appended to the log on every upload; the full index is only
+rewritten when the log is compacted into a fresh snapshot directory.
+
+Several worker processes may open the same data directory, so log appends,
+replays and resets hold an exclusive lock on the log file, and a published
+snapshot leaves the one it replaced in place for processes still loading it.
+"""
+import logging
+import os
+import pickle
+import shutil
+import struct
+import uuid
+import zlib
+from contextlib import contextmanager
+from typing import Iterator, NamedTuple, Optional
+
+try:
+    import fcntl
+except ImportError:  # Windows: no inter-process lock, run a single worker
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+_HEADER = struct.Struct("<4sQII")  # magic, sequence number, payload length, crc32
+_MAGIC = b"VSL1"
+
+OP_ADD = "add"
+OP_DELETE = "delete"
+OP_REPLACE = "replace"  # a document's new revision plus the chunk ids of the one it replaces
+OP_CLEAR = "clear"  # every document removed
+
+
+@contextmanager
+def _exclusive(f):
+    """Hold an exclusive lock on an open file against other processes"""
+    if fcntl is None:
+        yield
+        return
+    fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+    try:
+        yield
+    finally:
+        fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+
+class LogRecord(NamedTuple):
+    seq: int
+    op: str
+    data: dict
+
+
+class SegmentLog:
+    """Append-only log of ingested chunk batches with CRC-checked records"""
+
+    def __init__(self, path: str, fsync: bool = True):
+        self.path = path
+        self.fsync = fsync
+        self.record_count = 0
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+
+    def append(self, seq: int, op: str, data: dict):
+        """Durably append one operation (an added chunk batch or a deletion) to the log"""
+        payload = pickle.dumps(dict(data, op=op), protocol=pickle.HIGHEST_PROTOCOL)
+        header = _HEADER.pack(_MAGIC, seq, len(payload), zlib.crc32(payload))
+
+        with open(self.path, "ab") as f, _exclusive(f):
+            f.write(header + payload)
+            f.flush()
+            if self.fsync:
+                os.fsync(f.fileno())
+        self.record_count += 1
+
+    def replay(self, after_seq: int = 0) -> Iterator[LogRecord]:
+        """Yield intact records newer than `after_seq`, truncating a torn tail"""
+        self.record_count = 0
+        if not os.path.exists(self.path):
+            return
+
+        # Locked for the whole pass so a record another process is appending
+        # is not mistaken for a torn tail and truncated
+        good_offset = 0
+        with open(self.path, "r+b") as f, _exclusive(f):
+            while True:
+                header = f.read(_HEADER.size)
+                if not header:
+                    break
+                if len(header) < _HEADER.size:
+                    logger.warning("Truncated record header at end of vector store log")
+                    break
+
+                magic, seq, length, crc = _HEADER.unpack(header)
+                payload = f.read(length)
+                if magic != _MAGIC or len(payload) < length or zlib.crc32(payload) != crc:
+                    logger.warning(f"Corrupt record in vector store log at offset {good_offset}, discarding tail")
+                    break
+
+                good_offset = f.tell()
+                self.record_count += 1
+                if seq <= after_seq:
+                    continue
+
+                data = pickle.loads(payload)
+                yield LogRecord(seq, data.pop("op", OP_ADD), data)
+
+            if good_offset < os.path.getsize(self.path):
+                f.truncate(good_offset)
+
+    def reset(self):
+        """Drop all records once they are covered by a snapshot"""
+        with open(self.path, "ab") as f, _exclusive(f):
+            f.truncate(0)
+            f.flush()
+            if self.fsync:
+                os.fsync(f.fileno())
+        self.record_count = 0
+
+    def size_bytes(self) -> int:
+        return os.path.getsize(self.path) if os.path.exists(self.path) else 0
+
+
+class SnapshotDirectory:
+    """Generation-numbered snapshot directories published via an atomic CURRENT pointer"""
+
+    def __init__(self, root: str):
+        self.root = root
+        self.pointer_file = os.path.join(root, "CURRENT")
+        os.makedirs(root, exist_ok=True)
+
+    def current(self) -> Optional[str]:
+        """Path of the published snapshot, if any"""
+        if not os.path.exists(self.pointer_file):
+            return None
+        with open(self.pointer_file) as f:
+            name = f.read().strip()
+        path = os.path.join(self.root, name)
+        return path if name and os.path.isdir(path) else None
+
+    def begin(self, seq: int) -> str:
+        """Create an empty directory for a new snapshot covering records up to `seq`"""
+        path = os.path.join(self.root, f"snapshot-{seq:012d}-{uuid.uuid4().hex[:8]}")
+        os.makedirs(path)
+        return path
+
+    def publish(self, path: str):
+        """Atomically make `path` the current snapshot.
+        
+        The snapshot it replaces is kept, since other processes may still be
+        loading it or have its arrays mapped; it is removed by the publish
+        after this one, along with anything older.
+        """
+        previous = self.current()
+        tmp_pointer = self.pointer_file + ".tmp"
+        with open(tmp_pointer, "w") as f:
+            f.write(os.path.basename(path))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_pointer, self.pointer_file)
+
+        if previous is None:
+            return
+        # Unpublished snapshots newer than `previous` may be ones another process is still writing
+        previous_seq = _snapshot_seq(os.path.basename(previous))
+        for name in os.listdir(self.root):
+            stale = os.path.join(self.root, name)
+            if (name.startswith("snapshot-") and stale not in (path, previous) and
+                    _snapshot_seq(name) <= previous_seq and os.path.isdir(stale)):
+                shutil.rmtree(stale, ignore_errors=True)
+
+
+def _snapshot_seq(name: str) -> int:
+    """Sequence number a snapshot directory covers, from its name"""
+    try:
+        return int(name.split("-")[1])
+    except (IndexError, ValueError):
+        return -1
@@ -0,0 +1,291 @@
+"""
+Scatter-gather coordinator over shard servers.
+
+With NODE_ROLE=coordinator the global vector store is a ShardCoordinator:
+the VectorStore API implemented by calling shard servers (this same app
+started with NODE_ROLE=shard) over HTTP. Uploads are placed by a hash of
+their content hash (of their doc_id when there is none) in SHARD_URLS
+order, so a duplicate upload reaches the shard server that already
+serialises its duplicate check; a document is found again by asking every
+shard server. Searches go to every shard in parallel and the
+per-shard top-k lists are heap-merged; a shard that fails or misses
+SHARD_TIMEOUT_SECONDS is left out, so the caller gets a partial result
+from the shards that answered instead of an error, with the missing shard
+servers listed in `failed_shards`. Calls run on one event loop thread and
+each is cancelled at its own timeout, so a stuck shard server never holds
+a connection or thread past it.
+"""
+import asyncio
+import logging
+import threading
+import uuid
+from typing import Any, Iterable, List, Optional, Tuple
+
+import httpx
+
+from app.core.config import settings
+from app.utils.hashing import shard_index
+from app.services.metadata_index import validate_filters
+from app.services.sharded_store import fuse_hybrid, merge_batches, merge_hits
+from app.services.vectorstore import (
+    RETRIEVAL_DENSE, RETRIEVAL_HYBRID, RETRIEVAL_LEXICAL, AwaitableStoreMixin, validate_retrieval_mode
+)
+
+logger = logging.getLogger(__name__)
+
+
+class SearchHits(list):
+    """Merged search hits plus the shard servers that did not answer (a partial result if any)"""
+
+    def __init__(self, hits: Iterable = (), failed_shards: Iterable[str] = ()):
+        super().__init__(hits)
+        self.failed_shards = list(failed_shards)
+
+
+class ShardCoordinator(AwaitableStoreMixin):
+    """VectorStore API over remote shard servers"""
+
+    def __init__(self, shard_urls: List[str], timeout: Optional[float] = None):
+        if not shard_urls:
+            raise ValueError("Coordinator role needs at least one URL in SHARD_URLS")
+        self.shard_urls = [url.rstrip("/") for url in shard_urls]
+        self.timeout = timeout or settings.SHARD_TIMEOUT_SECONDS
+        self.client = httpx.AsyncClient(timeout=self.timeout)
+        self._loop = asyncio.new_event_loop()
+        threading.Thread(target=self._loop.run_forever, name="shard-fanout", daemon=True).start()
+        self._stats_lock = threading.Lock()
+        self.partial_searches = 0
+        self.shard_failures = [0] * len(self.shard_urls)
+        logger.info(f"Coordinating {len(self.shard_urls)} shard servers: {', '.join(self.shard_urls)}")
+
+    def add_document(self, text: str, metadata: Optional[dict] = None, doc_id: Optional[str] = None,
+                     content_hash: Optional[str] = None) -> int:
+        """Send a document to the shard server its content hash (or doc_id) hashes to"""
+        if self._indexed_elsewhere(content_hash):
+            return 0
+        doc_id = doc_id or uuid.uuid4().hex
+        body = {"text": text, "metadata": metadata, "doc_id": doc_id, "content_hash": content_hash}
+        response = self._request(self._shard_for_upload(doc_id, content_hash), "POST", "/shard/documents", json=body,
+                                 timeout=settings.SHARD_INGEST_TIMEOUT_SECONDS)
+        return response["chunks"]
+
+    def add_document_stream(self, chunks: Iterable[Tuple[str, dict]], metadata: Optional[dict] = None,
+                            doc_id: Optional[str] = None, content_hash: Optional[str] = None) -> int:
+        """Chunk locally and send the chunks, with their page numbers, to the document's shard server"""
+        if self._indexed_elsewhere(content_hash):
+            return 0
+        doc_id = doc_id or uuid.uuid4().hex
+        body = {
+            "chunks": [{"text": chunk, "metadata": extra or {}} for chunk, extra in chunks],
+            "metadata": metadata, "doc_id": doc_id, "content_hash": content_hash
+        }
+        response = self._request(self._shard_for_upload(doc_id, content_hash), "POST", "/shard/documents", json=body,
+                                 timeout=settings.SHARD_INGEST_TIMEOUT_SECONDS)
+        return response["chunks"]
+
+    def find_document(self, content_hash: str) -> Optional[str]:
+        """doc_id of an indexed upload with this content hash; raises if a shard that may hold it is down"""
+        responses = self._gather("GET", f"/shard/documents/by-hash/{content_hash}")
+        for response in responses:
+            if response and response.get("doc_id"):
+                return response["doc_id"]
+        self._require_answers(responses, "check for duplicate uploads")
+        return None
+
+    def get_document(self, doc_id: str) -> Optional[dict]:
+        return self._locate(doc_id)[1]
+
+    def delete_document(self, doc_id: str) -> int:
+        return self._request(self._holder(doc_id), "DELETE", f"/shard/documents/{doc_id}")["chunks"]
+
+    def replace_document(self, doc_id: str, text: str, metadata: Optional[dict] = None,
+                         content_hash: Optional[str] = None) -> int:
+        body = {"text": text, "metadata": metadata, "doc_id": doc_id, "content_hash": content_hash}
+        response = self._request(self._holder(doc_id), "PUT", f"/shard/documents/{doc_id}", json=body,
+                                 timeout=settings.SHARD_INGEST_TIMEOUT_SECONDS)
+        return response["chunks"]
+
+    def replace_document_stream(self, doc_id: str, chunks: Iterable[Tuple[str, dict]],
+                                metadata: Optional[dict] = None, content_hash: Optional[str] = None) -> int:
+        body = {
+            "chunks": [{"text": chunk, "metadata": extra or {}} for chunk, extra in chunks],
+            "metadata": metadata, "doc_id": doc_id, "content_hash": content_hash
+        }
+        response = self._request(self._holder(doc_id), "PUT", f"/shard/documents/{doc_id}", json=body,
+                                 timeout=settings.SHARD_INGEST_TIMEOUT_SECONDS)
+        return response["chunks"]
+
+    def list_documents(self) -> List[dict]:
+        return [doc for response in self._gather("GET", "/shard/documents") if response
+                for doc in response["documents"]]
+
+    def search(self, query: str, k: int = 3, threshold: float = None,
+               filters: Optional[dict] = None, mode: Optional[str] = None) -> SearchHits:
+        """Fan the query out to every shard server and merge whatever arrives in time"""
+        filters = validate_filters(filters)
+        mode = validate_retrieval_mode(mode or settings.RETRIEVAL_MODE)
+
+        if mode == RETRIEVAL_HYBRID:
+            depth = max(k, settings.HYBRID_CANDIDATES)
+            (dense, lexical), failed = self._scatter(query, depth, threshold, filters,
+                                                     [RETRIEVAL_DENSE, RETRIEVAL_LEXICAL])
+            return SearchHits(fuse_hybrid(dense, lexical, k, depth), failed)
+
+        (per_shard,), failed = self._scatter(query, k, threshold, filters, [mode])
+        hits = merge_hits(per_shard, k, descending=mode == RETRIEVAL_LEXICAL)
+        return SearchHits((hit for _, hit in hits), failed)
+
+    def _scatter(self, query: str, k: int, threshold: Optional[float], filters: Optional[dict],
+                 modes: List[str]) -> Tuple[List[List[list]], List[str]]:
+        """Per-mode, per-shard hit lists plus the URLs of shards that failed (they contribute empty lists)"""
+        calls = [
+            (shard_no, "POST", "/shard/search",
+             {"json": {"query": query, "k": k, "threshold": threshold, "filters": filters, "mode": mode}})
+            for mode in modes for shard_no in range(len(self.shard_urls))
+        ]
+        responses = self._fan_out(calls)
+        failed = self._failed_shards(calls, responses)
+
+        hits = [
+            [(hit["text"], hit["score"], hit["metadata"]) for hit in response["results"]] if response else []
+            for response in responses
+        ]
+        shards = len(self.shard_urls)
+        return [hits[i * shards:(i + 1) * shards] for i in range(len(modes))], failed
+
+    def search_batch(self, queries: List[str], k: int = 3, filters: Optional[dict] = None,
+                     include_text: bool = False) -> dict:
+        """Batched dense search on every shard server; ids are chunk_id * shards + shard number"""
+        filters = validate_filters(filters)
+        if not queries:
+            return merge_batches([], 0, k, include_text)
+
+        body = {"queries": queries, "k": k, "filters": filters, "include_text": include_text}
+        per_shard = self._gather("POST", "/shard/search/batch", json=body)
+        failed = self._failed_shards([(shard_no,) for shard_no in range(len(self.shard_urls))], per_shard)
+        results = merge_batches(per_shard, len(queries), k, include_text)
+        results.update(partial=bool(failed), failed_shards=failed)
+        return results
+
+    def get_size(self) -> int:
+        return sum(stats["chunks"] for stats in self._gather("GET", "/shard/stats") if stats)
+
+    def get_stats(self) -> dict:
+        """Totals over the reachable shard servers plus each server's own statistics"""
+        per_shard = self._gather("GET", "/shard/stats")
+        reachable = [stats for stats in per_shard if stats]
+        with self._stats_lock:
+            shard_failures, partial_searches = list(self.shard_failures), self.partial_searches
+        return {
+            "documents": sum(stats["documents"] for stats in reachable),
+            "chunks": sum(stats["chunks"] for stats in reachable),
+            "shards": [
+                {"url": url, "available": stats is not None, "failures": failures, "stats": stats}
+                for url, stats, failures in zip(self.shard_urls, per_shard, shard_failures)
+            ],
+            "partial_searches": partial_searches,
+            "generation": sum(stats.get("generation", 0) for stats in reachable)
+        }
+
+    def clear(self):
+        self._gather("POST", "/shard/clear", timeout=settings.SHARD_INGEST_TIMEOUT_SECONDS)
+        logger.info("Cleared all shard servers")
+
+    def compact_if_fragmented(self) -> bool:
+        responses = self._gather("POST", "/shard/compact", params={"if_fragmented": True},
+                                 timeout=settings.SHARD_INGEST_TIMEOUT_SECONDS)
+        return any(response and response.get("compacted") for response in responses)
+
+    def compact(self):
+        self._gather("POST", "/shard/compact", timeout=settings.SHARD_INGEST_TIMEOUT_SECONDS)
+
+    def _shard_for_upload(self, doc_id: str, content_hash: Optional[str]) -> int:
+        return shard_index(content_hash or doc_id, len(self.shard_urls))
+
+    def _indexed_elsewhere(self, content_hash: Optional[str]) -> bool:
+        # Uploads placed before they were routed by content hash may sit on any shard server; the
+        # target shard repeats the check under its write lock, which is what concurrent uploads rely on
+        existing = self.find_document(content_hash) if content_hash else None
+        if existing:
+            logger.info(f"Skipping upload already indexed as document {existing}")
+        return bool(existing)
+
+    def _locate(self, doc_id: str) -> Tuple[Optional[int], Optional[dict]]:
+        """(shard number, registry entry) of a document, (None, None) if no shard server has it"""
+        responses = self._gather("GET", f"/shard/documents/{doc_id}")
+        for shard_no, response in enumerate(responses):
+            if response:
+                return shard_no, response
+        self._require_answers(responses, f"locate document {doc_id}")
+        return None, None
+
+    def _holder(self, doc_id: str) -> int:
+        shard_no, _ = self._locate(doc_id)
+        if shard_no is None:
+            raise KeyError(doc_id)
+        return shard_no
+
+    def _require_answers(self, responses: List[Optional[Any]], action: str):
+        """A missing answer cannot be read as "not there" when that decides what gets written"""
+        failed = [url for url, response in zip(self.shard_urls, responses) if response is None]
+        if failed:
+            raise RuntimeError(f"Could not {action}: no answer from shard servers {', '.join(failed)}")
+
+    def _request(self, shard_no: int, method: str, path: str, **kwargs) -> Any:
+        """One call to a shard server, see _call"""
+        return asyncio.run_coroutine_threadsafe(self._call(shard_no, method, path, **kwargs), self._loop).result()
+
+    async def _call(self, shard_no: int, method: str, path: str, timeout: Optional[float] = None,
+                    **kwargs) -> Any:
+        """Call a shard server, cancelled after `timeout` in total; maps 404 / 400 to KeyError / ValueError"""
+        timeout = timeout or self.timeout
+        response = await asyncio.wait_for(
+            self.client.request(method, f"{self.shard_urls[shard_no]}{path}", timeout=timeout, **kwargs),
+            timeout
+        )
+        if response.status_code == 404:
+            raise KeyError(path)
+        if response.status_code == 400:
+            raise ValueError(response.json().get("detail", response.text))
+        response.raise_for_status()
+        return response.json()
+
+    def _gather(self, method: str, path: str, **kwargs) -> List[Optional[Any]]:
+        return self._fan_out([(shard_no, method, path, kwargs) for shard_no in range(len(self.shard_urls))])
+
+    def _fan_out(self, calls: List[Tuple[int, str, str, dict]]) -> List[Optional[Any]]:
+        """Run calls concurrently; a call that fails or runs past its timeout yields None, a 404 an empty dict"""
+        async def run_all():
+            return await asyncio.gather(
+                *(self._call(shard_no, method, path, **kwargs) for shard_no, method, path, kwargs in calls),
+                return_exceptions=True
+            )
+
+        outcomes = asyncio.run_coroutine_threadsafe(run_all(), self._loop).result()
+        results = []
+        for (shard_no, method, path, kwargs), outcome in zip(calls, outcomes):
+            if not isinstance(outcome, BaseException):
+                results.append(outcome)
+                continue
+            if isinstance(outcome, ValueError):
+                raise outcome
+            if isinstance(outcome, KeyError):
+                results.append({})  # the shard answered that it has nothing there
+                continue
+            with self._stats_lock:
+                self.shard_failures[shard_no] += 1
+            if isinstance(outcome, asyncio.TimeoutError):
+                reason = f"no answer within {kwargs.get('timeout') or self.timeout}s"
+            else:
+                reason = str(outcome) or type(outcome).__name__
+            logger.warning(f"Shard {self.shard_urls[shard_no]} failed {method} {path}: {reason}")
+            results.append(None)
+        return results
+
+    def _failed_shards(self, calls: List[tuple], responses: List[Optional[Any]]) -> List[str]:
+        """URLs of the shards with a failed call, counting the search as partial if there are any"""
+        failed = sorted({self.shard_urls[call[0]] for call, response in zip(calls, responses) if response is None})
+        if failed:
+            with self._stats_lock:
+                self.partial_searches += 1
+        return failed
@@ -0,0 +1,336 @@
+"""
+Sharded vector store.
+
+Documents are spread over N independent VectorStore shards by a hash of
+their upload's content hash, or of their doc_id when there is none. Each shard keeps its own snapshot directory and write-ahead
+log under VECTOR_STORE_DIR/shards/, so rebuilding or compacting one shard
+only rewrites that shard's files and swaps that shard's index while the
+others keep serving. A query is embedded once, searched on every shard in
+parallel (FAISS releases the GIL while searching) and the per-shard top-k
+lists are merged with a heap.
+
+Chunk deduplication and BM25 term statistics are per shard. Identical
+uploads always reach the same shard, whose write lock serialises the
+duplicate check with the add, so concurrent uploads of one file cannot both
+be indexed.
+"""
+import heapq
+import itertools
+import logging
+import os
+import uuid
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from app.core.config import settings
+from app.utils.hashing import shard_index
+from app.services.lexical_index import reciprocal_rank_fusion
+from app.services.metadata_index import validate_filters
+from app.services.vectorstore import (
+    RETRIEVAL_DENSE, RETRIEVAL_HYBRID, RETRIEVAL_LEXICAL, AwaitableStoreMixin, VectorStore, validate_retrieval_mode
+)
+
+logger = logging.getLogger(__name__)
+
+SHARDS_DIRNAME = "shards"
+
+
+def merge_hits(per_shard: List[list], k: int, descending: bool) -> List[Tuple[int, tuple]]:
+    """Heap-merge sorted per-shard (text, score, metadata) lists into the global top-k, tagged with their shard"""
+    tagged = [[(shard_no, hit) for hit in hits] for shard_no, hits in enumerate(per_shard)]
+    merged = heapq.merge(*tagged, key=lambda item: item[1][1], reverse=descending)
+    return list(itertools.islice(merged, k))
+
+
+def fuse_hybrid(dense_per_shard: List[list], lexical_per_shard: List[list], k: int,
+                depth: int) -> List[Tuple[str, float, dict]]:
+    """Merge each retriever's per-shard rankings globally, then fuse them by reciprocal rank"""
+    rankings, hits = [], {}
+    for per_shard, descending in ((dense_per_shard, False), (lexical_per_shard, True)):
+        ranking = []
+        for shard_no, hit in merge_hits(per_shard, depth, descending):
+            key = (shard_no, hit[2].get("chunk_id"), hit[0])
+            hits[key] = hit
+            ranking.append(key)
+        rankings.append(ranking)
+
+    fused = reciprocal_rank_fusion(rankings, settings.RRF_K)[:k]
+    return [(hits[key][0], float(score), hits[key][2]) for key, score in fused]
+
+
+def merge_batches(per_shard: List[dict], num_queries: int, k: int, include_text: bool) -> dict:
+    """Merge per-shard search_batch results; ids become chunk_id * number of shards + shard number"""
+    results = {"ids": [[] for _ in range(num_queries)], "scores": [[] for _ in range(num_queries)]}
+    if include_text:
+        results["texts"] = [[] for _ in range(num_queries)]
+
+    num_shards = len(per_shard)
+    for i in range(num_queries):
+        lists = [
+            zip(batch["scores"][i], batch["ids"][i], batch["texts"][i] if include_text else itertools.repeat(None),
+                itertools.repeat(shard_no))
+            for shard_no, batch in enumerate(per_shard) if batch
+        ]
+        for score, chunk_id, text, shard_no in itertools.islice(heapq.merge(*lists, key=lambda hit: hit[0]), k):
+            results["ids"][i].append(chunk_id * num_shards + shard_no)
+            results["scores"][i].append(score)
+            if include_text:
+                results["texts"][i].append(text)
+    return results
+
+
+class ShardedVectorStore(AwaitableStoreMixin):
+    """VectorStore API over N shards assigned by document hash"""
+
+    def __init__(self, num_shards: int, data_dir: Optional[str] = None):
+        if num_shards < 1:
+            raise ValueError("Sharded vector store needs at least one shard")
+        root = os.path.join(data_dir or settings.VECTOR_STORE_DIR, SHARDS_DIRNAME)
+        first = VectorStore(os.path.join(root, "shard-00"))
+        self.shards: List[VectorStore] = [first] + [
+            VectorStore(os.path.join(root, f"shard-{i:02d}"), first.embedding_model,
+                        first.embedding_cache, first.query_cache, first.embedding_scheduler,
+                        first.embedding_workers)
+            for i in range(1, num_shards)
+        ]
+        self.embedding_model = first.embedding_model
+        self.embedding_workers = first.embedding_workers
+        self.embedding_cache = first.embedding_cache
+        self.dimension = first.dimension
+        # Hybrid searches run a dense and a lexical search per shard at once
+        self._search_pool = ThreadPoolExecutor(max_workers=2 * num_shards, thread_name_prefix="shard-search")
+        logger.info(f"Sharded vector store ready: {num_shards} shards, {self.get_size()} chunks")
+
+    @property
+    def generation(self) -> int:
+        return sum(shard.generation for shard in self.shards)
+
+    def add_document(self, text: str, metadata: Optional[dict] = None, doc_id: Optional[str] = None,
+                     content_hash: Optional[str] = None) -> int:
+        """Add a document to the shard its content hash (or doc_id) hashes to"""
+        if self._indexed_elsewhere(content_hash):
+            return 0
+        doc_id = doc_id or uuid.uuid4().hex
+        return self._shard_for_upload(doc_id, content_hash).add_document(text, metadata, doc_id, content_hash)
+
+    def add_document_stream(self, chunks: Iterable[Tuple[str, dict]], metadata: Optional[dict] = None,
+                            doc_id: Optional[str] = None, content_hash: Optional[str] = None) -> int:
+        """Stream a document's chunks into the shard its content hash (or doc_id) hashes to"""
+        if self._indexed_elsewhere(content_hash):
+            return 0
+        doc_id = doc_id or uuid.uuid4().hex
+        return self._shard_for_upload(doc_id, content_hash).add_document_stream(
+            chunks, metadata, doc_id, content_hash
+        )
+
+    def find_document(self, content_hash: str) -> Optional[str]:
+        for shard in self.shards:
+            doc_id = shard.find_document(content_hash)
+            if doc_id:
+                return doc_id
+        return None
+
+    def get_document(self, doc_id: str) -> Optional[dict]:
+        shard = self._holder(doc_id)
+        return shard.get_document(doc_id) if shard else None
+
+    def delete_document(self, doc_id: str) -> int:
+        shard = self._holder(doc_id)
+        if shard is None:
+            raise KeyError(doc_id)
+        return shard.delete_document(doc_id)
+
+    def replace_document(self, doc_id: str, text: str, metadata: Optional[dict] = None,
+                         content_hash: Optional[str] = None) -> int:
+        shard = self._holder(doc_id)
+        if shard is None:
+            raise KeyError(doc_id)
+        return shard.replace_document(doc_id, text, metadata, content_hash)
+
+    def replace_document_stream(self, doc_id: str, chunks: Iterable[Tuple[str, dict]],
+                                metadata: Optional[dict] = None, content_hash: Optional[str] = None) -> int:
+        shard = self._holder(doc_id)
+        if shard is None:
+            raise KeyError(doc_id)
+        return shard.replace_document_stream(doc_id, chunks, metadata, content_hash)
+
+    def list_documents(self) -> List[dict]:
+        return [doc for shard in self.shards for doc in shard.list_documents()]
+
+    def search(self, query: str, k: int = 3, threshold: float = None,
+               filters: Optional[dict] = None, mode: Optional[str] = None,
+               query_embedding: Optional[np.ndarray] = None) -> List[Tuple[str, float, dict]]:
+        """Search every shard in parallel and merge their top-k lists.
+
+        Scores mean the same as for a single VectorStore. Hybrid mode merges
+        the dense and BM25 rankings across shards first and fuses the global
+        rankings, so ranks are not distorted by shard boundaries.
+        """
+        filters = validate_filters(filters)
+        mode = validate_retrieval_mode(mode or settings.RETRIEVAL_MODE)
+        if self.get_size() == 0:
+            logger.warning("Vector store is empty")
+            return []
+
+        q_emb = query_embedding
+        if q_emb is None and mode != RETRIEVAL_LEXICAL:
+            q_emb = self._encode_query(query)
+
+        if mode == RETRIEVAL_HYBRID:
+            return self._hybrid_search(query, k, threshold, filters, q_emb)
+
+        hits = merge_hits(self._scatter(query, k, threshold, filters, mode, q_emb), k,
+                          descending=mode == RETRIEVAL_LEXICAL)
+        return [hit for _, hit in hits]
+
+    def _scatter(self, query: str, k: int, threshold: Optional[float], filters: Optional[dict],
+                 mode: str, q_emb: Optional[np.ndarray]) -> List[List[Tuple[str, float, dict]]]:
+        """Per-shard results, each already sorted best first"""
+        return [future.result() for future in self._submit_scatter(query, k, threshold, filters, mode, q_emb)]
+
+    def _submit_scatter(self, query: str, k: int, threshold: Optional[float], filters: Optional[dict],
+                        mode: str, q_emb: Optional[np.ndarray]) -> List[Future]:
+        # Only per-shard searches go to the pool and they never wait on other pool tasks,
+        # so concurrent queries cannot fill the pool with tasks waiting on queued ones
+        return [
+            self._search_pool.submit(shard.search, query, k, threshold, filters, mode, q_emb)
+            for shard in self.shards
+        ]
+
+    def _hybrid_search(self, query: str, k: int, threshold: Optional[float], filters: Optional[dict],
+                       q_emb: np.ndarray) -> List[Tuple[str, float, dict]]:
+        depth = max(k, settings.HYBRID_CANDIDATES)
+        dense = self._submit_scatter(query, depth, threshold, filters, RETRIEVAL_DENSE, q_emb)
+        lexical = self._submit_scatter(query, depth, None, filters, RETRIEVAL_LEXICAL, None)
+
+        return fuse_hybrid([future.result() for future in dense], [future.result() for future in lexical],
+                           k, depth)
+
+    def search_batch(self, queries: List[str], k: int = 3, filters: Optional[dict] = None,
+                     include_text: bool = False, query_embeddings: Optional[np.ndarray] = None) -> dict:
+        """Batched dense search across shards.
+
+        Ids are global: chunk_id * number of shards + shard number, so they
+        stay unique while every shard numbers its chunks independently.
+        """
+        filters = validate_filters(filters)
+        if not queries or self.get_size() == 0:
+            return merge_batches([], len(queries), k, include_text)
+
+        q_emb = query_embeddings if query_embeddings is not None else self._encode_queries(queries)
+        futures = [
+            self._search_pool.submit(shard.search_batch, queries, k, filters, include_text, q_emb)
+            for shard in self.shards
+        ]
+        results = merge_batches([future.result() for future in futures], len(queries), k, include_text)
+
+        logger.info(f"Batch search for {len(queries)} queries across {len(self.shards)} shards (k={k})")
+        return results
+
+    def _encode_queries(self, queries: List[str]) -> np.ndarray:
+        # Shards share the model and query cache, so any shard can embed for all of them
+        return self.shards[0]._encode_queries(queries)
+
+    def _encode_query(self, query: str) -> np.ndarray:
+        return self.shards[0]._encode_query(query)
+
+    def get_size(self) -> int:
+        return sum(shard.get_size() for shard in self.shards)
+
+    def get_deleted_ratio(self) -> float:
+        rows = sum(len(shard.documents) for shard in self.shards)
+        return sum(len(shard.deleted_rows) for shard in self.shards) / rows if rows else 0.0
+
+    def get_index_info(self) -> dict:
+        infos = [shard.get_index_info() for shard in self.shards]
+        return {
+            "shards": len(self.shards),
+            "ntotal": sum(info["ntotal"] for info in infos),
+            "deleted_rows": sum(info["deleted_rows"] for info in infos),
+            "per_shard": infos
+        }
+
+    def get_stats(self) -> dict:
+        """Totals plus per-shard store and index statistics"""
+        first = self.shards[0]
+        return {
+            "documents": sum(len(shard.doc_registry) for shard in self.shards),
+            "chunks": self.get_size(),
+            "index": self.get_index_info(),
+            "shards": [
+                {
+                    "shard": shard_no,
+                    "documents": len(shard.doc_registry),
+                    "chunks": shard.get_size(),
+                    "deleted_ratio": round(shard.get_deleted_ratio(), 4),
+                    "result_cache": shard.result_cache.stats() if shard.result_cache else None,
+                    "generation": shard.generation
+                }
+                for shard_no, shard in enumerate(self.shards)
+            ],
+            "embedding_cache": first.embedding_cache.stats() if first.embedding_cache else None,
+            "query_cache": first.query_cache.stats() if first.query_cache else None,
+            "embedding_scheduler": first.embedding_scheduler.stats() if first.embedding_scheduler else None,
+            "embedding_workers": first.embedding_workers.stats() if first.embedding_workers else None,
+            "generation": self.generation
+        }
+
+    def evaluate_recall(self, queries: Optional[List[str]] = None, k: int = 10,
+                        sample_size: int = 100) -> dict:
+        """Per-shard recall@k against exact search, averaged by shard size"""
+        shards = [shard for shard in self.shards if shard.get_size()]
+        reports = [shard.evaluate_recall(queries, k, sample_size) for shard in shards]
+        total = sum(shard.get_size() for shard in shards)
+        recall = sum(report["recall"] * shard.get_size() for report, shard in zip(reports, shards)) / total \
+            if total else 0.0
+        return {"recall": recall, "k": k, "per_shard": reports}
+
+    def rebuild_index(self, index_type: Optional[str] = None, persist: bool = True,
+                      shard: Optional[int] = None):
+        """Rebuild one shard, or every shard one at a time so the rest keep serving"""
+        for target in self._targets(shard):
+            target.rebuild_index(index_type, persist)
+
+    def clear(self):
+        for shard in self.shards:
+            shard.clear()
+        logger.info("Sharded vector store cleared")
+
+    def compact_if_fragmented(self) -> bool:
+        """Compact only the shards whose deleted ratio crossed the threshold"""
+        return any([shard.compact_if_fragmented() for shard in self.shards])
+
+    def compact(self, shard: Optional[int] = None):
+        for target in self._targets(shard):
+            target.compact()
+
+    def _targets(self, shard: Optional[int]) -> Iterable[VectorStore]:
+        if shard is None:
+            return self.shards
+        if not 0 <= shard < len(self.shards):
+            raise ValueError(f"Unknown shard {shard}, store has {len(self.shards)} shards")
+        return [self.shards[shard]]
+
+    def _holder(self, doc_id: str) -> Optional[VectorStore]:
+        """Shard whose registry holds the document (found even if the shard count changed)"""
+        for shard in self.shards:
+            if doc_id in shard.doc_registry:
+                return shard
+        return None
+
+    def _shard_for(self, doc_id: str) -> VectorStore:
+        return self._holder(doc_id) or self.shards[shard_index(doc_id, len(self.shards))]
+
+    def _shard_for_upload(self, doc_id: str, content_hash: Optional[str]) -> VectorStore:
+        """Shard for a new upload: the one its content hash picks, where the duplicate check is locked"""
+        return self._holder(doc_id) or self.shards[shard_index(content_hash or doc_id, len(self.shards))]
+
+    def _indexed_elsewhere(self, content_hash: Optional[str]) -> bool:
+        # Uploads indexed before they were placed by content hash may sit on any shard; the target
+        # shard repeats the check under its write lock, which is what concurrent uploads rely on
+        existing = self.find_document(content_hash) if content_hash else None
+        if existing:
+            logger.info(f"Skipping upload already indexed as document {existing}")
+        return bool(existing)
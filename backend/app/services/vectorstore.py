@@ -3,138 +3,1312 @@
 FILE 3: app/services/vectorstore.py
 =============================================================================
 """
-from sentence_transformers import SentenceTransformer
-import faiss
 import numpy as np
-from typing import List, Tuple, Optional
+from typing import Dict, Iterable, List, Set, Tuple, Optional
+from concurrent.futures import ThreadPoolExecutor
 import logging
 import pickle
+import json
 import os
+import uuid
+import bisect
+import itertools
+import threading
 from datetime import datetime
 
 from app.core.config import settings
+from app.utils.cache import TTLCache
+from app.utils.hashing import chunk_hash
+from app.utils.lazy import LazyResource
+from app.utils.pipeline import batched, prefetch
+from app.utils.rwlock import RWLock
+from app.services.index_factory import (
+    INDEX_BINARY, INDEX_FLAT, build_index, clone_index, describe_index, evaluate_recall, exact_search,
+    read_index, reconstruct_vectors, refill_index, requires_training, rerank_candidates, rerank_exact,
+    search_index, train_index, training_threshold, validate_index_type, write_index
+)
+from app.services.embedding_backends import EmbeddingBackend, create_embedding_backend
+from app.services.embedding_cache import EmbeddingCache, normalize_text
+from app.services.embedding_scheduler import EmbeddingScheduler
+from app.services.embedding_workers import EmbeddingProcessPool
+from app.services.token_batching import TokenBudgetBatcher
+from app.services.executors import run_ingest, run_query
+from app.services.lexical_index import LexicalIndex, reciprocal_rank_fusion
+from app.services.metadata_index import MetadataIndex, validate_filters
+from app.services.segment_store import OP_ADD, OP_CLEAR, OP_DELETE, OP_REPLACE, SegmentLog, SnapshotDirectory
+from app.services.mmap_store import (
+    CHUNK_IDS_FILENAME, MMAP_READ_FLAGS, VECTORS_FILENAME, ChunkTable, LayeredIndex, MappedRecords,
+    MappedVectors, decode_json, encode_json, open_array
+)
 
 logger = logging.getLogger(__name__)
 
-class VectorStore:
+# File names inside a snapshot directory
+INDEX_FILENAME = "index.bin"
+DOCS_FILENAME = "documents.pkl"
+META_FILENAME = "index_meta.json"
+CHUNKS_FILENAME = "chunks"
+CHUNK_META_FILENAME = "metadata"
+DOC_REGISTRY_FILENAME = "doc_registry.json"
+
+STORAGE_PICKLE = "pickle"
+STORAGE_MMAP = "mmap"
+RETRIEVAL_DENSE = "dense"
+RETRIEVAL_LEXICAL = "lexical"
+RETRIEVAL_HYBRID = "hybrid"
+RETRIEVAL_MODES = (RETRIEVAL_DENSE, RETRIEVAL_LEXICAL, RETRIEVAL_HYBRID)
+
+class AwaitableStoreMixin:
+    """Awaitable store API for request handlers: writes run on the ingest pool, reads on the query pool"""
+    
+    async def add_document_async(self, text: str, metadata: Optional[dict] = None, doc_id: Optional[str] = None,
+                                 content_hash: Optional[str] = None) -> int:
+        return await run_ingest(self.add_document, text, metadata, doc_id=doc_id, content_hash=content_hash)
+    
+    async def add_document_stream_async(self, chunks: Iterable[Tuple[str, dict]], metadata: Optional[dict] = None,
+                                        doc_id: Optional[str] = None, content_hash: Optional[str] = None) -> int:
+        return await run_ingest(self.add_document_stream, chunks, metadata, doc_id=doc_id,
+                                content_hash=content_hash)
+    
+    async def replace_document_async(self, doc_id: str, text: str, metadata: Optional[dict] = None,
+                                     content_hash: Optional[str] = None) -> int:
+        return await run_ingest(self.replace_document, doc_id, text, metadata, content_hash=content_hash)
+    
+    async def replace_document_stream_async(self, doc_id: str, chunks: Iterable[Tuple[str, dict]],
+                                            metadata: Optional[dict] = None,
+                                            content_hash: Optional[str] = None) -> int:
+        return await run_ingest(self.replace_document_stream, doc_id, chunks, metadata, content_hash=content_hash)
+    
+    async def delete_document_async(self, doc_id: str) -> int:
+        return await run_ingest(self.delete_document, doc_id)
+    
+    async def clear_async(self):
+        return await run_ingest(self.clear)
+    
+    async def compact_if_fragmented_async(self) -> bool:
+        return await run_ingest(self.compact_if_fragmented)
+    
+    async def compact_async(self):
+        return await run_ingest(self.compact)
+    
+    async def search_async(self, query: str, k: int = 3, threshold: float = None,
+                           filters: Optional[dict] = None, mode: Optional[str] = None) -> List[Tuple[str, float, dict]]:
+        return await run_query(self.search, query, k, threshold=threshold, filters=filters, mode=mode)
+    
+    async def search_batch_async(self, queries: List[str], k: int = 3, filters: Optional[dict] = None,
+                                 include_text: bool = False) -> dict:
+        return await run_query(self.search_batch, queries, k, filters=filters, include_text=include_text)
+    
+    async def find_document_async(self, content_hash: str) -> Optional[str]:
+        return await run_query(self.find_document, content_hash)
+    
+    async def get_document_async(self, doc_id: str) -> Optional[dict]:
+        return await run_query(self.get_document, doc_id)
+    
+    async def list_documents_async(self) -> List[dict]:
+        return await run_query(self.list_documents)
+    
+    async def get_size_async(self) -> int:
+        return await run_query(self.get_size)
+    
+    async def get_stats_async(self) -> dict:
+        return await run_query(self.get_stats)
+
+
+class VectorStore(AwaitableStoreMixin):
     """Enhanced vector store with persistence and metadata tracking"""
     
-    def __init__(self):
-        self.embedding_model = SentenceTransformer(settings.EMBEDDING_MODEL)
+    def __init__(self, data_dir: Optional[str] = None, embedding_model: Optional[EmbeddingBackend] = None,
+                 embedding_cache: Optional[EmbeddingCache] = None, query_cache: Optional[TTLCache] = None,
+                 embedding_scheduler: Optional[EmbeddingScheduler] = None,
+                 embedding_workers: Optional[EmbeddingProcessPool] = None):
+        # Shards pass their own data directory plus the model, caches and embedders they share
+        self.embedding_model = embedding_model or load_embedding_model(settings.EMBEDDING_MODEL)
         self.dimension = self.embedding_model.get_sentence_embedding_dimension()
-        self.index = faiss.IndexFlatL2(self.dimension)
+        self.index_type = validate_index_type(settings.VECTOR_INDEX_TYPE)
+        self.active_index_type = INDEX_FLAT
+        self.index = self._new_index()
         self.documents: List[str] = []
         self.metadata: List[dict] = []
-        self.index_file = "faiss_index.bin"
+        self.vectors = MappedVectors(None, self.dimension)  # full precision, for re-scoring and rebuilds
+        # Rows are positions in the index; chunk ids are stable across compactions
+        self.chunk_table = ChunkTable()  # chunk id and content hash per row
+        self.next_chunk_id = 0
+        self.deleted_rows: set = set()  # tombstones, dropped at the next compaction
+        self.doc_registry: Dict[str, dict] = {}
+        self.metadata_index = MetadataIndex()
+        self.lexical_index = LexicalIndex()
+        # Content addressing: identical chunks share one row, identical uploads are skipped
+        self.shared_refs: Dict[int, Set[str]] = {}  # chunk id -> documents reusing it besides its owner
+        self.orphaned: Set[int] = set()  # chunk ids kept alive by references after their owner was deleted
+        self.content_hashes: Dict[str, str] = {}  # upload hash -> doc_id
+        self._live_mask_cache: Optional[np.ndarray] = None
+        self._derived_on_load = False  # registry or postings rebuilt from an older snapshot
+        self.embedding_cache = embedding_cache or (EmbeddingCache(
+            settings.EMBEDDING_CACHE_DIR, getattr(self.embedding_model, "cache_name", settings.EMBEDDING_MODEL),
+            self.dimension, settings.EMBEDDING_CACHE_MAX_MB
+        ) if settings.EMBEDDING_CACHE_ENABLED else None)
+        self.query_cache = query_cache or (TTLCache(
+            settings.QUERY_CACHE_MAX_ENTRIES, settings.CACHE_TTL_SECONDS
+        ) if settings.ENABLE_CACHING else None)
+        self.result_cache = TTLCache(
+            settings.RESULT_CACHE_MAX_ENTRIES, settings.CACHE_TTL_SECONDS
+        ) if settings.ENABLE_CACHING else None
+        # Query embeddings from concurrent searches are encoded together
+        self.embedding_scheduler = embedding_scheduler or (EmbeddingScheduler(
+            self.embedding_model, settings.EMBEDDING_BATCH_WINDOW_MS, settings.EMBEDDING_BATCH_MAX_SIZE
+        ) if settings.EMBEDDING_BATCHING_ENABLED else None)
+        # Chunks are embedded in length-sorted batches to cut padding
+        self.chunk_batcher = TokenBudgetBatcher(
+            self.embedding_model, settings.EMBEDDING_TOKEN_BUDGET, settings.EMBEDDING_MAX_BATCH
+        ) if settings.EMBEDDING_TOKEN_BUDGET > 0 else None
+        # Large uploads are embedded on worker processes
+        self.embedding_workers = embedding_workers or (EmbeddingProcessPool(
+            settings.EMBEDDING_MODEL, settings.EMBEDDING_BACKEND, self.dimension,
+            settings.EMBEDDING_PROCESS_WORKERS, settings.EMBEDDING_PROCESS_BATCH,
+            token_budget=settings.EMBEDDING_TOKEN_BUDGET, max_batch=settings.EMBEDDING_MAX_BATCH,
+            length_model=self.embedding_model
+        ) if settings.EMBEDDING_PROCESS_WORKERS > 0 else None)
+        self.generation = 0  # bumped on every change to searchable content
+        self._search_pool = ThreadPoolExecutor(max_workers=settings.HYBRID_SEARCH_WORKERS,
+                                               thread_name_prefix="hybrid-search")
+        # Legacy single-file layout, migrated into a snapshot on first compaction
+        self.index_file = "faiss_index.bin" if data_dir is None else None
         self.docs_file = "documents.pkl"
+        self.data_dir = data_dir or settings.VECTOR_STORE_DIR
+        self.snapshots = SnapshotDirectory(self.data_dir)
+        self.wal = SegmentLog(os.path.join(self.data_dir, "wal.log"), fsync=settings.WAL_FSYNC)
+        self.last_seq = 0
+        self.storage_format = settings.VECTOR_STORAGE_FORMAT
+        # Searches hold the read lock; applying a change takes the write lock only briefly.
+        # Writers are serialized by _write_lock, so embedding, training and compaction
+        # work happen without blocking searches.
+        self._rw = RWLock()
+        self._write_lock = threading.RLock()
         
         self._load_index()
     
-    def add_document(self, text: str, metadata: Optional[dict] = None) -> int:
-        """Add a document to the vector store"""
+    def add_document(self, text: str, metadata: Optional[dict] = None, doc_id: Optional[str] = None,
+                     content_hash: Optional[str] = None) -> int:
+        """Add a document to the vector store; returns the number of chunks it references"""
         try:
-            from app.utils.pdf_reader import chunk_text
+            chunks = self._chunk_document(text)
+            return self._add_batches([[(chunk, None) for chunk in chunks]], metadata, doc_id, content_hash)
             
-            chunks = chunk_text(text, settings.CHUNK_SIZE, settings.CHUNK_OVERLAP)
+        except Exception as e:
+            logger.error(f"Failed to add document to vector store: {str(e)}")
+            raise
+    
+    def add_document_stream(self, chunks: Iterable[Tuple[str, dict]], metadata: Optional[dict] = None,
+                            doc_id: Optional[str] = None, content_hash: Optional[str] = None) -> int:
+        """Add a document from a stream of (chunk, extra chunk metadata), e.g. iter_pdf_chunks.
+        
+        The stream is consumed on a background thread, INGEST_STREAM_BATCH
+        chunks at a time and at most INGEST_STREAM_DEPTH batches ahead, so
+        extraction of the next pages overlaps embedding of the current batch
+        and the document's text is never held in one piece. Embedding cache
+        misses are collected across batches until there are enough to keep
+        the embedding worker processes busy (see _embed_flush_size). The document is
+        still logged and applied as one record once every batch is embedded.
+        """
+        batches = self._prefetch_batches(chunks)
+        try:
+            return self._add_batches(batches, metadata, doc_id, content_hash)
             
-            if not chunks:
+        except Exception as e:
+            logger.error(f"Failed to add document to vector store: {str(e)}")
+            raise
+        finally:
+            batches.close()
+    
+    def _add_batches(self, batches: Iterable[List[Tuple[str, Optional[dict]]]], metadata: Optional[dict],
+                     doc_id: Optional[str], content_hash: Optional[str]) -> int:
+        with self._write_lock:
+            if content_hash and content_hash in self.content_hashes:
+                logger.info(f"Skipping upload already indexed as document {self.content_hashes[content_hash]}")
+                return 0
+            
+            doc_id = doc_id or uuid.uuid4().hex
+            record = self._add_record(doc_id, batches, metadata, content_hash)
+            if not record["documents"] and not record["shared_chunk_ids"]:
                 raise ValueError("No valid chunks created from document")
+            self._log_and_apply(OP_ADD, record)
             
-            embeddings = self.embedding_model.encode(chunks, show_progress_bar=False)
-            self.index.add(np.array(embeddings, dtype=np.float32))
+            logger.info(
+                f"Added {len(record['documents'])} chunks to vector store (document {doc_id}, "
+                f"{len(record['shared_chunk_ids'])} shared with existing chunks)"
+            )
+            self._maybe_compact()
+        
+        return len(record["documents"]) + len(record["shared_chunk_ids"])
+    
+    def _prefetch_batches(self, chunks: Iterable[Tuple[str, dict]]):
+        # Nothing is read from `chunks` until the first batch is requested
+        return prefetch(batched(chunks, settings.INGEST_STREAM_BATCH), settings.INGEST_STREAM_DEPTH,
+                        name="ingest-stream")
+    
+    def find_document(self, content_hash: str) -> Optional[str]:
+        """doc_id of an already indexed upload with this content hash"""
+        return self.content_hashes.get(content_hash)
+    
+    def get_document(self, doc_id: str) -> Optional[dict]:
+        """Registry entry of a document, None if it is not indexed"""
+        return self.doc_registry.get(doc_id)
+    
+    def delete_document(self, doc_id: str) -> int:
+        """Drop a document's references; unshared chunks are tombstoned until compaction"""
+        with self._write_lock:
+            entry = self.doc_registry.get(doc_id)
+            if entry is None:
+                raise KeyError(doc_id)
             
-            for i, chunk in enumerate(chunks):
-                self.documents.append(chunk)
-                chunk_metadata = metadata.copy() if metadata else {}
-                chunk_metadata.update({
-                    "chunk_id": len(self.documents) - 1,
-                    "chunk_index": i,
-                    "timestamp": datetime.utcnow().isoformat(),
-                    "length": len(chunk)
-                })
-                self.metadata.append(chunk_metadata)
+            chunk_ids = self._doc_chunk_ids(entry)
+            self._log_and_apply(OP_DELETE, {"doc_id": doc_id, "chunk_ids": chunk_ids})
             
-            logger.info(f"Added {len(chunks)} chunks to vector store")
-            self._save_index()
+            logger.info(f"Deleted document {doc_id} ({len(chunk_ids)} chunks)")
+            self._maybe_compact()
+            return len(chunk_ids)
+    
+    def replace_document(self, doc_id: str, text: str, metadata: Optional[dict] = None,
+                         content_hash: Optional[str] = None) -> int:
+        """Replace a document's chunks with a new revision, keeping its id"""
+        with self._write_lock:
+            if doc_id not in self.doc_registry:
+                raise KeyError(doc_id)
+            chunks = self._chunk_document(text)
+            return self._replace_batches(doc_id, [[(chunk, None) for chunk in chunks]], metadata, content_hash)
+    
+    def replace_document_stream(self, doc_id: str, chunks: Iterable[Tuple[str, dict]],
+                                metadata: Optional[dict] = None, content_hash: Optional[str] = None) -> int:
+        """replace_document from a stream of (chunk, extra chunk metadata), see add_document_stream"""
+        batches = self._prefetch_batches(chunks)
+        try:
+            return self._replace_batches(doc_id, batches, metadata, content_hash)
+        finally:
+            batches.close()
+    
+    def _replace_batches(self, doc_id: str, batches: Iterable[List[Tuple[str, Optional[dict]]]],
+                         metadata: Optional[dict], content_hash: Optional[str]) -> int:
+        with self._write_lock:
+            entry = self.doc_registry.get(doc_id)
+            if entry is None:
+                raise KeyError(doc_id)
+            if content_hash and entry.get("content_hash") == content_hash:
+                logger.info(f"Document {doc_id} is unchanged, nothing to replace")
+                return self._doc_chunk_count(entry)
             
-            return len(chunks)
+            # Embed before logging anything so a failure leaves the old revision intact.
+            # Chunks the delete is about to drop are re-added from their stored vectors.
+            record = self._add_record(doc_id, batches, metadata, content_hash,
+                                      doomed=self._doomed_chunk_ids(doc_id, entry))
+            chunks_created = len(record["documents"]) + len(record["shared_chunk_ids"])
+            if not chunks_created:
+                raise ValueError("No valid chunks created from document")
+            # One record: a crash cannot separate the delete from the add, and
+            # searches see either the old revision or the new one
+            self._log_and_apply(OP_REPLACE, dict(record, replaced_chunk_ids=self._doc_chunk_ids(entry)))
             
-        except Exception as e:
-            logger.error(f"Failed to add document to vector store: {str(e)}")
-            raise
+            logger.info(f"Replaced document {doc_id} with {chunks_created} chunks")
+            self._maybe_compact()
+            return chunks_created
     
-    def search(self, query: str, k: int = 3, threshold: float = None) -> List[Tuple[str, float, dict]]:
-        """Search for similar documents"""
-        if len(self.documents) == 0:
+    def list_documents(self) -> List[dict]:
+        """Registered documents with their chunk counts"""
+        with self._rw.read():
+            return [
+                {"doc_id": doc_id, "chunks": self._doc_chunk_count(entry), **entry.get("metadata", {})}
+                for doc_id, entry in self.doc_registry.items()
+            ]
+    
+    def search(self, query: str, k: int = 3, threshold: float = None,
+               filters: Optional[dict] = None, mode: Optional[str] = None,
+               query_embedding: Optional[np.ndarray] = None) -> List[Tuple[str, float, dict]]:
+        """Search for similar documents, optionally restricted by a metadata filter.
+        
+        `mode` picks dense (L2 distance), lexical (BM25 score) or hybrid
+        (reciprocal rank fusion score) retrieval; `threshold` applies to
+        dense distances only. A caller that already embedded the query
+        (e.g. once for every shard) passes it as `query_embedding`.
+        """
+        filters = validate_filters(filters)
+        mode = validate_retrieval_mode(mode or settings.RETRIEVAL_MODE)
+        live_count = self.get_size()
+        if live_count == 0:
             logger.warning("Vector store is empty")
             return []
         
+        cache_key = None
+        if self.result_cache is not None:
+            cache_key = (normalize_text(query), k, threshold, mode, json.dumps(filters, sort_keys=True, default=str))
+            cached = self.result_cache.get(cache_key + (self.generation,))
+            if cached is not None:
+                return list(cached)
+        
         try:
-            q_emb = self.embedding_model.encode([query], show_progress_bar=False)
-            k = min(k, len(self.documents))
-            distances, indices = self.index.search(np.array(q_emb, dtype=np.float32), k)
-            
-            results = []
-            for dist, idx in zip(distances[0], indices[0]):
-                if idx < len(self.documents):
-                    if threshold is None or dist <= threshold:
-                        results.append((
-                            self.documents[idx],
-                            float(dist),
-                            self.metadata[idx]
-                        ))
-            
-            logger.info(f"Found {len(results)} relevant documents for query")
+            # Embed before taking the read lock so writers never wait on the model
+            if query_embedding is None and mode != RETRIEVAL_LEXICAL:
+                query_embedding = self._encode_query(query)
+            
+            with self._rw.read():
+                results = self._search_locked(query, k, threshold, filters, mode, query_embedding)
+                if cache_key is not None:
+                    self.result_cache.put(cache_key + (self.generation,), tuple(results))
+            
+            logger.info(f"Found {len(results)} relevant documents for query ({mode})")
             return results
             
         except Exception as e:
             logger.error(f"Search failed: {str(e)}")
             return []
     
+    def _search_locked(self, query: str, k: int, threshold: Optional[float], filters: Optional[dict],
+                       mode: str, q_emb: Optional[np.ndarray]) -> List[Tuple[str, float, dict]]:
+        """Search body; runs under the read lock so it sees no half-applied change"""
+        allowed = self._filter_mask(filters) if filters else self._live_mask()
+        candidate_total = int(allowed.sum()) if allowed is not None else self.get_size()
+        if candidate_total == 0:
+            logger.info("No chunks match the search filters")
+            return []
+        
+        k = min(k, candidate_total)
+        
+        if mode == RETRIEVAL_DENSE:
+            hits = self._dense_search(query, k, allowed, candidate_total, filters, threshold, q_emb)
+        elif mode == RETRIEVAL_LEXICAL:
+            scores, rows = self.lexical_index.search(query, k, allowed)
+            hits = list(zip(rows.tolist(), scores.tolist()))
+        else:
+            hits = self._hybrid_search(query, k, allowed, candidate_total, filters, threshold, q_emb)
+        
+        results = []
+        for idx, score in hits:
+            if 0 <= idx < len(self.documents):
+                results.append((
+                    self.documents[idx],
+                    float(score),
+                    self._result_metadata(idx)
+                ))
+        return results
+    
+    def _dense_search(self, query: str, k: int, allowed: Optional[np.ndarray], candidate_total: int,
+                      filters: Optional[dict], threshold: Optional[float],
+                      q_emb: Optional[np.ndarray] = None) -> List[Tuple[int, float]]:
+        """Embed the query and return (row, distance) pairs, nearest first"""
+        if q_emb is None:
+            q_emb = self._encode_query(query)
+        distances, indices = self._search_vectors(q_emb, k, allowed, candidate_total, filters)
+        
+        return [
+            (int(idx), float(dist)) for dist, idx in zip(distances[0], indices[0])
+            if idx >= 0 and (threshold is None or dist <= threshold)
+        ]
+    
+    def _search_vectors(self, q_emb: np.ndarray, k: int, allowed: Optional[np.ndarray],
+                        candidate_total: int, filters: Optional[dict]):
+        """Top-k (distances, rows) for a matrix of query embeddings"""
+        if filters and candidate_total <= settings.FILTER_EXACT_MAX_ROWS:
+            # Small subsets are cheaper to scan exactly than to probe the ANN index
+            return self._search_rows(q_emb, np.flatnonzero(allowed), k)
+        
+        distances, indices = self._search_index(q_emb, k, allowed, candidate_total)
+        if filters and (indices < 0).any():
+            # Approximate indexes can miss a sparse subset; fall back to an exact scan
+            return self._search_rows(q_emb, np.flatnonzero(allowed), k)
+        return distances, indices
+    
+    def _encode_queries(self, queries: List[str]) -> np.ndarray:
+        """Embed many queries with a single encode call for the ones not cached"""
+        keys = [normalize_text(query) for query in queries]
+        q_emb = np.empty((len(queries), self.dimension), dtype=np.float32)
+        missing = []
+        for i, key in enumerate(keys):
+            cached = self.query_cache.get(key) if self.query_cache is not None else None
+            if cached is None:
+                missing.append(i)
+            else:
+                q_emb[i] = cached[0]
+        
+        if missing:
+            texts = [keys[i] for i in missing]
+            if self.embedding_scheduler is not None and len(missing) < self.embedding_scheduler.max_batch:
+                encoded = self.embedding_scheduler.encode(texts)
+            else:
+                # Already a full batch on its own
+                encoded = np.array(self.embedding_model.encode(texts, show_progress_bar=False), dtype=np.float32)
+            q_emb[missing] = encoded
+            if self.query_cache is not None:
+                for i, vector in zip(missing, encoded):
+                    cached = vector[None, :].copy()
+                    cached.setflags(write=False)
+                    self.query_cache.put(keys[i], cached)
+        return q_emb
+    
+    def _encode_query(self, query: str) -> np.ndarray:
+        """Embed a query as a (1, d) array, reusing cached embeddings of identical text"""
+        return self._encode_queries([query])
+    
+    def _hybrid_search(self, query: str, k: int, allowed: Optional[np.ndarray], candidate_total: int,
+                       filters: Optional[dict], threshold: Optional[float],
+                       q_emb: Optional[np.ndarray] = None) -> List[Tuple[int, float]]:
+        """Run BM25 and dense retrieval concurrently and fuse their rankings"""
+        depth = min(max(k, settings.HYBRID_CANDIDATES), candidate_total)
+        lexical = self._search_pool.submit(self.lexical_index.search, query, depth, allowed)
+        dense = self._dense_search(query, depth, allowed, candidate_total, filters, threshold, q_emb)
+        _, lexical_rows = lexical.result()
+        
+        fused = reciprocal_rank_fusion([[row for row, _ in dense], lexical_rows.tolist()], settings.RRF_K)
+        return fused[:k]
+    
+    def _search_index(self, q_emb: np.ndarray, k: int, allowed: Optional[np.ndarray], candidate_total: int):
+        """ANN search with the row mask pushed down, re-scoring lossy candidates if configured"""
+        candidate_count = rerank_candidates(self.active_index_type)
+        if not candidate_count:
+            return search_index(self.index, q_emb, k, allowed)
+        
+        fetch_k = min(max(k, candidate_count), candidate_total)
+        _, candidates = search_index(self.index, q_emb, fetch_k, allowed)
+        distances = np.full((len(q_emb), k), np.inf, dtype=np.float32)
+        indices = np.full((len(q_emb), k), -1, dtype=np.int64)
+        for i, row in enumerate(candidates):
+            ids = row[row >= 0]
+            exact, ids = rerank_exact(q_emb[i], ids, self.vectors.take(ids), k)
+            distances[i, :len(ids)], indices[i, :len(ids)] = exact, ids
+        return distances, indices
+    
+    def _search_rows(self, q_emb: np.ndarray, rows: np.ndarray, k: int):
+        """Exact search over an explicit set of rows using the full-precision vectors"""
+        distances, local = exact_search(q_emb, self.vectors.take(rows), k)
+        return distances, np.where(local >= 0, rows[np.maximum(local, 0)], -1)
+    
+    def _filter_mask(self, filters: dict) -> np.ndarray:
+        """Row mask of live chunks belonging to documents that match the filter"""
+        mask = np.zeros(len(self.documents), dtype=bool)
+        doc_ids = self.metadata_index.match(filters)
+        if not doc_ids:
+            return mask
+        
+        entries = [self.doc_registry[doc_id] for doc_id in doc_ids if self.doc_registry[doc_id]["chunk_count"]]
+        rows = self._rows_for_chunk_ids([entry["chunk_start"] for entry in entries])
+        for entry, row in zip(entries, rows):
+            mask[row:row + entry["chunk_count"]] = True
+        shared = [cid for doc_id in doc_ids for cid in self.doc_registry[doc_id].get("shared_chunk_ids", ())]
+        if shared:
+            mask[self._rows_for_chunk_ids(shared)] = True
+        
+        live = self._live_mask()
+        return mask & live if live is not None else mask
+    
+    def search_batch(self, queries: List[str], k: int = 3, filters: Optional[dict] = None,
+                     include_text: bool = False, query_embeddings: Optional[np.ndarray] = None) -> dict:
+        """Dense search for many queries with one encode call and one matrix index search.
+        
+        Returns stable chunk ids and L2 distances per query, nearest first,
+        plus the chunk texts when `include_text` is set.
+        """
+        filters = validate_filters(filters)
+        results = {"ids": [[] for _ in queries], "scores": [[] for _ in queries]}
+        if include_text:
+            results["texts"] = [[] for _ in queries]
+        
+        if not queries or self.get_size() == 0:
+            return results
+        q_emb = query_embeddings if query_embeddings is not None else self._encode_queries(queries)
+        
+        with self._rw.read():
+            allowed = self._filter_mask(filters) if filters else self._live_mask()
+            candidate_total = int(allowed.sum()) if allowed is not None else self.get_size()
+            if candidate_total == 0:
+                return results
+            
+            k = min(k, candidate_total)
+            distances, indices = self._search_vectors(q_emb, k, allowed, candidate_total, filters)
+            
+            for i in range(len(queries)):
+                valid = indices[i] >= 0
+                rows = indices[i][valid]
+                results["ids"][i] = self.chunk_table.ids_at(rows).tolist()
+                results["scores"][i] = distances[i][valid].tolist()
+                if include_text:
+                    results["texts"][i] = [self.documents[row] for row in rows.tolist()]
+        
+        logger.info(f"Batch search for {len(queries)} queries (k={k})")
+        return results
+    
+    def _result_metadata(self, row: int) -> dict:
+        """Chunk metadata, listing the other documents that share the chunk.
+        
+        A chunk whose owner was deleted is attributed to the earliest
+        remaining document that references it, so results never cite a
+        document that no longer exists.
+        """
+        chunk_metadata = self.metadata[row]
+        chunk_id = self.chunk_table.id_at(row)
+        refs = self.shared_refs.get(chunk_id)
+        if refs and chunk_id in self.orphaned:
+            owner = min(refs, key=lambda doc_id: (self.doc_registry[doc_id]["chunk_start"], doc_id))
+            # The deleted owner's page numbers say nothing about where the new owner has the text
+            chunk_metadata = {key: value for key, value in chunk_metadata.items() if key != "page_numbers"}
+            chunk_metadata.update(self.doc_registry[owner].get("metadata", {}), doc_id=owner)
+            refs = refs - {owner}
+        if refs:
+            chunk_metadata = dict(chunk_metadata, shared_by=sorted(refs))
+        return chunk_metadata
+    
     def get_size(self) -> int:
-        """Get the number of documents in the store"""
-        return len(self.documents)
+        """Get the number of live chunks in the store"""
+        return len(self.documents) - len(self.deleted_rows)
+    
+    def get_deleted_ratio(self) -> float:
+        """Fraction of stored rows that are tombstoned"""
+        return len(self.deleted_rows) / len(self.documents) if len(self.documents) else 0.0
+    
+    def get_index_info(self) -> dict:
+        """Describe the configured and currently active index"""
+        index = self.index
+        if isinstance(index, LayeredIndex) and index.base is not None:
+            index = index.base
+        info = describe_index(index)
+        info.update({
+            "ntotal": self.index.ntotal,
+            "index_type": self.index_type,
+            "active_index_type": self.active_index_type,
+            "storage_format": self.storage_format,
+            "training_threshold": training_threshold(self.index_type),
+            "deleted_rows": len(self.deleted_rows)
+        })
+        return info
+    
+    def get_stats(self) -> dict:
+        """Store, index and cache statistics"""
+        return {
+            "documents": len(self.doc_registry),
+            "chunks": self.get_size(),
+            "index": self.get_index_info(),
+            "embedding_cache": self.embedding_cache.stats() if self.embedding_cache else None,
+            "query_cache": self.query_cache.stats() if self.query_cache else None,
+            "result_cache": self.result_cache.stats() if self.result_cache else None,
+            "embedding_scheduler": self.embedding_scheduler.stats() if self.embedding_scheduler else None,
+            "embedding_workers": self.embedding_workers.stats() if self.embedding_workers else None,
+            "chunk_batching": self.chunk_batcher.stats() if self.chunk_batcher else None,
+            "generation": self.generation
+        }
+    
+    def evaluate_recall(self, queries: Optional[List[str]] = None, k: int = 10,
+                        sample_size: int = 100) -> dict:
+        """Measure recall@k of the active index against exact flat search.
+        
+        Uses the given queries, or a random sample of stored chunks when omitted.
+        """
+        query_vectors = self.embedding_model.encode(queries, show_progress_bar=False) if queries else None
+        with self._rw.read():
+            vectors = self._all_vectors()
+            if query_vectors is None:
+                rng = np.random.default_rng(0)
+                sample = rng.choice(len(vectors), size=min(sample_size, len(vectors)), replace=False)
+                query_vectors = vectors[sample]
+            
+            report = evaluate_recall(
+                self.index, vectors, np.array(query_vectors, dtype=np.float32), k,
+                rerank_candidates=rerank_candidates(self.active_index_type)
+            )
+            report.update(self.get_index_info())
+        logger.info(f"Recall@{report['k']} for {self.active_index_type} index: {report['recall']:.3f}")
+        return report
+    
+    def rebuild_index(self, index_type: Optional[str] = None, persist: bool = True):
+        """Rebuild the index from stored vectors, optionally switching its type"""
+        with self._write_lock:
+            index_type = validate_index_type(index_type or self.index_type)
+            vectors = self._all_vectors()
+            
+            # Searches keep using the current index until the new one is swapped in
+            if requires_training(index_type) and len(vectors) < training_threshold(index_type):
+                index = build_index(INDEX_FLAT, self.dimension)
+                index.add(vectors)
+                active_index_type = INDEX_FLAT
+            else:
+                index = train_index(index_type, self.dimension, vectors)
+                active_index_type = index_type
+            
+            with self._rw.write():
+                self.index_type, self.index, self.active_index_type = index_type, index, active_index_type
+                self.generation += 1
+            logger.info(f"Rebuilt vector index as {self.active_index_type} ({len(vectors)} vectors)")
+            if persist:
+                self.compact()
     
     def clear(self):
-        """Clear all documents from the store"""
-        self.index = faiss.IndexFlatL2(self.dimension)
-        self.documents = []
-        self.metadata = []
-        self._save_index()
+        """Clear all documents from the store; logged, so a failed compaction cannot undo it"""
+        with self._write_lock:
+            self._log_and_apply(OP_CLEAR, {})
+            self.compact()
         logger.info("Vector store cleared")
     
-    def _save_index(self):
-        """Persist index and documents to disk"""
+    def compact_if_fragmented(self) -> bool:
+        """Background compaction job: reclaim tombstoned rows once enough have accumulated"""
+        with self._write_lock:
+            if self.deleted_rows and self.get_deleted_ratio() >= settings.COMPACTION_DELETED_RATIO:
+                logger.info(f"Compacting {len(self.deleted_rows)} deleted rows")
+                self.compact()
+                return True
+            return False
+    
+    def compact(self):
+        """Fold the write-ahead log into a fresh snapshot and truncate the log.
+        
+        Searches keep running while the snapshot is written; they only wait
+        for the brief swap of the compacted arrays.
+        """
         try:
-            faiss.write_index(self.index, self.index_file)
-            with open(self.docs_file, 'wb') as f:
-                pickle.dump({'documents': self.documents, 'metadata': self.metadata}, f)
-            logger.debug("Index saved to disk")
+            with self._write_lock:
+                self._save_index()
+                self.wal.reset()
+            logger.info(f"Compacted vector store snapshot at seq {self.last_seq}")
         except Exception as e:
-            logger.error(f"Failed to save index: {str(e)}")
+            logger.error(f"Failed to compact vector store: {str(e)}")
+    
+    def _new_index(self):
+        """Create an empty index; trainable types start as flat until enough vectors exist"""
+        if requires_training(self.index_type):
+            return build_index(INDEX_FLAT, self.dimension)
+        self.active_index_type = self.index_type
+        return build_index(self.index_type, self.dimension)
+    
+    def _chunk_document(self, text: str) -> List[str]:
+        from app.utils.pdf_reader import chunk_text
+        
+        chunks = chunk_text(text, settings.CHUNK_SIZE, settings.CHUNK_OVERLAP)
+        
+        if not chunks:
+            raise ValueError("No valid chunks created from document")
+        return chunks
+    
+    def _add_record(self, doc_id: str, batches: Iterable[List[Tuple[str, Optional[dict]]]],
+                    metadata: Optional[dict], content_hash: Optional[str] = None,
+                    doomed: Optional[List[int]] = None) -> dict:
+        """Build the log record for a document, embedding only chunks the store does not hold.
+        
+        `batches` are lists of (chunk, extra chunk metadata). Cache hits are
+        filled in as each batch arrives; misses are queued and embedded
+        together once _embed_flush_size of them are pending, and at the
+        end. Chunks already stored under a live row are
+        referenced instead of added; chunks in `doomed` rows (about to be
+        deleted) get fresh rows but reuse the stored vector rather than being
+        embedded again.
+        """
+        doomed = set(doomed or ())
+        new_chunks, new_hashes, new_indexes, new_extras, vector_batches = [], [], [], [], []
+        shared_ids: Dict[int, None] = {}
+        seen = set()
+        positions = itertools.count()
+        pending: List[Tuple[np.ndarray, int, str]] = []  # cache misses: (batch embeddings, row, chunk)
+        flush_at = self._embed_flush_size()
+        
+        for batch in batches:
+            batch_chunks, reuse_rows = [], {}
+            for chunk, extra in batch:
+                h = chunk_hash(chunk)
+                index = next(positions)
+                if h in seen:
+                    continue  # repeated inside this document
+                seen.add(h)
+                
+                existing = self._stored_chunk(h, chunk)
+                if existing is not None and existing[0] not in doomed:
+                    shared_ids[existing[0]] = None
+                    continue
+                if existing is not None:
+                    reuse_rows[len(batch_chunks)] = existing[1]
+                batch_chunks.append(chunk)
+                new_hashes.append(h)
+                new_indexes.append(index)
+                new_extras.append(extra)
+            
+            embeddings = np.zeros((len(batch_chunks), self.dimension), dtype=np.float32)
+            to_embed = [j for j in range(len(batch_chunks)) if j not in reuse_rows]
+            for j in self._fill_cached(batch_chunks, to_embed, embeddings):
+                pending.append((embeddings, j, batch_chunks[j]))
+            if reuse_rows:
+                embeddings[list(reuse_rows)] = self.vectors.take(list(reuse_rows.values()))
+            new_chunks.extend(batch_chunks)
+            vector_batches.append(embeddings)
+            if len(pending) >= flush_at:
+                self._embed_pending(pending)
+        self._embed_pending(pending)
+        
+        chunk_ids = list(range(self.next_chunk_id, self.next_chunk_id + len(new_chunks)))
+        chunk_metadata_list = []
+        for i, chunk, chunk_id, extra in zip(new_indexes, new_chunks, chunk_ids, new_extras):
+            chunk_metadata = metadata.copy() if metadata else {}
+            if extra:
+                chunk_metadata.update(extra)
+            chunk_metadata.update({
+                "doc_id": doc_id,
+                "chunk_id": chunk_id,
+                "chunk_index": i,
+                "timestamp": datetime.utcnow().isoformat(),
+                "length": len(chunk)
+            })
+            chunk_metadata_list.append(chunk_metadata)
+        
+        return {
+            "doc_id": doc_id,
+            "doc_metadata": metadata or {},
+            "content_hash": content_hash,
+            "chunk_ids": chunk_ids,
+            "chunk_hashes": new_hashes,
+            "shared_chunk_ids": list(shared_ids),
+            "vectors": np.vstack(vector_batches) if vector_batches else np.zeros((0, self.dimension), dtype=np.float32),
+            "documents": new_chunks,
+            "metadata": chunk_metadata_list
+        }
+    
+    def _fill_cached(self, chunks: List[str], rows: List[int], embeddings: np.ndarray) -> List[int]:
+        """Copy embedding cache hits for `rows` of `chunks` into `embeddings`; returns the rows still missing"""
+        if self.embedding_cache is None or not rows:
+            return rows
+        
+        cached, missing = self.embedding_cache.get_many([chunks[j] for j in rows])
+        for i, vector in cached.items():
+            embeddings[rows[i]] = vector
+        logger.debug(f"Embedding cache: {len(cached)} hits, {len(missing)} misses")
+        return [rows[i] for i in missing]
+    
+    def _embed_pending(self, pending: List[Tuple[np.ndarray, int, str]]):
+        """Embed queued cache misses with one model call, writing each vector into its batch"""
+        if not pending:
+            return
+        chunks = [chunk for _, _, chunk in pending]
+        encoded = self._embed_chunks(chunks)
+        for (embeddings, row, _), vector in zip(pending, encoded):
+            embeddings[row] = vector
+        if self.embedding_cache is not None:
+            self.embedding_cache.put_many(chunks, encoded)
+        pending.clear()
+    
+    def _embed_flush_size(self) -> int:
+        """Cache misses to collect across stream batches before embedding them.
+        
+        With worker processes this is at least EMBEDDING_PROCESS_MIN_CHUNKS
+        and a full batch per worker, so the pool is used even when cache
+        hits thin out every stream batch, and length sorting sees the whole
+        pending set rather than one stream batch.
+        """
+        if self.embedding_workers is None:
+            return settings.INGEST_STREAM_BATCH
+        return max(settings.INGEST_STREAM_BATCH, settings.EMBEDDING_PROCESS_MIN_CHUNKS,
+                   self.embedding_workers.workers * settings.EMBEDDING_PROCESS_BATCH)
+    
+    def _embed_chunks(self, chunks: List[str]) -> np.ndarray:
+        if self.embedding_workers is not None and len(chunks) >= settings.EMBEDDING_PROCESS_MIN_CHUNKS:
+            return self.embedding_workers.encode(chunks)
+        if self.chunk_batcher is not None:
+            return self.chunk_batcher.encode(chunks)
+        return np.array(self.embedding_model.encode(chunks, show_progress_bar=False), dtype=np.float32)
+    
+    def _stored_chunk(self, h: int, chunk: str) -> Optional[Tuple[int, int]]:
+        """(chunk_id, row) of a live chunk with exactly this text, if any"""
+        for row in self.chunk_table.rows_for_hash(h):
+            if row not in self.deleted_rows and self.documents[row] == chunk:
+                return self.chunk_table.id_at(row), row
+        return None
+    
+    def _log_and_apply(self, op: str, data: dict):
+        """Write-ahead: the log record is durable before memory is touched.
+        
+        The index and postings of added chunks are built first, while searches
+        continue, so a record that cannot be staged is never logged; the
+        record is then appended and applied under the write lock. Deletes
+        leave the index and postings alone, so a replace stages its add
+        before the old revision is dropped.
+        """
+        staged = self._stage_add(data) if op in (OP_ADD, OP_REPLACE) else None
+        self.wal.append(self.last_seq + 1, op, data)
+        self.last_seq += 1
+        with self._rw.write():
+            self._apply_record(op, data, staged)
+        self._maybe_train()
+    
+    def _apply_record(self, op: str, data: dict, staged: Optional[tuple] = None):
+        self.generation += 1
+        if op == OP_DELETE:
+            self._apply_delete(data)
+            return
+        if op == OP_CLEAR:
+            self._apply_clear()
+            return
+        if op == OP_REPLACE:
+            self._apply_delete({"doc_id": data["doc_id"], "chunk_ids": data["replaced_chunk_ids"]})
+        self._apply_add(data, staged or self._stage_add(data))
+    
+    def _stage_add(self, data: dict) -> tuple:
+        """(index, vectors, lexical index) with a record's chunks added; the current ones are untouched"""
+        embeddings = np.asarray(data["vectors"], dtype=np.float32)
+        index, vectors, lexical = self.index, self.vectors, self.lexical_index
+        if len(embeddings):
+            index = self._layered_index().extended(embeddings)
+            vectors = vectors.extended(embeddings)
+        if data["documents"]:
+            lexical = lexical.extended(data["documents"])
+        return index, vectors, lexical
+    
+    def _layered_index(self) -> LayeredIndex:
+        """The current index, with new vectors going to a delta until the next compaction"""
+        if isinstance(self.index, LayeredIndex):
+            return self.index
+        base = self.index
+        return LayeredIndex(base, None, self.dimension, load_base=lambda: clone_index(base),
+                            delta=self._delta_index(self.active_index_type))
+    
+    def _delta_index(self, active_type: str):
+        # Binary distances are bit counts, so a binary base needs a binary delta
+        return build_index(INDEX_BINARY, self.dimension) if active_type == INDEX_BINARY else None
+    
+    def _apply_add(self, data: dict, staged: tuple):
+        """Swap in the staged index, vectors and postings and register the record's chunks"""
+        # Records written before chunk ids and hashes existed get them derived here
+        chunk_ids = data.get("chunk_ids")
+        if chunk_ids is None:
+            chunk_ids = list(range(self.next_chunk_id, self.next_chunk_id + len(data["documents"])))
+        hashes = data.get("chunk_hashes") or [chunk_hash(chunk) for chunk in data["documents"]]
+        doc_id = data.get("doc_id") or self._legacy_doc_id(data["metadata"][0] if data["metadata"] else {})
+        
+        self.index, self.vectors, self.lexical_index = staged
+        self.documents.extend(data["documents"])
+        self.metadata.extend(data["metadata"])
+        self.chunk_table.extend(chunk_ids, hashes)
+        if chunk_ids:
+            self.next_chunk_id = max(self.next_chunk_id, chunk_ids[-1] + 1)
+        
+        entry = {
+            "chunk_start": chunk_ids[0] if chunk_ids else self.next_chunk_id,
+            "chunk_count": len(chunk_ids),
+            "metadata": data.get("doc_metadata", {})
+        }
+        if data.get("shared_chunk_ids"):
+            entry["shared_chunk_ids"] = list(data["shared_chunk_ids"])
+            for chunk_id in entry["shared_chunk_ids"]:
+                self.shared_refs.setdefault(chunk_id, set()).add(doc_id)
+        if data.get("content_hash"):
+            entry["content_hash"] = data["content_hash"]
+            self.content_hashes[entry["content_hash"]] = doc_id
+        self.doc_registry[doc_id] = entry
+        self.metadata_index.add(doc_id, entry["metadata"])
+        self._live_mask_cache = None
+    
+    def _apply_clear(self):
+        self.active_index_type = INDEX_FLAT
+        self.index = self._new_index()
+        self.documents = []
+        self.metadata = []
+        self.vectors = MappedVectors(None, self.dimension)
+        self.chunk_table = ChunkTable()
+        self.deleted_rows = set()
+        self.doc_registry = {}
+        self.metadata_index = MetadataIndex()
+        self.lexical_index = LexicalIndex()
+        self.shared_refs = {}
+        self.orphaned = set()
+        self.content_hashes = {}
+        self._live_mask_cache = None
+    
+    def _apply_delete(self, data: dict):
+        doc_id = data["doc_id"]
+        entry = self.doc_registry.pop(doc_id, None)
+        if entry is None:
+            self._tombstone(data["chunk_ids"])
+            return
+        
+        doomed = self._doomed_chunk_ids(doc_id, entry)
+        dead = set(doomed)
+        for chunk_id in self._owned_chunk_ids(entry):
+            if chunk_id not in dead:
+                self.orphaned.add(chunk_id)
+        for chunk_id in entry.get("shared_chunk_ids", ()):
+            refs = self.shared_refs.get(chunk_id)
+            if refs is not None:
+                refs.discard(doc_id)
+                if not refs:
+                    del self.shared_refs[chunk_id]
+                    self.orphaned.discard(chunk_id)
+        
+        self._tombstone(doomed)
+        if self.content_hashes.get(entry.get("content_hash")) == doc_id:
+            del self.content_hashes[entry["content_hash"]]
+        self.metadata_index.remove(doc_id, entry.get("metadata", {}))
+    
+    def _tombstone(self, chunk_ids: List[int]):
+        self.deleted_rows.update(self._rows_for_chunk_ids(chunk_ids).tolist())
+        self._live_mask_cache = None
+    
+    def _doomed_chunk_ids(self, doc_id: str, entry: dict) -> List[int]:
+        """Chunk ids that deleting this document leaves without any reference"""
+        def unreferenced(chunk_id: int) -> bool:
+            return not (self.shared_refs.get(chunk_id, set()) - {doc_id})
+        
+        doomed = [chunk_id for chunk_id in self._owned_chunk_ids(entry) if unreferenced(chunk_id)]
+        doomed.extend(
+            chunk_id for chunk_id in entry.get("shared_chunk_ids", ())
+            if chunk_id in self.orphaned and unreferenced(chunk_id)
+        )
+        return doomed
+    
+    def _rows_for_chunk_ids(self, chunk_ids: List[int]) -> np.ndarray:
+        """Map stable chunk ids to current row positions (ids are sorted by row)"""
+        return self.chunk_table.rows_for_ids(chunk_ids)
+    
+    @staticmethod
+    def _owned_chunk_ids(entry: dict) -> List[int]:
+        return list(range(entry["chunk_start"], entry["chunk_start"] + entry["chunk_count"]))
+    
+    def _doc_chunk_ids(self, entry: dict) -> List[int]:
+        """Every chunk id a document references, owned or shared"""
+        return self._owned_chunk_ids(entry) + list(entry.get("shared_chunk_ids", ()))
+    
+    @staticmethod
+    def _doc_chunk_count(entry: dict) -> int:
+        return entry["chunk_count"] + len(entry.get("shared_chunk_ids", ()))
+    
+    @staticmethod
+    def _legacy_doc_id(chunk_metadata: dict) -> str:
+        """Deterministic id for chunks ingested before documents had ids"""
+        key = f"{chunk_metadata.get('filename', '')}|{chunk_metadata.get('upload_time', '')}"
+        return uuid.uuid5(uuid.NAMESPACE_URL, key).hex
+    
+    def _live_mask(self) -> Optional[np.ndarray]:
+        """Boolean mask of rows that are not tombstoned, or None when nothing is deleted"""
+        if not self.deleted_rows:
+            return None
+        if self._live_mask_cache is None or len(self._live_mask_cache) != len(self.documents):
+            mask = np.ones(len(self.documents), dtype=bool)
+            mask[list(self.deleted_rows)] = False
+            self._live_mask_cache = mask
+        return self._live_mask_cache
+    
+    def _drop_deleted(self):
+        """Physically remove tombstoned rows, renumbering rows but keeping chunk ids"""
+        if not self.deleted_rows:
+            return
+        
+        # Build the compacted copies while searches continue on the current ones
+        live = np.flatnonzero(self._live_mask())
+        vectors = self.vectors.take(live)
+        index = refill_index(self._materialized_index(), self.active_index_type, self.dimension, vectors)
+        documents = [self.documents[i] for i in live]
+        metadata = [self.metadata[i] for i in live]
+        chunk_table = self.chunk_table.take(live)
+        lexical_index = self.lexical_index.take_rows(live)
+        
+        with self._rw.write():
+            self.index = index
+            self.vectors = MappedVectors.from_array(vectors)
+            self.documents, self.metadata = documents, metadata
+            self.chunk_table = chunk_table
+            self.lexical_index = lexical_index
+            logger.info(f"Dropped {len(self.deleted_rows)} deleted rows from vector store")
+            self.deleted_rows = set()
+            self._live_mask_cache = None
+    
+    def _all_vectors(self) -> np.ndarray:
+        """Every stored full-precision vector, in chunk order"""
+        return self.vectors.all()
+    
+    def _materialized_index(self):
+        """A writable, fully in-memory index covering every stored vector"""
+        if not isinstance(self.index, LayeredIndex):
+            return self.index
+        delta_ids = np.arange(self.index.base_count, len(self.vectors))
+        return self.index.materialize(self.vectors.take(delta_ids))
+    
+    def _maybe_compact(self):
+        """Compact once the log holds enough records or bytes"""
+        if (self.wal.record_count >= settings.WAL_COMPACT_RECORDS or
+                self.wal.size_bytes() >= settings.WAL_COMPACT_MB * 1024 * 1024):
+            self.compact()
+    
+    def _maybe_train(self):
+        """Swap the flat staging index for the trained index once enough vectors exist"""
+        if self.active_index_type == self.index_type:
+            return
+        if self.index.ntotal < training_threshold(self.index_type):
+            return
+        
+        index = train_index(self.index_type, self.dimension, self._all_vectors())
+        with self._rw.write():
+            self.index = index
+            self.active_index_type = self.index_type
+        logger.info(f"Switched vector index to {self.index_type} at {self.index.ntotal} vectors")
+    
+    def _save_index(self):
+        """Write a new snapshot directory and publish it atomically"""
+        self._drop_deleted()
+        path = self.snapshots.begin(self.last_seq)
+        if settings.VECTOR_STORAGE_FORMAT == STORAGE_MMAP:
+            self._write_mapped_snapshot(path)
+        else:
+            if isinstance(self.index, LayeredIndex):
+                index, documents, metadata = self._materialized_index(), list(self.documents), list(self.metadata)
+                with self._rw.write():
+                    self.index, self.documents, self.metadata = index, documents, metadata
+            write_index(self.index, os.path.join(path, INDEX_FILENAME))
+            self.vectors.write(os.path.join(path, VECTORS_FILENAME))
+            with open(os.path.join(path, DOCS_FILENAME), 'wb') as f:
+                pickle.dump({'documents': list(self.documents), 'metadata': list(self.metadata)}, f)
+        
+        self.chunk_table.write(path)
+        with open(os.path.join(path, DOC_REGISTRY_FILENAME), 'w') as f:
+            json.dump(self.doc_registry, f)
+        self.lexical_index.write(path)
+        with open(os.path.join(path, META_FILENAME), 'w') as f:
+            json.dump({
+                'index_type': self.index_type,
+                'active_index_type': self.active_index_type,
+                'storage_format': settings.VECTOR_STORAGE_FORMAT,
+                'last_seq': self.last_seq,
+                'next_chunk_id': self.next_chunk_id
+            }, f)
+        self.snapshots.publish(path)
+        logger.debug("Index saved to disk")
+        
+        # Open the snapshot while searches continue; ids, hashes and the registry are unchanged
+        lexical_index = LexicalIndex.read(path)
+        chunk_table = ChunkTable.read(path)
+        if settings.VECTOR_STORAGE_FORMAT == STORAGE_MMAP:
+            # Drop the private copy in favour of the shared page-cache mapping
+            vectors, index, documents, metadata = self._read_mapped(path, self.active_index_type)
+        else:
+            vectors = MappedVectors(os.path.join(path, VECTORS_FILENAME), self.dimension)
+            index, documents, metadata = self.index, self.documents, self.metadata
+        
+        with self._rw.write():
+            self.vectors, self.index, self.lexical_index = vectors, index, lexical_index
+            self.documents, self.metadata, self.chunk_table = documents, metadata, chunk_table
+            self.storage_format = settings.VECTOR_STORAGE_FORMAT
+    
+    def _write_mapped_snapshot(self, path: str):
+        """Write raw vectors, chunk text and metadata as flat memory-mappable files"""
+        self.vectors.write(os.path.join(path, VECTORS_FILENAME))
+        
+        if self.active_index_type != INDEX_FLAT:
+            write_index(self._materialized_index(), os.path.join(path, INDEX_FILENAME))
+        
+        MappedRecords.write(os.path.join(path, CHUNKS_FILENAME), self.documents)
+        MappedRecords.write(os.path.join(path, CHUNK_META_FILENAME), self.metadata, encode=encode_json)
     
     def _load_index(self):
-        """Load index and documents from disk if available"""
+        """Load the latest snapshot (or legacy files) and replay the write-ahead log"""
+        meta = {}
         try:
-            if os.path.exists(self.index_file) and os.path.exists(self.docs_file):
-                self.index = faiss.read_index(self.index_file)
-                with open(self.docs_file, 'rb') as f:
-                    data = pickle.load(f)
-                    self.documents = data['documents']
-                    self.metadata = data.get('metadata', [{}] * len(self.documents))
-                logger.info(f"Loaded {len(self.documents)} documents from disk")
+            snapshot = self.snapshots.current()
+            if snapshot:
+                meta = self._read_snapshot(snapshot)
+            elif self.index_file and os.path.exists(self.index_file) and os.path.exists(self.docs_file):
+                meta = self._read_pickled(self.index_file, self.docs_file)
+                self._read_document_ids(None, meta)
+            logger.info(f"Loaded {len(self.documents)} documents from disk")
         except Exception as e:
             logger.warning(f"Could not load existing index: {str(e)}")
+        
+        # Migrate before replay, but only persist once the log has been applied
+        rebuilt = self._load_index_meta(meta)
+        
+        try:
+            replayed = 0
+            for record in self.wal.replay(after_seq=self.last_seq):
+                self._apply_record(record.op, record.data)
+                self.last_seq = record.seq
+                replayed += 1
+            if replayed:
+                logger.info(f"Replayed {replayed} log records, {len(self.documents)} documents in store")
+                self._maybe_train()
+        except Exception as e:
+            logger.warning(f"Could not replay vector store log: {str(e)}")
+        
+        if self.storage_format != settings.VECTOR_STORAGE_FORMAT and self.documents:
+            logger.info(f"Converting vector store from {self.storage_format} to {settings.VECTOR_STORAGE_FORMAT}")
+            self.compact()
+        elif rebuilt or self._derived_on_load:
+            self.compact()
+        self._derived_on_load = False
+    
+    def _read_snapshot(self, path: str) -> dict:
+        """Read a snapshot directory in whichever format it was written"""
+        meta = {}
+        meta_path = os.path.join(path, META_FILENAME)
+        if os.path.exists(meta_path):
+            with open(meta_path) as f:
+                meta = json.load(f)
+        
+        if meta.get('storage_format', STORAGE_PICKLE) == STORAGE_MMAP:
+            self.vectors, self.index, self.documents, self.metadata = self._read_mapped(
+                path, meta.get('active_index_type', INDEX_FLAT)
+            )
+            self.storage_format = STORAGE_MMAP
+        else:
+            self._read_pickled(
+                os.path.join(path, INDEX_FILENAME),
+                os.path.join(path, DOCS_FILENAME),
+                os.path.join(path, VECTORS_FILENAME),
+                meta.get('active_index_type', INDEX_FLAT)
+            )
+        
+        self.last_seq = meta.get('last_seq', 0)
+        self.active_index_type = meta.get('active_index_type', INDEX_FLAT)
+        self._read_document_ids(path, meta)
+        return meta
+    
+    def _read_document_ids(self, path: Optional[str], meta: dict):
+        """Load chunk ids and the document registry, deriving them for older snapshots"""
+        self._read_chunk_table(path)
+        chunk_count = len(self.chunk_table)
+        self.next_chunk_id = meta.get(
+            'next_chunk_id', self.chunk_table.id_at(chunk_count - 1) + 1 if chunk_count else 0
+        )
+        
+        registry_path = os.path.join(path, DOC_REGISTRY_FILENAME) if path else None
+        if registry_path and os.path.exists(registry_path):
+            with open(registry_path) as f:
+                self.doc_registry = json.load(f)
+        else:
+            self.doc_registry = self._registry_from_metadata()
+            self._derived_on_load = bool(self.doc_registry)
+        self.metadata_index.rebuild(self.doc_registry)
+        self._restore_references()
+        
+        lexical = LexicalIndex.read(path) if path else None
+        if lexical is None or len(lexical) != len(self.documents):
+            lexical = LexicalIndex.build(self.documents)
+            self._derived_on_load = self._derived_on_load or bool(self.documents)
+        self.lexical_index = lexical
+        self.deleted_rows = set()
+        self._live_mask_cache = None
+    
+    def _read_chunk_table(self, path: Optional[str]):
+        """Map chunk ids and hashes, deriving them for snapshots written without them"""
+        table = ChunkTable.read(path) if path else None
+        if table is None or len(table) != len(self.documents):
+            ids = open_array(os.path.join(path, CHUNK_IDS_FILENAME), np.int64) if path else None
+            if ids is None or len(ids) != len(self.documents):
+                ids = np.arange(len(self.documents), dtype=np.int64)
+            hashes = np.array([chunk_hash(chunk) for chunk in self.documents], dtype=np.uint64)
+            table = ChunkTable(np.asarray(ids), hashes)
+            self._derived_on_load = self._derived_on_load or bool(self.documents)
+        self.chunk_table = table
+    
+    def _restore_references(self):
+        """Restore the content-addressing maps from the document registry"""
+        self.shared_refs = {}
+        self.content_hashes = {}
+        for doc_id, entry in self.doc_registry.items():
+            for chunk_id in entry.get("shared_chunk_ids", ()):
+                self.shared_refs.setdefault(chunk_id, set()).add(doc_id)
+            if entry.get("content_hash"):
+                self.content_hashes[entry["content_hash"]] = doc_id
+        
+        # Shared chunks not inside any registered document's own range lost their owner
+        owned = sorted((entry["chunk_start"], entry["chunk_count"]) for entry in self.doc_registry.values())
+        starts = [start for start, _ in owned]
+        self.orphaned = set()
+        for chunk_id in self.shared_refs:
+            i = bisect.bisect_right(starts, chunk_id) - 1
+            if i < 0 or chunk_id >= owned[i][0] + owned[i][1]:
+                self.orphaned.add(chunk_id)
+    
+    def _registry_from_metadata(self) -> Dict[str, dict]:
+        """Group chunks into documents by their doc_id, or filename and upload time"""
+        registry: Dict[str, dict] = {}
+        for row, chunk_metadata in enumerate(self.metadata):
+            doc_id = chunk_metadata.get("doc_id") or self._legacy_doc_id(chunk_metadata)
+            entry = registry.get(doc_id)
+            if entry is None:
+                registry[doc_id] = {
+                    "chunk_start": self.chunk_table.id_at(row),
+                    "chunk_count": 1,
+                    "metadata": {
+                        key: chunk_metadata[key] for key in ("filename", "upload_time") if key in chunk_metadata
+                    }
+                }
+            else:
+                entry["chunk_count"] += 1
+        return registry
+    
+    def _read_pickled(self, index_path: str, docs_path: str, vectors_path: Optional[str] = None,
+                      index_type: str = INDEX_FLAT) -> dict:
+        """Read an index file and pickled documents fully into memory"""
+        self.index = read_index(index_path, index_type)
+        if vectors_path and os.path.exists(vectors_path):
+            self.vectors = MappedVectors(vectors_path, self.dimension)
+        else:
+            # Older snapshots predate the raw vector file; their indexes are lossless
+            self.vectors = MappedVectors.from_array(reconstruct_vectors(self.index))
+        with open(docs_path, 'rb') as f:
+            data = pickle.load(f)
+            self.documents = data['documents']
+            self.metadata = data.get('metadata', [{}] * len(self.documents))
+        self.storage_format = STORAGE_PICKLE
+        return {}
+    
+    def _read_mapped(self, path: str, active_type: str):
+        """Open a memory-mapped snapshot as (vectors, index, documents, metadata).
+        
+        Nothing is decoded until a search needs it.
+        """
+        vectors = MappedVectors(os.path.join(path, VECTORS_FILENAME), self.dimension)
+        base = None
+        index_path = os.path.join(path, INDEX_FILENAME)
+        if active_type != INDEX_FLAT:
+            base = read_index(index_path, active_type, MMAP_READ_FLAGS)
+        
+        index = LayeredIndex(
+            base, vectors.base, self.dimension,
+            load_base=lambda: read_index(index_path, active_type), delta=self._delta_index(active_type)
+        )
+        documents = MappedRecords(os.path.join(path, CHUNKS_FILENAME))
+        metadata = MappedRecords(os.path.join(path, CHUNK_META_FILENAME), decode=decode_json)
+        return vectors, index, documents, metadata
+    
+    def _load_index_meta(self, meta: dict) -> bool:
+        """Restore the persisted index type; returns True if the index had to be rebuilt"""
+        persisted_type = meta.get('index_type', INDEX_FLAT)
+        if persisted_type != self.index_type and self.index.ntotal:
+            logger.info(f"Index type changed from {persisted_type} to {self.index_type}, rebuilding")
+            self.rebuild_index(self.index_type, persist=False)
+            return True
+        elif persisted_type != self.index_type:
+            self.active_index_type = INDEX_FLAT
+            self.index = self._new_index()
+        else:
+            self._maybe_train()
+        return False
+
+def validate_retrieval_mode(mode: str) -> str:
+    if mode not in RETRIEVAL_MODES:
+        raise ValueError(f"Unknown retrieval mode: {mode}. Supported: {', '.join(RETRIEVAL_MODES)}")
+    return mode
+
+def load_embedding_model(name: str) -> EmbeddingBackend:
+    # Backends import torch / onnxruntime themselves, so nothing heavy loads until a store is built
+    return create_embedding_backend(name, settings.EMBEDDING_BACKEND)
+
+def create_vector_store():
+    """The store for this node's role: a coordinator over shard servers, a sharded store, or a single store"""
+    if settings.NODE_ROLE == "coordinator":
+        from app.services.shard_coordinator import ShardCoordinator
+        return ShardCoordinator(settings.SHARD_URLS)
+    if settings.VECTOR_STORE_SHARDS > 1:
+        from app.services.sharded_store import ShardedVectorStore
+        return ShardedVectorStore(settings.VECTOR_STORE_SHARDS)
+    return VectorStore()
 
-# Global instance
-vector_store = VectorStore()
+# Global instance, built on first use or by the startup warm-up in app.main
+vector_store = LazyResource("vector_store", create_vector_store)
 
 # Convenience functions
 def add_document_to_index(text: str, metadata: Optional[dict] = None) -> int:
     return vector_store.add_document(text, metadata)
 
-def search_similar_documents(query: str, k: int = 3) -> List[str]:
-    results = vector_store.search(query, k)
+def search_similar_documents(query: str, k: int = 3, mode: Optional[str] = None) -> List[str]:
+    results = vector_store.search(query, k, mode=mode)
     return [doc for doc, _, _ in results]
 
 def get_vector_store_size() -> int:
@@ -1,11 +1,12 @@
 # app/utils/__init__.py
 """Utility functions and helpers"""
 
-from app.utils.pdf_reader import extract_text_from_pdf, chunk_text
+from app.utils.pdf_reader import extract_text_from_pdf, chunk_text, iter_pdf_chunks
 from app.utils.logger import setup_logging
 
 __all__ = [
     "extract_text_from_pdf",
     "chunk_text",
+    "iter_pdf_chunks",
     "setup_logging"
-]
\ No newline at end of file
+]
@@ -0,0 +1,16 @@
+import hashlib
+
+
+def content_hash(data: bytes) -> str:
+    """Hex SHA-256 of an uploaded file, used to recognise re-uploads"""
+    return hashlib.sha256(data).hexdigest()
+
+
+def chunk_hash(text: str) -> int:
+    """64-bit fingerprint of a chunk's text (callers confirm matches against the text itself)"""
+    return int.from_bytes(hashlib.blake2b(text.encode("utf-8"), digest_size=8).digest(), "little")
+
+
+def shard_index(key: str, shards: int) -> int:
+    """Stable shard assignment for a document id (independent of PYTHONHASHSEED)"""
+    return int.from_bytes(hashlib.blake2b(key.encode("utf-8"), digest_size=8).digest(), "little") % shards
@@ -0,0 +1,61 @@
+import logging
+import threading
+import time
+from typing import Any, Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class LazyResource:
+    """Stand-in for a global that is expensive to build.
+
+    The factory runs on first attribute access (or an explicit `load()`),
+    once, under a lock; afterwards attribute access goes straight to the
+    built object. Lets modules keep `from x import service` style globals
+    without paying for model loading at import time.
+    """
+
+    def __init__(self, name: str, factory: Callable[[], Any]):
+        self._name = name
+        self._factory = factory
+        self._instance = None
+        self._lock = threading.Lock()
+        self._load_seconds: Optional[float] = None
+        self._error: Optional[str] = None
+
+    def load(self) -> Any:
+        instance = self._instance
+        if instance is not None:
+            return instance
+        with self._lock:
+            if self._instance is None:
+                start_time = time.perf_counter()
+                try:
+                    self._instance = self._factory()
+                except Exception as e:
+                    self._error = str(e)
+                    logger.error(f"Loading {self._name} failed: {str(e)}", exc_info=True)
+                    raise
+                self._load_seconds = time.perf_counter() - start_time
+                self._error = None
+                logger.info(f"Loaded {self._name} in {self._load_seconds:.2f}s")
+            return self._instance
+
+    @property
+    def is_loaded(self) -> bool:
+        return self._instance is not None
+
+    def status(self) -> dict:
+        return {
+            "loaded": self.is_loaded,
+            "load_seconds": round(self._load_seconds, 3) if self._load_seconds is not None else None,
+            "error": self._error
+        }
+
+    def __getattr__(self, attr: str) -> Any:
+        # Only called for names not found on the proxy itself
+        return getattr(self.load(), attr)
+
+    def __repr__(self) -> str:
+        state = "loaded" if self.is_loaded else "not loaded"
+        return f"<LazyResource {self._name} ({state})>"
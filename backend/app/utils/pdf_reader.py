@@ -31,9 +31,10 @@
 
 from PyPDF2 import PdfReader
 from io import BytesIO
+from typing import Iterable, Iterator, List, Tuple
 
-def extract_text_from_pdf(file):
-    """Extract text and page count from uploaded PDF file."""
+def open_pdf(file) -> PdfReader:
+    """Open an uploaded PDF (file object or path); pages are parsed lazily as they are read."""
     try:
         # Read the file content into BytesIO
         if hasattr(file, 'read'):
@@ -41,48 +42,115 @@ def extract_text_from_pdf(file):
             file_obj = BytesIO(content)
         else:
             file_obj = file
-            
-        reader = PdfReader(file_obj)
-        text = ""
-        for page in reader.pages:
+        return PdfReader(file_obj)
+    except Exception as e:
+        raise ValueError(f"PDF processing error: {str(e)}")
+
+
+def iter_pdf_pages(reader: PdfReader) -> Iterator[Tuple[int, str]]:
+    """(page number, text) of each page with text, numbered from 1, one page at a time"""
+    try:
+        for page_number, page in enumerate(reader.pages, start=1):
             page_text = page.extract_text()
             if page_text:
-                text += page_text + "\n"  # Add newline between pages
-        
-        pages_processed = len(reader.pages)
-        
-        if not text.strip():
-            raise ValueError("No text could be extracted from PDF")
-            
-        return text, pages_processed
-        
+                yield page_number, page_text + "\n"  # Add newline between pages
     except Exception as e:
         raise ValueError(f"PDF processing error: {str(e)}")
 
 
-def chunk_text(text: str, chunk_size: int = 1000, overlap: int = 200):
-    """Smart chunking with sentence boundary detection"""
-    if not text or not text.strip():
-        return []
+def extract_text_from_pdf(file):
+    """Extract text and page count from uploaded PDF file."""
+    reader = open_pdf(file)
+    text = "".join(page_text for _, page_text in iter_pdf_pages(reader))
+    pages_processed = len(reader.pages)
+    
+    if not text.strip():
+        raise ValueError("PDF processing error: No text could be extracted from PDF")
         
-    chunks = []
+    return text, pages_processed
+
+
+def iter_chunks(pages: Iterable[Tuple[int, str]], chunk_size: int = 1000,
+                overlap: int = 200) -> Iterator[Tuple[str, List[int]]]:
+    """Incremental chunk_text over a stream of (page number, text) pieces.
+    
+    Yields (chunk, page numbers the chunk spans) as soon as enough text has
+    arrived to place each cut, so only about one page plus one chunk of text
+    is held at a time. The chunks are exactly those chunk_text returns for
+    the concatenated pages, overlap carried across page boundaries included.
+    """
+    buffer = ""  # text[base:] of the whole stream seen so far
+    base = 0
     start = 0
-    text_len = len(text)
+    page_starts: List[Tuple[int, int]] = []  # (offset in the stream, page number)
     
-    while start < text_len:
+    def cut(text_len: int) -> Tuple[str, List[int], int]:
         end = min(start + chunk_size, text_len)
         
         # Try to break at sentence boundary (only if not at the end)
         if end < text_len:
-            sentence_end = text.rfind('.', start, end)
-            if sentence_end != -1 and sentence_end > start:
-                end = sentence_end + 1
+            sentence_end = buffer.rfind('.', start - base, end - base)
+            if sentence_end != -1 and sentence_end + base > start:
+                end = sentence_end + base + 1
+            # A break within `overlap` of the start would send the next window back
+            # before this one (below 0 for the first), so cut at full size instead
+            if end - overlap <= start:
+                end = min(start + chunk_size, text_len)
         
-        chunk = text[start:end].strip()
-        if chunk:  # Only add non-empty chunks
-            chunks.append(chunk)
+        raw = buffer[start - base:end - base]
+        chunk = raw.strip()
+        pages = []
+        if chunk:
+            first = start + len(raw) - len(raw.lstrip())
+            last = end - (len(raw) - len(raw.rstrip()))
+            pages = [number for i, (offset, number) in enumerate(page_starts)
+                     if offset < last and (i + 1 == len(page_starts) or page_starts[i + 1][0] > first)]
         
-        # Move start position with overlap
-        start = end - overlap if end < text_len else text_len
+        # Move start position with overlap, always forward (overlap >= chunk_size would
+        # otherwise loop forever)
+        next_start = max(end - overlap, start + 1) if end < text_len else text_len
+        return chunk, pages, next_start
+    
+    for page_number, page_text in pages:
+        if not page_text:
+            continue
+        # Drop text and pages every later chunk starts after
+        buffer = buffer[start - base:] + page_text
+        base = start
+        while len(page_starts) > 1 and page_starts[1][0] <= start:
+            page_starts.pop(0)
+        page_starts.append((base + len(buffer) - len(page_text), page_number))
         
-    return chunks
\ No newline at end of file
+        # A cut is final once the window ends before the text seen so far does
+        while start + chunk_size < base + len(buffer):
+            chunk, chunk_pages, start = cut(base + len(buffer))
+            if chunk:  # Only add non-empty chunks
+                yield chunk, chunk_pages
+    
+    text_len = base + len(buffer)
+    while start < text_len:
+        chunk, chunk_pages, start = cut(text_len)
+        if chunk:
+            yield chunk, chunk_pages
+
+
+def iter_pdf_chunks(pages: Iterable[Tuple[int, str]], chunk_size: int = 1000,
+                    overlap: int = 200) -> Iterator[Tuple[str, dict]]:
+    """Chunks of a PDF as its pages are extracted, each with the page numbers it spans.
+    
+    `pages` is iter_pdf_pages(reader) or the extraction pool's page stream.
+    """
+    found = False
+    for chunk, page_numbers in iter_chunks(pages, chunk_size, overlap):
+        found = True
+        yield chunk, {"page_numbers": page_numbers}
+    if not found:
+        raise ValueError("No text could be extracted from PDF")
+
+
+def chunk_text(text: str, chunk_size: int = 1000, overlap: int = 200):
+    """Smart chunking with sentence boundary detection"""
+    if not text or not text.strip():
+        return []
+    
+    return [chunk for chunk, _ in iter_chunks([(1, text)], chunk_size, overlap)]
@@ -0,0 +1,221 @@
+"""
+Benchmark script for embedding backends
+Compares throughput (sentences per second) of each backend and its agreement
+with the PyTorch model on the same sentences.
+
+Usage:
+    python benchmark_embeddings.py backends --n 2000
+    python benchmark_embeddings.py backends --pdf manual.pdf --batch-sizes 16 32 64
+    python benchmark_embeddings.py backends --backends torch onnx_int8 --threads 4
+    python benchmark_embeddings.py workers --pdf manual.pdf --workers 2 4 8
+    python benchmark_embeddings.py batching --pdf manual.pdf report.pdf --budgets 4096 8192 16384
+"""
+
+import argparse
+import random
+import re
+import time
+
+import numpy as np
+
+from app.core.config import settings
+from app.services import embedding_backends
+from app.services import token_batching
+from app.services.embedding_workers import EmbeddingProcessPool
+from app.utils.pdf_reader import chunk_text, extract_text_from_pdf
+
+
+def print_section(title):
+    print("\n" + "="*60)
+    print(f"  {title}")
+    print("="*60)
+
+
+def load_sentences(pdfs, n, seed=0):
+    """Sentences from the given PDFs, otherwise synthetic ones built from the parity probe vocabulary"""
+    if pdfs:
+        sentences = []
+        for path in pdfs:
+            with open(path, "rb") as f:
+                text, _ = extract_text_from_pdf(f)
+            sentences.extend(s.strip() for s in re.split(r"(?<=[.!?])\s+", text) if len(s.strip()) > 20)
+        print(f"Using {min(n, len(sentences))} sentences from {len(pdfs)} PDF(s)")
+        return sentences[:n]
+
+    rng = random.Random(seed)
+    words = " ".join(embedding_backends.PARITY_SENTENCES).split()
+    print(f"Using {n} synthetic sentences")
+    return [" ".join(rng.choice(words) for _ in range(rng.randint(4, 60))) for _ in range(n)]
+
+
+def load_chunks(pdfs, n, seed=0):
+    """Chunks as ingestion produces them from the given PDFs, otherwise synthetic text of mixed length"""
+    if not pdfs:
+        sentences = load_sentences([], n * 8, seed)
+        rng = random.Random(seed)
+        chunks, start = [], 0
+        while len(chunks) < n and start < len(sentences):
+            size = rng.choice([1, 2, 4, 8, 16])
+            chunks.append(". ".join(sentences[start:start + size]) + ".")
+            start += size
+        return chunks
+
+    chunks = []
+    for path in pdfs:
+        with open(path, "rb") as f:
+            text, pages = extract_text_from_pdf(f)
+        chunks.extend(chunk_text(text, settings.CHUNK_SIZE, settings.CHUNK_OVERLAP))
+        print(f"  {path}: {pages} pages")
+    print(f"Using {min(n, len(chunks))} chunks from {len(pdfs)} PDF(s)")
+    return chunks[:n]
+
+
+def normalized(vectors):
+    return vectors / np.clip(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12, None)
+
+
+def neighbour_overlap(reference, candidate, queries, k):
+    """Mean overlap@k of each query's nearest sentences under the two embeddings"""
+    reference, candidate = normalized(reference), normalized(candidate)
+    ref_top = np.argsort(-reference[:queries] @ reference.T, axis=1)[:, 1:k + 1]
+    cand_top = np.argsort(-candidate[:queries] @ candidate.T, axis=1)[:, 1:k + 1]
+    return float(np.mean([len(set(a) & set(b)) / k for a, b in zip(ref_top, cand_top)]))
+
+
+def bench_backends(args):
+    sentences = load_sentences(args.pdf, args.n)
+    reference = None
+
+    print_section(f"Embedding backends: {settings.EMBEDDING_MODEL} ({len(sentences)} sentences)")
+    print(f"  {'backend':<10} {'batch':>6} {'sent/s':>9} {'load s':>7} {'mean cos':>9} {'min cos':>8} "
+          f"{'nn@' + str(args.k):>7}")
+    for name in args.backends:
+        start_time = time.perf_counter()
+        backend = embedding_backends.create_embedding_backend(settings.EMBEDDING_MODEL, name)
+        load_time = time.perf_counter() - start_time
+        backend.encode(sentences[:args.batch_sizes[0]], batch_size=args.batch_sizes[0])  # warm-up
+
+        vectors = None
+        for batch_size in args.batch_sizes:
+            start_time = time.perf_counter()
+            vectors = backend.encode(sentences, batch_size=batch_size)
+            throughput = len(sentences) / (time.perf_counter() - start_time)
+
+            if name == embedding_backends.BACKEND_TORCH and reference is None:
+                reference = vectors
+            if reference is not None:
+                cosines = (normalized(reference) * normalized(vectors)).sum(axis=1)
+                agreement = (f"{cosines.mean():>9.5f} {cosines.min():>8.5f} "
+                             f"{neighbour_overlap(reference, vectors, args.queries, args.k):>7.3f}")
+            else:
+                agreement = f"{'-':>9} {'-':>8} {'-':>7}"
+            print(f"  {name:<10} {batch_size:>6} {throughput:>9.1f} {load_time:>7.2f} {agreement}")
+
+    if reference is None:
+        print("\n  Include torch in --backends to measure agreement with the PyTorch model")
+
+
+def bench_workers(args):
+    sentences = load_sentences(args.pdf, args.n)
+    backend = embedding_backends.create_embedding_backend(settings.EMBEDDING_MODEL, args.backend)
+    backend.encode(sentences[:args.batch_size], batch_size=args.batch_size)  # warm-up
+
+    print_section(f"In-process vs worker processes: {args.backend} ({len(sentences)} chunks)")
+    start_time = time.perf_counter()
+    reference = backend.encode(sentences, batch_size=args.batch_size)
+    serial = len(sentences) / (time.perf_counter() - start_time)
+    print(f"  {'mode':<22} {'chunks/s':>9} {'speedup':>8} {'max diff':>9}")
+    print(f"  {'in-process':<22} {serial:>9.1f} {1.0:>8.2f} {0.0:>9.2e}")
+
+    for workers in args.workers:
+        pool = EmbeddingProcessPool(settings.EMBEDDING_MODEL, args.backend,
+                                    backend.get_sentence_embedding_dimension(), workers, args.batch_size)
+        try:
+            pool.encode(sentences[:workers * args.batch_size])  # start workers and load their models
+            start_time = time.perf_counter()
+            vectors = pool.encode(sentences)
+            throughput = len(sentences) / (time.perf_counter() - start_time)
+        finally:
+            pool.shutdown()
+        label = f"{workers} workers x {pool.threads_per_worker} threads"
+        print(f"  {label:<22} {throughput:>9.1f} {throughput / serial:>8.2f} "
+              f"{float(np.abs(vectors - reference).max()):>9.2e}")
+
+
+def bench_batching(args):
+    chunks = load_chunks(args.pdf, args.n)
+    backend = embedding_backends.create_embedding_backend(settings.EMBEDDING_MODEL, args.backend)
+    backend.encode(chunks[:args.batch_size], batch_size=args.batch_size)  # warm-up
+    lengths = token_batching.token_lengths(backend, chunks)
+
+    print_section(f"Chunk batching: {args.backend} ({len(chunks)} chunks, "
+                  f"{int(lengths.min())}-{int(lengths.max())} tokens, mean {lengths.mean():.0f})")
+    # The current path: encode(chunks, batch_size) in one call. SentenceTransformer sorts by
+    # character length inside encode(); the ONNX backends batch in input order.
+    if args.backend == embedding_backends.BACKEND_TORCH:
+        order = np.argsort([-len(chunk) for chunk in chunks], kind="stable")
+        baseline = [order[batch] for batch in token_batching.fixed_batches(len(chunks), args.batch_size)]
+    else:
+        baseline = token_batching.fixed_batches(len(chunks), args.batch_size)
+    start_time = time.perf_counter()
+    reference = backend.encode(chunks, batch_size=args.batch_size)
+    elapsed = time.perf_counter() - start_time
+    real, padded = token_batching.padding_efficiency(lengths, baseline)
+
+    print(f"  {'mode':<20} {'chunks/s':>9} {'speedup':>8} {'batches':>8} {'padding eff':>12} {'max diff':>9}")
+    print(f"  {'batch_size=' + str(args.batch_size):<20} {len(chunks) / elapsed:>9.1f} {1.0:>8.2f} "
+          f"{len(baseline):>8} {real / padded:>12.1%} {0.0:>9.2e}")
+
+    for budget in args.budgets:
+        batcher = token_batching.TokenBudgetBatcher(backend, budget, args.max_batch)
+        start_time = time.perf_counter()
+        vectors = batcher.encode(chunks)
+        budget_elapsed = time.perf_counter() - start_time
+        stats = batcher.stats()
+        print(f"  {'budget=' + str(budget):<20} {len(chunks) / budget_elapsed:>9.1f} "
+              f"{elapsed / budget_elapsed:>8.2f} {stats['batches']:>8} {stats['padding_efficiency']:>12.1%} "
+              f"{float(np.abs(vectors - reference).max()):>9.2e}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Embedding benchmarks")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    backends_parser = sub.add_parser("backends", help="Throughput and parity of each embedding backend")
+    backends_parser.add_argument("--n", type=int, default=2000)
+    backends_parser.add_argument("--pdf", nargs="*", default=[], help="take sentences from these PDFs")
+    backends_parser.add_argument("--backends", nargs="+", default=list(embedding_backends.BACKENDS))
+    backends_parser.add_argument("--batch-sizes", type=int, nargs="+", default=[32])
+    backends_parser.add_argument("--queries", type=int, default=100, help="sentences used for neighbour overlap")
+    backends_parser.add_argument("--k", type=int, default=10)
+    backends_parser.add_argument("--threads", type=int, default=settings.EMBEDDING_THREADS)
+    backends_parser.set_defaults(func=bench_backends)
+
+    workers_parser = sub.add_parser("workers", help="Chunk embedding on worker processes vs in-process")
+    workers_parser.add_argument("--n", type=int, default=4000)
+    workers_parser.add_argument("--pdf", nargs="*", default=[], help="take sentences from these PDFs")
+    workers_parser.add_argument("--backend", default=settings.EMBEDDING_BACKEND)
+    workers_parser.add_argument("--workers", type=int, nargs="+", default=[2, 4])
+    workers_parser.add_argument("--batch-size", type=int, default=settings.EMBEDDING_PROCESS_BATCH)
+    workers_parser.add_argument("--threads", type=int, default=settings.EMBEDDING_THREADS)
+    workers_parser.set_defaults(func=bench_workers)
+
+    batching_parser = sub.add_parser("batching", help="Length-sorted token-budget batches vs fixed batches")
+    batching_parser.add_argument("--n", type=int, default=2000)
+    batching_parser.add_argument("--pdf", nargs="*", default=[], help="chunk these PDFs like an upload")
+    batching_parser.add_argument("--backend", default=settings.EMBEDDING_BACKEND)
+    batching_parser.add_argument("--batch-size", type=int, default=32, help="fixed batch size of the current path")
+    batching_parser.add_argument("--budgets", type=int, nargs="+",
+                                 default=[4096, settings.EMBEDDING_TOKEN_BUDGET, 16384])
+    batching_parser.add_argument("--max-batch", type=int, default=settings.EMBEDDING_MAX_BATCH)
+    batching_parser.add_argument("--threads", type=int, default=settings.EMBEDDING_THREADS)
+    batching_parser.set_defaults(func=bench_batching)
+
+    args = parser.parse_args()
+    if hasattr(args, "threads"):
+        settings.EMBEDDING_THREADS = args.threads
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
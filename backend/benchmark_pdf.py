@@ -0,0 +1,78 @@
+"""
+Benchmark script for PDF page extraction
+Compares pages per second of serial PyPDF2 extraction with the extraction
+worker pool, and checks that both produce the same page texts.
+
+Usage:
+    python benchmark_pdf.py extract --pdf scanned.pdf
+    python benchmark_pdf.py extract --pdf a.pdf b.pdf --workers 2 4 8 --pages-per-task 4 8 16
+    python benchmark_pdf.py extract --pdf scanned.pdf --source path
+"""
+
+import argparse
+import time
+from io import BytesIO
+
+from app.services.pdf_workers import PdfExtractionPool
+from app.utils.pdf_reader import iter_pdf_pages, open_pdf
+
+
+def print_section(title):
+    print("\n" + "="*60)
+    print(f"  {title}")
+    print("="*60)
+
+
+def bench_extract(args):
+    documents = []
+    for path in args.pdf:
+        with open(path, "rb") as f:
+            content = f.read()
+        page_count = len(open_pdf(BytesIO(content)).pages)
+        documents.append((path, content, page_count))
+        print(f"  {path}: {page_count} pages, {len(content) / (1024 * 1024):.2f} MB")
+    total_pages = sum(page_count for _, _, page_count in documents)
+
+    print_section(f"Serial vs worker processes ({total_pages} pages, {args.source} source)")
+    start_time = time.perf_counter()
+    reference = [list(iter_pdf_pages(open_pdf(BytesIO(content)))) for _, content, _ in documents]
+    serial = total_pages / (time.perf_counter() - start_time)
+    print(f"  {'mode':<26} {'pages/s':>9} {'speedup':>8} {'identical':>10}")
+    print(f"  {'serial':<26} {serial:>9.1f} {1.0:>8.2f} {'-':>10}")
+
+    for workers in args.workers:
+        for pages_per_task in args.pages_per_task:
+            pool = PdfExtractionPool(workers, pages_per_task)
+            try:
+                list(pool.iter_pages(documents[0][1], min(documents[0][2], workers)))  # start workers
+                start_time = time.perf_counter()
+                extracted = [
+                    list(pool.iter_pages(path if args.source == "path" else content, page_count))
+                    for path, content, page_count in documents
+                ]
+                throughput = total_pages / (time.perf_counter() - start_time)
+            finally:
+                pool.shutdown()
+            label = f"{workers} workers, {pages_per_task} pages/task"
+            print(f"  {label:<26} {throughput:>9.1f} {throughput / serial:>8.2f} "
+                  f"{str(extracted == reference):>10}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="PDF extraction benchmarks")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    extract_parser = sub.add_parser("extract", help="Pages per second, serial vs the extraction pool")
+    extract_parser.add_argument("--pdf", nargs="+", required=True)
+    extract_parser.add_argument("--workers", type=int, nargs="+", default=[2, 4])
+    extract_parser.add_argument("--pages-per-task", type=int, nargs="+", default=[8])
+    extract_parser.add_argument("--source", choices=["memory", "path"], default="memory",
+                                help="workers read a shared memory copy of the upload or open the file")
+    extract_parser.set_defaults(func=bench_extract)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
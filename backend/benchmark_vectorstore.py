@@ -0,0 +1,159 @@
+"""
+Benchmark script for vector store index modes
+Compares recall and latency of each index type against exact flat search.
+
+Usage:
+    python benchmark_vectorstore.py index --n 200000 --k 10
+    python benchmark_vectorstore.py compression --n 200000 --rerank 50
+    python benchmark_vectorstore.py binary --n 200000 --candidates 100 200 400
+"""
+
+import argparse
+import os
+import time
+
+import faiss
+import numpy as np
+
+from app.core.config import settings
+from app.services import index_factory
+
+INDEX_FILE = "faiss_index.bin"
+
+
+def print_section(title):
+    print("\n" + "="*60)
+    print(f"  {title}")
+    print("="*60)
+
+
+def load_vectors(n, dimension, seed=0):
+    """Use the persisted index vectors when available, otherwise clustered synthetic data"""
+    if os.path.exists(INDEX_FILE):
+        vectors = index_factory.reconstruct_vectors(faiss.read_index(INDEX_FILE))
+        if len(vectors) >= n:
+            print(f"Using {n} vectors from {INDEX_FILE}")
+            return vectors[:n]
+
+    print(f"Using {n} synthetic vectors (d={dimension})")
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(max(n // 500, 1), dimension)).astype(np.float32)
+    vectors = centers[rng.integers(0, len(centers), size=n)]
+    vectors += rng.normal(scale=0.3, size=vectors.shape).astype(np.float32)
+    return vectors
+
+
+def sample_queries(vectors, count, seed=1):
+    rng = np.random.default_rng(seed)
+    picked = vectors[rng.choice(len(vectors), size=min(count, len(vectors)), replace=False)]
+    return picked + rng.normal(scale=0.05, size=picked.shape).astype(np.float32)
+
+
+def bench_index(args):
+    """Recall@k and latency of every index type against flat search"""
+    print_section(f"Index modes: n={args.n}, k={args.k}")
+    vectors = load_vectors(args.n, args.dimension)
+    queries = sample_queries(vectors, args.queries)
+
+    for index_type in args.types:
+        start = time.time()
+        index = index_factory.train_index(index_type, vectors.shape[1], vectors)
+        build_time = time.time() - start
+
+        report = index_factory.evaluate_recall(index, vectors, queries, args.k)
+        info = index_factory.describe_index(index)
+        print(
+            f"{index_type:>10}: recall@{report['k']}={report['recall']:.3f}  "
+            f"latency={report['latency_ms']:.3f}ms  flat={report['flat_latency_ms']:.3f}ms  "
+            f"build={build_time:.1f}s  nprobe={info['nprobe']}  efSearch={info['ef_search']}"
+        )
+
+
+def bench_compression(args):
+    """Bytes per vector, latency and recall@k of compressed storage modes"""
+    print_section(f"Compressed storage: n={args.n}, k={args.k}")
+    vectors = load_vectors(args.n, args.dimension)
+    queries = sample_queries(vectors, args.queries)
+
+    for index_type in args.types:
+        index = index_factory.train_index(index_type, vectors.shape[1], vectors)
+        bytes_per_vector = index_factory.index_bytes_per_vector(index)
+
+        rerank_options = [0, args.rerank] if index_factory.is_lossy(index_type) else [0]
+        for candidates in rerank_options:
+            report = index_factory.evaluate_recall(index, vectors, queries, args.k, rerank_candidates=candidates)
+            label = f"{index_type}+rerank{candidates}" if candidates else index_type
+            print(
+                f"{label:>18}: bytes/vector={bytes_per_vector:8.1f}  "
+                f"recall@{report['k']}={report['recall']:.3f}  latency={report['latency_ms']:.3f}ms  "
+                f"flat={report['flat_latency_ms']:.3f}ms"
+            )
+
+
+def bench_binary(args):
+    """Hamming first stage alone and with exact re-scoring of N candidates"""
+    print_section(f"Binary quantization: n={args.n}, k={args.k}")
+    vectors = load_vectors(args.n, args.dimension)
+    queries = sample_queries(vectors, args.queries)
+
+    index = index_factory.train_index(index_factory.INDEX_BINARY, vectors.shape[1], vectors)
+    print(
+        f"bytes/vector={index_factory.index_bytes_per_vector(index):.1f} "
+        f"(float32: {vectors.shape[1] * 4})"
+    )
+
+    for candidates in [0] + args.candidates:
+        report = index_factory.evaluate_recall(index, vectors, queries, args.k, rerank_candidates=candidates)
+        label = f"rerank {candidates}" if candidates else "hamming only"
+        print(
+            f"{label:>14}: recall@{report['k']}={report['recall']:.3f}  "
+            f"latency={report['latency_ms']:.3f}ms  flat={report['flat_latency_ms']:.3f}ms"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Vector store benchmarks")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    index_parser = sub.add_parser("index", help="Compare index types against flat search")
+    index_parser.add_argument("--n", type=int, default=100000)
+    index_parser.add_argument("--dimension", type=int, default=384)
+    index_parser.add_argument("--queries", type=int, default=200)
+    index_parser.add_argument("--k", type=int, default=10)
+    index_parser.add_argument("--types", nargs="+", default=list(index_factory.INDEX_TYPES))
+    index_parser.add_argument("--nlist", type=int, default=settings.IVF_NLIST)
+    index_parser.add_argument("--nprobe", type=int, default=settings.IVF_NPROBE)
+    index_parser.add_argument("--ef-search", type=int, default=settings.HNSW_EF_SEARCH)
+    index_parser.set_defaults(func=bench_index)
+
+    compression_parser = sub.add_parser("compression", help="Memory, latency and recall of compressed modes")
+    compression_parser.add_argument("--n", type=int, default=100000)
+    compression_parser.add_argument("--dimension", type=int, default=384)
+    compression_parser.add_argument("--queries", type=int, default=200)
+    compression_parser.add_argument("--k", type=int, default=10)
+    compression_parser.add_argument("--rerank", type=int, default=settings.RERANK_CANDIDATES)
+    compression_parser.add_argument("--types", nargs="+", default=["flat", "sq_fp16", "sq8", "ivf_pq"])
+    compression_parser.add_argument("--nlist", type=int, default=settings.IVF_NLIST)
+    compression_parser.add_argument("--nprobe", type=int, default=settings.IVF_NPROBE)
+    compression_parser.add_argument("--ef-search", type=int, default=settings.HNSW_EF_SEARCH)
+    compression_parser.set_defaults(func=bench_compression)
+
+    binary_parser = sub.add_parser("binary", help="Binary Hamming search with float re-scoring")
+    binary_parser.add_argument("--n", type=int, default=100000)
+    binary_parser.add_argument("--dimension", type=int, default=384)
+    binary_parser.add_argument("--queries", type=int, default=200)
+    binary_parser.add_argument("--k", type=int, default=10)
+    binary_parser.add_argument("--candidates", type=int, nargs="+",
+                               default=[50, 100, settings.BINARY_RERANK_CANDIDATES, 400])
+    binary_parser.set_defaults(func=bench_binary)
+
+    args = parser.parse_args()
+    if hasattr(args, "nlist"):
+        settings.IVF_NLIST = args.nlist
+        settings.IVF_NPROBE = args.nprobe
+        settings.HNSW_EF_SEARCH = args.ef_search
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
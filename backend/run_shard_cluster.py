@@ -0,0 +1,148 @@
+"""
+Run a scatter-gather cluster on one machine: N shard servers plus a coordinator,
+each a separate process of this app with its own data directory.
+
+Usage:
+    python run_shard_cluster.py --shards 3                # start, run the demo, stop
+    python run_shard_cluster.py --shards 3 --keep         # leave the cluster running until Ctrl+C
+    python run_shard_cluster.py --shards 3 --no-demo --keep
+
+The demo indexes a few synthetic documents through the coordinator API,
+searches through the coordinator's /rag/search endpoint, then stops one
+shard server and searches again to show partial results.
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+import httpx
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+
+TOPICS = {
+    "billing": "Invoices are issued monthly. Refunds are processed within five business days.",
+    "security": "Passwords must be rotated every ninety days. Two factor login is required for admins.",
+    "travel": "Flights above six hours may be booked in premium economy. Hotels need manager approval.",
+    "hardware": "Laptops are replaced every three years. Broken screens are repaired by the help desk.",
+    "leave": "Employees receive twenty days of annual leave. Sick leave requires a doctor's note.",
+    "onboarding": "New hires get their accounts on day one. Orientation runs every Monday morning.",
+}
+
+
+def print_section(title):
+    print("\n" + "="*60)
+    print(f"  {title}")
+    print("="*60)
+
+
+def start_server(role, port, data_dir, extra_env=None):
+    env = dict(os.environ)
+    env.update({
+        "NODE_ROLE": role,
+        "VECTOR_STORE_DIR": os.path.join(data_dir, "store"),
+        "EMBEDDING_CACHE_DIR": os.path.join(data_dir, "embedding_cache"),
+    })
+    env.update(extra_env or {})
+    os.makedirs(data_dir, exist_ok=True)
+    log = open(os.path.join(data_dir, "server.log"), "w")
+    return subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1", "--port", str(port)],
+        cwd=BACKEND_DIR, env=env, stdout=log, stderr=subprocess.STDOUT
+    )
+
+
+def wait_ready(url, process, timeout):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"Server for {url} exited with code {process.returncode}")
+        try:
+            if httpx.get(f"{url}/ready", timeout=1).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.5)
+    raise RuntimeError(f"Server for {url} not ready after {timeout}s")
+
+
+def search(coordinator_url, query):
+    response = httpx.get(f"{coordinator_url}/rag/search", params={"query": query, "page_size": 3}, timeout=30)
+    response.raise_for_status()
+    for hit in response.json()["results"]:
+        print(f"  {hit['rank']}. [{hit['metadata'].get('doc_id')}] {hit['score']:.4f}  {hit['text'][:60]}")
+
+
+def run_demo(coordinator_url, shard_urls, processes):
+    # Index through an in-process coordinator; the servers only differ in where they run
+    os.environ["NODE_ROLE"] = "coordinator"
+    os.environ["SHARD_URLS"] = json.dumps(shard_urls)
+    from app.services.vectorstore import vector_store
+
+    print_section(f"Indexing {len(TOPICS)} documents across {len(shard_urls)} shards")
+    for doc_id, text in TOPICS.items():
+        chunks = vector_store.add_document(text, {"filename": f"{doc_id}.pdf"}, doc_id=doc_id)
+        print(f"  {doc_id:<12} -> {shard_urls[vector_store._shard_for(doc_id)]} ({chunks} chunks)")
+
+    print_section("Search through the coordinator")
+    search(coordinator_url, "how long do refunds take")
+
+    print_section(f"Search with {shard_urls[0]} stopped (partial results)")
+    processes[0].terminate()
+    processes[0].wait()
+    search(coordinator_url, "how long do refunds take")
+    stats = httpx.get(f"{coordinator_url}/rag/stats", timeout=30).json()
+    for shard in stats["shards"]:
+        print(f"  {shard['url']}: available={shard['available']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local scatter-gather cluster")
+    parser.add_argument("--shards", type=int, default=3)
+    parser.add_argument("--base-port", type=int, default=8101, help="first shard server port")
+    parser.add_argument("--coordinator-port", type=int, default=8100)
+    parser.add_argument("--data-dir", default="cluster_data")
+    parser.add_argument("--timeout", type=float, default=2.0, help="coordinator SHARD_TIMEOUT_SECONDS")
+    parser.add_argument("--startup-timeout", type=float, default=180.0)
+    parser.add_argument("--no-demo", action="store_true")
+    parser.add_argument("--keep", action="store_true", help="keep the cluster running until Ctrl+C")
+    args = parser.parse_args()
+
+    shard_urls = [f"http://127.0.0.1:{args.base_port + i}" for i in range(args.shards)]
+    coordinator_url = f"http://127.0.0.1:{args.coordinator_port}"
+    processes = []
+    try:
+        for i, url in enumerate(shard_urls):
+            processes.append(start_server("shard", args.base_port + i, os.path.join(args.data_dir, f"shard-{i:02d}")))
+        coordinator = start_server("coordinator", args.coordinator_port, os.path.join(args.data_dir, "coordinator"), {
+            "SHARD_URLS": json.dumps(shard_urls),
+            "SHARD_TIMEOUT_SECONDS": str(args.timeout),
+        })
+        processes.append(coordinator)
+
+        for url, process in zip(shard_urls + [coordinator_url], processes):
+            wait_ready(url, process, args.startup_timeout)
+        print(f"Coordinator {coordinator_url} -> shards {', '.join(shard_urls)} (logs in {args.data_dir})")
+
+        if not args.no_demo:
+            run_demo(coordinator_url, shard_urls, processes)
+
+        if args.keep:
+            print("\nCluster running, press Ctrl+C to stop")
+            while True:
+                time.sleep(1)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for process in processes:
+            if process.poll() is None:
+                process.terminate()
+        for process in processes:
+            process.wait()
+
+
+if __name__ == "__main__":
+    main()
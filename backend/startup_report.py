@@ -0,0 +1,115 @@
+"""
+Cold-start report: where import time goes and how long a server takes to come up.
+
+Usage:
+    python startup_report.py                  # import time of app.main, slowest modules first
+    python startup_report.py --top 40
+    python startup_report.py --serve          # also start uvicorn and time /ping and /ready
+
+The import profile comes from `python -X importtime` in a fresh interpreter,
+so nothing cached in this process skews it. Times are cumulative: a package
+includes everything it imported.
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+import time
+
+import httpx
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def print_section(title):
+    print("\n" + "="*60)
+    print(f"  {title}")
+    print("="*60)
+
+
+def profile_imports(module):
+    """(module, self_us, cumulative_us) for every import made by `import module`"""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=BACKEND_DIR, capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n{result.stderr[-2000:]}")
+
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        rows.append((name.strip(), int(self_us), int(cumulative_us)))
+    return rows
+
+
+def report_imports(module, top):
+    rows = profile_imports(module)
+    total = next((cumulative for name, _, cumulative in rows if name == module), 0)
+
+    print_section(f"Import time of {module}: {total / 1e6:.2f}s")
+    print(f"  {'cumulative':>10}  {'self':>8}  module")
+    for name, self_us, cumulative_us in sorted(rows, key=lambda row: row[2], reverse=True)[:top]:
+        print(f"  {cumulative_us / 1e3:>8.1f}ms  {self_us / 1e3:>6.1f}ms  {name}")
+
+    heavy = [name for name, _, _ in rows if name.split(".")[0] in ("torch", "sentence_transformers", "groq")]
+    if heavy:
+        print(f"\n  Note: {len(heavy)} torch / sentence_transformers / groq modules were imported eagerly")
+
+
+def time_server(port, timeout):
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1", "--port", str(port)],
+        cwd=BACKEND_DIR, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    url = f"http://127.0.0.1:{port}"
+    start_time = time.perf_counter()
+    timings = {}
+    try:
+        while len(timings) < 2 and time.perf_counter() - start_time < timeout:
+            if process.poll() is not None:
+                raise RuntimeError(f"Server exited with code {process.returncode}")
+            for path in ("/ping", "/ready"):
+                if path in timings:
+                    continue
+                try:
+                    if httpx.get(url + path, timeout=1).status_code == 200:
+                        timings[path] = time.perf_counter() - start_time
+                except httpx.HTTPError:
+                    pass
+            time.sleep(0.05)
+        report = httpx.get(url + "/ready", timeout=5).json() if timings else None
+    finally:
+        process.terminate()
+        process.wait()
+
+    print_section("Server startup")
+    for path in ("/ping", "/ready"):
+        value = f"{timings[path]:.2f}s" if path in timings else f"not answering after {timeout}s"
+        print(f"  {path:<8} {value}")
+    if report:
+        print(f"  import   {report['import_seconds']}s (app.main, measured in the server)")
+        for name, resource in report["resources"].items():
+            print(f"  {name:<14} loaded={resource['loaded']} in {resource['load_seconds']}s"
+                  + (f"  error: {resource['error']}" if resource["error"] else ""))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Application cold-start report")
+    parser.add_argument("--module", default="app.main")
+    parser.add_argument("--top", type=int, default=25)
+    parser.add_argument("--serve", action="store_true", help="start uvicorn and time /ping and /ready")
+    parser.add_argument("--port", type=int, default=8199)
+    parser.add_argument("--timeout", type=float, default=180.0)
+    args = parser.parse_args()
+
+    report_imports(args.module, args.top)
+    if args.serve:
+        time_server(args.port, args.timeout)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,9 @@
+import os
+import sys
+
+# Settings that have no default; tests never talk to the services they configure
+for name, value in {"SECRET_KEY": "test", "ALGORITHM": "HS256",
+                    "ACCESS_TOKEN_EXPIRE_MINUTES": "30", "GROQ_API_KEY": "test"}.items():
+    os.environ.setdefault(name, value)
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,76 @@
+from app.utils import cache as cache_module
+from app.utils.cache import TTLCache
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def _cache(monkeypatch, max_entries=3, ttl_seconds=10):
+    clock = _Clock()
+    monkeypatch.setattr(cache_module.time, "monotonic", clock)
+    return TTLCache(max_entries, ttl_seconds), clock
+
+
+def test_get_returns_stored_value_and_counts_hits(monkeypatch):
+    cache, _ = _cache(monkeypatch)
+    cache.put("q", [1, 2])
+
+    assert cache.get("q") == [1, 2]
+    assert cache.get("other") is None
+    assert (cache.hits, cache.misses) == (1, 1)
+    assert cache.stats()["hit_rate"] == 0.5
+
+
+def test_entries_expire_after_ttl(monkeypatch):
+    cache, clock = _cache(monkeypatch, ttl_seconds=10)
+    cache.put("q", "answer")
+
+    clock.now += 9.9
+    assert cache.get("q") == "answer"
+
+    clock.now += 0.2
+    assert cache.get("q") is None
+    assert len(cache) == 0
+
+
+def test_least_recently_used_entry_is_evicted(monkeypatch):
+    cache, _ = _cache(monkeypatch, max_entries=2)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    cache.get("a")
+
+    cache.put("c", 3)
+
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+    assert cache.evictions == 1
+
+
+def test_put_refreshes_expiry_and_recency(monkeypatch):
+    cache, clock = _cache(monkeypatch, max_entries=2, ttl_seconds=10)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    clock.now += 8
+    cache.put("a", 10)
+    cache.put("c", 3)
+
+    assert cache.get("b") is None
+    clock.now += 5
+    assert cache.get("a") == 10
+
+
+def test_clear_drops_every_entry(monkeypatch):
+    cache, _ = _cache(monkeypatch)
+    cache.put("a", 1)
+    cache.put("b", 2)
+
+    cache.clear()
+
+    assert len(cache) == 0
+    assert cache.get("a") is None
@@ -0,0 +1,40 @@
+import asyncio
+import threading
+
+import pytest
+
+from app.services.executors import PoolSaturatedError, WorkPool
+
+
+def test_cancelled_caller_keeps_its_slot_until_the_job_finishes():
+    pool = WorkPool("test", workers=1, max_pending=0)
+    started, release = threading.Event(), threading.Event()
+
+    def job():
+        started.set()
+        release.wait(5)
+
+    async def scenario():
+        waiter = asyncio.ensure_future(pool.run(job))
+        await asyncio.get_running_loop().run_in_executor(None, started.wait, 5)
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+
+        assert pool.stats()["in_flight"] == 1
+        with pytest.raises(PoolSaturatedError):
+            await pool.run(job)
+
+        release.set()
+        while pool.stats()["in_flight"]:
+            await asyncio.sleep(0.001)
+        assert await pool.run(lambda: "next") == "next"
+
+    try:
+        asyncio.run(scenario())
+    finally:
+        release.set()
+        pool.shutdown()
+
+    assert pool.stats()["in_flight"] == 0
+    assert pool.rejected == 1
@@ -0,0 +1,41 @@
+import numpy as np
+
+from app.services.index_factory import BinaryQuantizedIndex, binarize
+
+
+def _vectors(count, dimension=32, seed=0):
+    return np.random.default_rng(seed).standard_normal((count, dimension)).astype(np.float32)
+
+
+def _hamming(a, b):
+    return np.unpackbits(binarize(a)[:, None] ^ binarize(b)[None], axis=2).sum(axis=2)
+
+
+def test_binary_search_scans_only_allowed_rows():
+    vectors = _vectors(200)
+    index = BinaryQuantizedIndex(32)
+    index.add(vectors)
+    allowed = np.zeros(200, dtype=bool)
+    allowed[150:160] = True
+    queries = vectors[:3]
+
+    distances, indices = index.search(queries, 4, allowed=allowed)
+
+    assert allowed[indices].all()
+    expected = np.sort(_hamming(queries, vectors[allowed]), axis=1)[:, :4]
+    np.testing.assert_array_equal(distances, expected)
+
+
+def test_binary_search_pads_when_fewer_rows_are_allowed_than_k():
+    vectors = _vectors(20)
+    index = BinaryQuantizedIndex(32)
+    index.add(vectors)
+    allowed = np.zeros(20, dtype=bool)
+    allowed[[3, 7]] = True
+
+    distances, indices = index.search(vectors[:1], 4, allowed=allowed)
+
+    assert sorted(indices[0, :2].tolist()) == [3, 7]
+    assert indices[0, 2:].tolist() == [-1, -1]
+    assert np.isinf(distances[0, 2:]).all()
+    assert index.search(vectors[:1], 4, allowed=np.zeros(20, dtype=bool))[1].tolist() == [[-1] * 4]
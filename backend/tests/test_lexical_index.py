@@ -0,0 +1,69 @@
+import numpy as np
+import pytest
+
+from app.services.lexical_index import LexicalIndex, reciprocal_rank_fusion
+
+TEXTS = [
+    "The invoice total is due in thirty days.",
+    "Error code E-4012 means the sensor is disconnected.",
+    "Thirty sensors were installed in the north wing.",
+    "Payment terms: the invoice is due on receipt.",
+]
+
+
+def test_rrf_scores_are_summed_reciprocal_ranks():
+    fused = dict(reciprocal_rank_fusion([[7, 3, 5], [3, 9]], k=60))
+
+    assert fused[3] == pytest.approx(1 / 62 + 1 / 61)
+    assert fused[7] == pytest.approx(1 / 61)
+    assert fused[5] == pytest.approx(1 / 63)
+    assert fused[9] == pytest.approx(1 / 62)
+
+
+def test_rrf_ranks_rows_found_by_both_lists_first():
+    fused = reciprocal_rank_fusion([[1, 2, 3], [4, 3, 5]], k=60)
+
+    assert [row for row, _ in fused][:3] == [3, 1, 4]
+    assert [score for _, score in fused] == sorted((score for _, score in fused), reverse=True)
+
+
+def test_rrf_of_empty_lists():
+    assert reciprocal_rank_fusion([[], []]) == []
+    assert reciprocal_rank_fusion([[2, 1], []]) == [(2, 1 / 61), (1, 1 / 62)]
+
+
+def test_bm25_ranks_exact_terms_and_honours_the_row_mask():
+    index = LexicalIndex.build(TEXTS)
+
+    _, rows = index.search("e-4012", k=3)
+    assert rows.tolist() == [1]
+
+    _, rows = index.search("invoice due", k=3)
+    assert sorted(rows.tolist()[:2]) == [0, 3]
+
+    allowed = np.array([False, True, True, True])
+    _, rows = index.search("invoice due", k=3, allowed=allowed)
+    assert rows.tolist() == [3]
+
+
+def test_incremental_adds_match_a_full_build():
+    built = LexicalIndex.build(TEXTS)
+    incremental = LexicalIndex.build(TEXTS[:1]).extended(TEXTS[1:3]).extended(TEXTS[3:])
+
+    for query in ("invoice due", "thirty sensors", "error code"):
+        expected_scores, expected_rows = built.search(query, k=4)
+        scores, rows = incremental.search(query, k=4)
+        assert rows.tolist() == expected_rows.tolist()
+        np.testing.assert_allclose(scores, expected_scores, rtol=1e-6)
+
+
+def test_take_rows_and_snapshot_round_trip(tmp_path):
+    index = LexicalIndex.build(TEXTS).take_rows(np.array([1, 3]))
+    index.write(str(tmp_path))
+
+    loaded = LexicalIndex.read(str(tmp_path))
+
+    assert len(loaded) == 2
+    assert loaded.search("invoice", k=2)[1].tolist() == [1]
+    assert loaded.search("sensor", k=2)[1].tolist() == [0]
+    assert LexicalIndex.read(str(tmp_path / "missing")) is None
@@ -0,0 +1,19 @@
+import numpy as np
+
+from app.services.mmap_store import LayeredIndex
+
+
+def test_masked_search_of_a_mapped_flat_base_brute_forces_allowed_rows():
+    vectors = np.random.default_rng(0).standard_normal((100, 16)).astype(np.float32)
+    index = LayeredIndex(None, vectors[:80], 16)
+    index.add(vectors[80:])
+    allowed = np.zeros(100, dtype=bool)
+    allowed[[5, 42, 77, 90]] = True
+
+    distances, indices = index.search(vectors[:2], 6, allowed=allowed)
+
+    expected = ((vectors[:2, None] - vectors[None, [5, 42, 77, 90]]) ** 2).sum(axis=2)
+    assert sorted(indices[0, :4].tolist()) == [5, 42, 77, 90]
+    np.testing.assert_allclose(distances[:, :4], np.sort(expected, axis=1), rtol=1e-5)
+    assert indices[:, 4:].tolist() == [[-1, -1], [-1, -1]]
+    assert index.search(vectors[:1], 3, allowed=np.zeros(100, dtype=bool))[1].tolist() == [[-1, -1, -1]]
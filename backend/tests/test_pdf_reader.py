@@ -0,0 +1,113 @@
+import random
+
+from app.utils.pdf_reader import chunk_text, iter_chunks
+
+
+def _original_windows(text, chunk_size, overlap, limit=10):
+    """(start, chunk) of the original chunking loop, which trusted every sentence break"""
+    windows, start = [], 0
+    while start < len(text) and len(windows) < limit:
+        end = min(start + chunk_size, len(text))
+        if end < len(text):
+            sentence_end = text.rfind('.', start, end)
+            if sentence_end != -1 and sentence_end > start:
+                end = sentence_end + 1
+        windows.append((start, text[start:end].strip()))
+        start = end - overlap if end < len(text) else len(text)
+    return windows
+
+
+def test_original_rule_sent_a_window_before_the_start_of_the_text():
+    text = "Intro sentence here. " + "word " * 300
+
+    assert [start for start, _ in _original_windows(text, 1000, 200)][:2] == [0, -180]
+    assert [len(chunk) for chunk in chunk_text(text, 1000, 200)] == [1000, 719]
+
+
+def test_boundaries_match_the_original_rule_wherever_it_moved_forward():
+    rng = random.Random(0)
+    words = ["alpha", "beta.", "gamma", "delta", "epsilon.", "zeta"]
+    compared = 0
+    for _ in range(300):
+        text = " ".join(rng.choice(words) for _ in range(rng.randint(1, 400)))
+        chunk_size, overlap = rng.randint(20, 300), rng.randint(0, 19)
+        windows = _original_windows(text, chunk_size, overlap, limit=len(text) + 1)
+        starts = [start for start, _ in windows]
+        if any(later <= earlier for earlier, later in zip(starts, starts[1:])):
+            continue
+
+        assert chunk_text(text, chunk_size, overlap) == [chunk for _, chunk in windows if chunk]
+        compared += 1
+
+    assert compared > 100
+
+
+def test_sentence_break_near_window_start_is_ignored():
+    # The only break is within `overlap` of the second window's start
+    chunks = chunk_text("A" * 900 + ". " + "b " * 1000, 1000, 200)
+
+    assert [len(chunk) for chunk in chunks] == [901, 1000, 999, 599]
+
+
+def test_short_leading_sentence_does_not_produce_shrinking_chunks():
+    chunks = chunk_text("Intro sentence here. " + "word " * 300, 1000, 200)
+
+    assert [len(chunk) for chunk in chunks] == [1000, 719]
+
+
+def test_chunks_break_at_sentences_and_overlap():
+    text = "".join(f"Sentence number {i} is here. " for i in range(200))
+    chunks = chunk_text(text, 300, 50)
+
+    assert all(chunk.endswith(".") for chunk in chunks)
+    assert all(len(chunk) <= 300 for chunk in chunks)
+    for previous, current in zip(chunks, chunks[1:]):
+        assert current[:20] in previous
+
+
+def test_overlap_not_smaller_than_chunk_size_terminates():
+    assert len(chunk_text("x" * 50, 10, 10)) == 41
+
+
+def test_empty_text():
+    assert chunk_text("") == []
+    assert chunk_text("   \n ") == []
+
+
+def _pages(text, sizes):
+    pages, offset = [], 0
+    for number, size in enumerate(sizes, start=1):
+        pages.append((number, text[offset:offset + size]))
+        offset += size
+    pages.append((len(sizes) + 1, text[offset:]))
+    return pages
+
+
+def test_iter_chunks_over_pages_matches_chunk_text_of_the_whole_text():
+    text = "".join(f"Sentence {i} says something {'long ' * (i % 7)}here. " for i in range(300))
+
+    for sizes in ([1] * 50, [7, 300, 1, 999, 2500], [200] * 40, [len(text) // 2]):
+        chunks = [chunk for chunk, _ in iter_chunks(_pages(text, sizes), 300, 50)]
+        assert chunks == chunk_text(text, 300, 50)
+
+
+def test_iter_chunks_reports_the_pages_each_chunk_spans():
+    pages = [(1, "a" * 150), (2, ""), (3, "b" * 100), (4, "c" * 100)]
+
+    chunks = list(iter_chunks(pages, 200, 20))
+
+    assert [len(chunk) for chunk, _ in chunks] == [200, 170]
+    assert [page_numbers for _, page_numbers in chunks] == [[1, 3], [3, 4]]
+
+
+def test_iter_chunks_yields_chunks_before_reading_later_pages():
+    seen = []
+
+    def pages():
+        for number in range(1, 101):
+            seen.append(number)
+            yield number, f"Page {number} text. " * 20
+
+    for chunk, page_numbers in iter_chunks(pages(), 500, 100):
+        # A chunk is yielded before the pages after it are read
+        assert seen[-1] <= page_numbers[-1] + 2
@@ -0,0 +1,116 @@
+import threading
+import time
+
+from app.utils.rwlock import RWLock
+
+
+def _start(target):
+    thread = threading.Thread(target=target, daemon=True)
+    thread.start()
+    return thread
+
+
+def test_readers_share_the_lock():
+    lock = RWLock()
+    inside = threading.Barrier(3, timeout=5)
+
+    def reader():
+        with lock.read():
+            inside.wait()  # only passes if all three readers hold the lock at once
+
+    threads = [_start(reader) for _ in range(3)]
+    for thread in threads:
+        thread.join(5)
+
+    assert not any(thread.is_alive() for thread in threads)
+    assert not inside.broken
+
+
+def test_writer_waits_for_readers_and_excludes_them():
+    lock = RWLock()
+    events = []
+    reader_in = threading.Event()
+    release_reader = threading.Event()
+
+    def reader():
+        with lock.read():
+            reader_in.set()
+            release_reader.wait(5)
+            events.append("reader out")
+
+    def writer():
+        with lock.write():
+            events.append("writer in")
+            time.sleep(0.05)
+            events.append("writer out")
+
+    first = _start(reader)
+    reader_in.wait(5)
+    second = _start(writer)
+    time.sleep(0.05)
+
+    assert events == []
+
+    release_reader.set()
+    first.join(5)
+    second.join(5)
+    with lock.read():
+        events.append("reader in")
+
+    assert events == ["reader out", "writer in", "writer out", "reader in"]
+
+
+def test_waiting_writer_goes_before_new_readers():
+    lock = RWLock()
+    events = []
+    reader_in = threading.Event()
+    release_reader = threading.Event()
+
+    def first_reader():
+        with lock.read():
+            reader_in.set()
+            release_reader.wait(5)
+
+    def writer():
+        with lock.write():
+            events.append("writer")
+
+    def late_reader():
+        with lock.read():
+            events.append("late reader")
+
+    threads = [_start(first_reader)]
+    reader_in.wait(5)
+    threads.append(_start(writer))
+    while not lock._writers_waiting:
+        time.sleep(0.001)
+    threads.append(_start(late_reader))
+    time.sleep(0.05)
+
+    assert events == []
+
+    release_reader.set()
+    for thread in threads:
+        thread.join(5)
+
+    assert events == ["writer", "late reader"]
+
+
+def test_lock_is_released_when_the_body_raises():
+    lock = RWLock()
+
+    for acquire in (lock.read, lock.write):
+        try:
+            with acquire():
+                raise ValueError("boom")
+        except ValueError:
+            pass
+
+    done = threading.Event()
+
+    def writer():
+        with lock.write():
+            done.set()
+
+    _start(writer).join(5)
+    assert done.is_set()
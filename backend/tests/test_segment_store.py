@@ -0,0 +1,145 @@
+import os
+
+from app.services.segment_store import OP_ADD, OP_DELETE, OP_REPLACE, SegmentLog, SnapshotDirectory
+
+
+def _log_with_records(tmp_path, count=3):
+    log = SegmentLog(str(tmp_path / "vectors.log"), fsync=False)
+    for seq in range(1, count + 1):
+        log.append(seq, OP_ADD, {"doc_id": f"doc{seq}", "documents": [f"chunk {seq}"]})
+    return log
+
+
+def test_replay_returns_appended_records_in_order(tmp_path):
+    log = SegmentLog(str(tmp_path / "vectors.log"), fsync=False)
+    log.append(1, OP_ADD, {"doc_id": "a", "documents": ["one", "two"]})
+    log.append(2, OP_REPLACE, {"doc_id": "a", "documents": ["three"], "replaced_chunk_ids": [0, 1]})
+    log.append(3, OP_DELETE, {"doc_id": "a", "chunk_ids": [2]})
+
+    records = list(SegmentLog(log.path, fsync=False).replay())
+
+    assert [(record.seq, record.op) for record in records] == [(1, OP_ADD), (2, OP_REPLACE), (3, OP_DELETE)]
+    assert records[0].data == {"doc_id": "a", "documents": ["one", "two"]}
+    assert records[1].data["replaced_chunk_ids"] == [0, 1]
+
+
+def test_replay_skips_records_covered_by_a_snapshot(tmp_path):
+    log = _log_with_records(tmp_path)
+
+    records = list(log.replay(after_seq=2))
+
+    assert [record.seq for record in records] == [3]
+    assert log.record_count == 3
+
+
+def test_torn_tail_is_truncated(tmp_path):
+    log = _log_with_records(tmp_path, count=2)
+    intact_size = log.size_bytes()
+    log.append(3, OP_ADD, {"doc_id": "doc3", "documents": ["chunk 3"]})
+    with open(log.path, "r+b") as f:
+        f.truncate(log.size_bytes() - 5)
+
+    records = list(log.replay())
+
+    assert [record.seq for record in records] == [1, 2]
+    assert log.size_bytes() == intact_size
+
+
+def test_truncated_header_is_truncated(tmp_path):
+    log = _log_with_records(tmp_path, count=2)
+    intact_size = log.size_bytes()
+    with open(log.path, "ab") as f:
+        f.write(b"VSL")
+
+    assert [record.seq for record in log.replay()] == [1, 2]
+    assert log.size_bytes() == intact_size
+
+
+def test_record_with_bad_crc_is_rejected_with_the_rest_of_the_log(tmp_path):
+    log = _log_with_records(tmp_path, count=1)
+    first_size = log.size_bytes()
+    log.append(2, OP_ADD, {"doc_id": "doc2", "documents": ["chunk 2"]})
+    log.append(3, OP_ADD, {"doc_id": "doc3", "documents": ["chunk 3"]})
+    with open(log.path, "r+b") as f:
+        f.seek(first_size + 30)
+        byte = f.read(1)
+        f.seek(first_size + 30)
+        f.write(bytes([byte[0] ^ 0xFF]))
+
+    records = list(log.replay())
+
+    assert [record.seq for record in records] == [1]
+    assert log.size_bytes() == first_size
+    assert log.record_count == 1
+
+
+def test_reset_empties_the_log(tmp_path):
+    log = _log_with_records(tmp_path)
+
+    log.reset()
+
+    assert log.size_bytes() == 0
+    assert log.record_count == 0
+    assert list(log.replay()) == []
+
+
+def test_no_snapshot_before_the_first_publish(tmp_path):
+    snapshots = SnapshotDirectory(str(tmp_path / "snapshots"))
+
+    path = snapshots.begin(5)
+
+    assert os.path.isdir(path)
+    assert snapshots.current() is None
+
+
+def test_publish_swaps_current_and_keeps_the_previous_snapshot(tmp_path):
+    snapshots = SnapshotDirectory(str(tmp_path / "snapshots"))
+    first = snapshots.begin(1)
+    snapshots.publish(first)
+    second = snapshots.begin(2)
+
+    assert snapshots.current() == first
+
+    snapshots.publish(second)
+
+    assert snapshots.current() == second
+    assert os.path.isdir(first)  # other processes may still be loading it
+    assert not os.path.exists(snapshots.pointer_file + ".tmp")
+
+
+def test_publish_removes_snapshots_older_than_the_previous_one(tmp_path):
+    snapshots = SnapshotDirectory(str(tmp_path / "snapshots"))
+    first, second = snapshots.begin(1), snapshots.begin(2)
+    snapshots.publish(first)
+    snapshots.publish(second)
+    in_progress = snapshots.begin(4)  # another process has not published it yet
+    third = snapshots.begin(3)
+
+    snapshots.publish(third)
+
+    assert not os.path.exists(first)
+    assert os.path.isdir(second)
+    assert os.path.isdir(in_progress)
+    assert snapshots.current() == third
+
+
+def test_unpublished_snapshot_is_ignored_after_a_crash(tmp_path):
+    snapshots = SnapshotDirectory(str(tmp_path / "snapshots"))
+    published = snapshots.begin(1)
+    snapshots.publish(published)
+    snapshots.begin(2)  # writer died before publishing
+
+    assert SnapshotDirectory(snapshots.root).current() == published
+
+
+def test_replay_after_snapshot_applies_only_newer_records(tmp_path):
+    log = _log_with_records(tmp_path, count=2)
+    snapshots = SnapshotDirectory(str(tmp_path / "snapshots"))
+    snapshots.publish(snapshots.begin(2))
+    log.reset()
+    log.append(3, OP_ADD, {"doc_id": "doc3", "documents": ["chunk 3"]})
+    log.append(4, OP_DELETE, {"doc_id": "doc1", "chunk_ids": [0]})
+
+    records = list(SegmentLog(log.path, fsync=False).replay(after_seq=2))
+
+    assert [(record.seq, record.op) for record in records] == [(3, OP_ADD), (4, OP_DELETE)]
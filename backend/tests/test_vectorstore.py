@@ -0,0 +1,197 @@
+import numpy as np
+import pytest
+
+from app.core.config import settings
+from app.services.embedding_backends import EmbeddingBackend
+from app.services.vectorstore import VectorStore
+from app.utils.hashing import chunk_hash
+
+
+class HashingEmbedding(EmbeddingBackend):
+    """Deterministic bag-of-words vectors, so tests need no model"""
+
+    name = "test"
+    dimension = 32
+
+    def __init__(self):
+        super().__init__("hashing")
+        self.encoded = 0
+
+    def get_sentence_embedding_dimension(self) -> int:
+        return self.dimension
+
+    def encode(self, sentences, batch_size=32, show_progress_bar=False, **kwargs):
+        self.encoded += len(sentences)
+        vectors = np.zeros((len(sentences), self.dimension), dtype=np.float32)
+        for row, sentence in enumerate(sentences):
+            for word in sentence.lower().split():
+                vectors[row, chunk_hash(word.strip(".,")) % self.dimension] += 1.0
+        return vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-6)
+
+    def token_lengths(self, sentences):
+        return np.array([len(sentence.split()) for sentence in sentences])
+
+
+@pytest.fixture(params=["pickle", "mmap"])
+def open_store(request, tmp_path, monkeypatch):
+    """Opens (or reopens, like a restart) a store in one data directory"""
+    for name, value in {
+        "VECTOR_STORAGE_FORMAT": request.param, "VECTOR_INDEX_TYPE": "flat", "CHUNK_SIZE": 80,
+        "CHUNK_OVERLAP": 10, "EMBEDDING_CACHE_ENABLED": False, "EMBEDDING_BATCHING_ENABLED": False,
+        "EMBEDDING_TOKEN_BUDGET": 0, "EMBEDDING_PROCESS_WORKERS": 0, "ENABLE_CACHING": False,
+        "WAL_FSYNC": False,
+    }.items():
+        monkeypatch.setattr(settings, name, value)
+    model = HashingEmbedding()
+    return lambda: VectorStore(str(tmp_path / "store"), model)
+
+
+def _hits(store, query, **kwargs):
+    return [(text, metadata) for text, _, metadata in store.search(query, k=10, mode="dense", **kwargs)]
+
+
+BOILERPLATE = "Confidential: do not distribute outside the company."
+
+
+def test_identical_chunks_are_stored_once_and_shared(open_store):
+    store = open_store()
+    store.add_document(BOILERPLATE, {"filename": "a.pdf"}, doc_id="a")
+    encoded = store.embedding_model.encoded
+
+    chunks = store.add_document(BOILERPLATE, {"filename": "b.pdf"}, doc_id="b")
+
+    assert chunks == 1
+    assert store.get_size() == 1
+    assert store.embedding_model.encoded == encoded
+    assert store.get_document("b")["shared_chunk_ids"] == [0]
+    assert _hits(store, BOILERPLATE)[0][1]["shared_by"] == ["b"]
+
+
+def test_identical_upload_is_skipped_by_content_hash(open_store):
+    store = open_store()
+    store.add_document("First upload text.", {"filename": "a.pdf"}, doc_id="a", content_hash="h1")
+
+    assert store.add_document("First upload text.", {"filename": "a.pdf"}, doc_id="b", content_hash="h1") == 0
+    assert store.find_document("h1") == "a"
+    assert store.get_document("b") is None
+
+
+def test_shared_chunk_is_attributed_to_a_remaining_document_after_its_owner_is_deleted(open_store):
+    store = open_store()
+    store.add_document(BOILERPLATE, {"filename": "d0.pdf"}, doc_id="d0")
+    store.add_document("Unrelated text about invoices.", {"filename": "d1.pdf"}, doc_id="d1")
+    store.add_document(BOILERPLATE, {"filename": "d2.pdf"}, doc_id="d2")
+    store.add_document(BOILERPLATE, {"filename": "d3.pdf"}, doc_id="d3")
+
+    store.delete_document("d0")
+    replayed = open_store()
+    replayed.compact()
+
+    for current in (store, replayed, open_store()):
+        [(text, metadata)] = _hits(current, BOILERPLATE, filters={"doc_id": "d2"})
+        assert text == BOILERPLATE
+        assert (metadata["doc_id"], metadata["filename"], metadata["shared_by"]) == ("d2", "d2.pdf", ["d3"])
+        assert _hits(current, BOILERPLATE, filters={"filename": "d0.pdf"}) == []
+        assert [m["doc_id"] for _, m in _hits(current, BOILERPLATE, filters={"filename": "d3.pdf"})] == ["d2"]
+
+
+def test_orphaned_chunk_is_dropped_with_its_last_reference(open_store):
+    store = open_store()
+    store.add_document(BOILERPLATE, {"filename": "a.pdf"}, doc_id="a")
+    store.add_document(BOILERPLATE, {"filename": "b.pdf"}, doc_id="b")
+    store.delete_document("a")
+
+    store.delete_document("b")
+    store.compact()
+
+    assert store.get_size() == 0
+    assert open_store().get_size() == 0
+
+
+def test_clear_survives_a_restart_when_the_snapshot_fails(open_store, monkeypatch):
+    store = open_store()
+    store.add_document("Quarterly report on invoices.", {"filename": "a.pdf"}, doc_id="a")
+    store.compact()
+    monkeypatch.setattr(VectorStore, "_save_index", lambda self: 1 / 0)
+
+    store.clear()
+
+    assert store.get_size() == 0
+    assert open_store().get_size() == 0
+
+
+def test_add_that_fails_to_stage_is_not_logged(open_store, monkeypatch):
+    store = open_store()
+    with monkeypatch.context() as patch, pytest.raises(ZeroDivisionError):
+        patch.setattr(VectorStore, "_stage_add", lambda self, data: 1 / 0)
+        store.add_document("Never indexed.", {"filename": "a.pdf"}, doc_id="a")
+
+    assert store.wal.record_count == 0
+    assert open_store().get_document("a") is None
+
+
+def _chunk_ids(store, query, doc_id):
+    return sorted(m["chunk_id"] for _, m in _hits(store, query, filters={"doc_id": doc_id}))
+
+
+def _snapshot_of(store):
+    return sorted((d["doc_id"], d["chunks"]) for d in store.list_documents()), store.get_size()
+
+
+def test_add_delete_replace_compact_and_reload(open_store):
+    store = open_store()
+    store.add_document("Invoices are due in thirty days.", {"filename": "a.pdf"}, doc_id="a")
+    store.add_document("Sensor error codes and their meaning.", {"filename": "b.pdf"}, doc_id="b")
+    store.add_document("The north wing has thirty sensors.", {"filename": "c.pdf"}, doc_id="c")
+
+    store.delete_document("b")
+    assert store.get_size() == 2
+    assert store.get_deleted_ratio() > 0
+    assert sorted(m["doc_id"] for _, m in _hits(store, "sensor error codes")) == ["a", "c"]
+
+    store.replace_document("c", "The south wing has forty cameras.", {"filename": "c-v2.pdf"})
+    assert [m["filename"] for _, m in _hits(store, "cameras", filters={"doc_id": "c"})] == ["c-v2.pdf"]
+
+    store.compact()
+
+    assert store.get_deleted_ratio() == 0
+    assert store.wal.record_count == 0
+    reloaded = open_store()
+    assert _snapshot_of(reloaded) == _snapshot_of(store) == ([("a", 1), ("c", 1)], 2)
+    assert _hits(reloaded, "south wing cameras") == _hits(store, "south wing cameras")
+    with pytest.raises(KeyError):
+        reloaded.delete_document("b")
+
+
+def test_chunk_ids_are_stable_across_compaction_and_reload(open_store):
+    store = open_store()
+    store.add_document("Invoices are due in thirty days.", {"filename": "a.pdf"}, doc_id="a")
+    store.add_document("Sensor error codes and their meaning.", {"filename": "b.pdf"}, doc_id="b")
+    kept = _chunk_ids(store, "sensor error codes", "b")
+
+    store.delete_document("a")
+    store.compact()
+    reloaded = open_store()
+    reloaded.add_document("Payment terms for new customers.", {"filename": "c.pdf"}, doc_id="c")
+
+    assert _chunk_ids(store, "sensor error codes", "b") == kept
+    assert _chunk_ids(reloaded, "sensor error codes", "b") == kept
+    assert min(_chunk_ids(reloaded, "payment terms", "c")) > max(kept)  # ids of dropped chunks are not reused
+
+
+def test_writes_after_the_last_snapshot_are_replayed_after_a_restart(open_store):
+    store = open_store()
+    store.add_document("Invoices are due in thirty days.", {"filename": "a.pdf"}, doc_id="a")
+    store.compact()
+    store.add_document("Sensor error codes and their meaning.", {"filename": "b.pdf"}, doc_id="b")
+    store.delete_document("a")
+    store.replace_document("b", "Sensor error codes, revised.", {"filename": "b-v2.pdf"})
+
+    assert store.wal.record_count == 3
+
+    restarted = open_store()
+
+    assert _snapshot_of(restarted) == _snapshot_of(store) == ([("b", 1)], 1)
+    assert restarted.get_document("a") is None
+    assert _hits(restarted, "sensor error codes") == _hits(store, "sensor error codes")
+    assert _hits(restarted, "sensor error codes")[0][1]["filename"] == "b-v2.pdf"